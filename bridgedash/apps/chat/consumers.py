@@ -1,16 +1,32 @@
+import asyncio
 import json
+import logging
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
+from django.db.models import F
+from .history import latest_messages, message_data, messages_after
+from .viewers import VIEWER_REFRESH_INTERVAL, join_room, leave_room, refresh_viewer
 from .models import ChatRoom, ChatMessage
 from bridgedash.apps.deliveries.models import Delivery
-from bridgedash.apps.notifications.models import Notification
+from bridgedash.apps.notifications.utils import NotificationUtils
+
+logger = logging.getLogger(__name__)
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f'chat_{self.room_name}'
         
+        self.viewer_task = None
+        
+        # Resolved once; messages are saved and notified from these ids
+        self.room = await self.get_room(self.scope['user'])
+        if self.room is None:
+            await self.close()
+            return
+        
         # Join room group
         await self.channel_layer.group_add(
             self.room_group_name,
@@ -19,14 +35,29 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Send last 50 messages to the new connection
-        messages = await self.get_room_messages()
-        await self.send(text_data=json.dumps({
-            'type': 'chat_history',
-            'messages': messages
-        }))
+        # Participants with the room open are not notified of its messages
+        await sync_to_async(join_room, thread_sensitive=False)(self.room['id'], self.scope['user'].pk)
+        self.viewer_task = asyncio.create_task(self.keep_viewing())
+        
+        # A reconnecting client passes the last message it saw and only gets
+        # what it missed; a new one gets the latest page
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        after_id = query.get('after_id', [''])[0]
+        if after_id.isdigit():
+            messages, complete = await self.get_messages_after(int(after_id))
+            await self.send_history(messages, reset=not complete)
+        else:
+            messages, has_more = await self.get_room_messages()
+            await self.send_history(messages, has_more=has_more, reset=True)
 
     async def disconnect(self, close_code):
+        if self.room is None:
+            return
+        
+        if self.viewer_task is not None:
+            self.viewer_task.cancel()
+            await sync_to_async(leave_room, thread_sensitive=False)(self.room['id'], self.scope['user'].pk)
+        
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -59,6 +90,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
             
             # Send notification to the other user
             await self.send_notification(sender, message)
+        
+        elif message_type == 'load_history':
+            # An older page, for a client scrolling back
+            before_id = text_data_json.get('before_id')
+            if not isinstance(before_id, int):
+                return
+            messages, has_more = await self.get_room_messages(before_id)
+            await self.send_history(messages, has_more=has_more, before_id=before_id)
 
     async def chat_message(self, event):
         # Send message to WebSocket
@@ -77,69 +116,77 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'messages': event['messages']
         }))
 
+    async def keep_viewing(self):
+        # Keep the viewer count alive while the socket is open, however
+        # quiet the room is
+        while True:
+            await asyncio.sleep(VIEWER_REFRESH_INTERVAL)
+            try:
+                await sync_to_async(refresh_viewer, thread_sensitive=False)(self.room['id'], self.scope['user'].pk)
+            except Exception as e:
+                logger.error(f"Error refreshing chat viewer: {e}")
+
+    async def send_history(self, messages, has_more=False, reset=False, before_id=None):
+        """
+        Send a page of history. `reset` tells the client to replace what it
+        shows; `before_id` marks an older page to put in front of it.
+        """
+        await self.send(text_data=json.dumps({
+            'type': 'chat_history',
+            'messages': messages,
+            'has_more': has_more,
+            'reset': reset,
+            'before_id': before_id
+        }))
+
     @database_sync_to_async
-    def get_room_messages(self):
-        try:
-            room = ChatRoom.objects.get(id=self.room_name)
-            messages = ChatMessage.objects.filter(room=room).select_related('sender').order_by('timestamp')[:50]
-            
-            return [
-                {
-                    'id': msg.id,
-                    'message': msg.content,
-                    'sender': msg.sender.username,
-                    'sender_id': msg.sender.id,
-                    'timestamp': msg.timestamp.isoformat(),
-                    'message_type': msg.message_type
-                }
-                for msg in messages
-            ]
-        except ChatRoom.DoesNotExist:
-            return []
+    def get_room(self, user):
+        """
+        The room's id, delivery and participants, if `user` may join it
+        """
+        if not user.is_authenticated or not self.room_name.isdigit():
+            return None
+        room = ChatRoom.objects.filter(id=self.room_name).values(
+            'id', 'delivery_id', customer_id=F('delivery__customer_id'), driver_id=F('delivery__driver_id')
+        ).first()
+        if room is None or user.pk not in (room['customer_id'], room['driver_id']) and user.role != 'admin':
+            return None
+        return room
+
+    @database_sync_to_async
+    def get_room_messages(self, before_id=None):
+        messages, has_more = latest_messages(self.room['id'], before_id)
+        return [message_data(message) for message in messages], has_more
+
+    @database_sync_to_async
+    def get_messages_after(self, after_id):
+        messages, complete = messages_after(self.room['id'], after_id)
+        return [message_data(message) for message in messages], complete
 
     @database_sync_to_async
     def save_message(self, message, sender):
-        try:
-            room = ChatRoom.objects.get(id=self.room_name)
-            chat_message = ChatMessage.objects.create(
-                room=room,
-                sender=sender,
-                content=message,
-                message_type='text'
-            )
-            
-            # Mark as read for the sender immediately
-            chat_message.is_read = True
-            chat_message.save()
-            
-            return {
-                'id': chat_message.id,
-                'timestamp': chat_message.timestamp.isoformat()
-            }
-        except ChatRoom.DoesNotExist:
-            return {'id': None, 'timestamp': timezone.now().isoformat()}
+        # Read for the sender from the start
+        chat_message = ChatMessage.objects.create(
+            room_id=self.room['id'],
+            sender_id=sender.pk,
+            content=message,
+            message_type='text',
+            is_read=True
+        )
+        return {
+            'id': chat_message.id,
+            'timestamp': chat_message.timestamp.isoformat()
+        }
 
     @database_sync_to_async
     def send_notification(self, sender, message):
-        try:
-            room = ChatRoom.objects.get(id=self.room_name)
-            delivery = room.delivery
-            
-            # Determine who to notify (the other user in the chat)
-            if sender == delivery.customer.user:
-                # Notify driver
-                notify_user = delivery.driver.user if delivery.driver else None
-            else:
-                # Notify customer
-                notify_user = delivery.customer.user
-            
-            if notify_user and notify_user != sender:
-                Notification.objects.create(
-                    user=notify_user,
-                    notification_type='message',
-                    title='New Message',
-                    message=f'New message in delivery #{delivery.id}: {message[:50]}...',
-                    related_url=f'/deliveries/customer/active/{delivery.id}/'
-                )
-        except ChatRoom.DoesNotExist:
-            pass
\ No newline at end of file
+        # Notify the other user in the chat
+        if sender.pk == self.room['customer_id']:
+            notify_user_id = self.room['driver_id']
+        else:
+            notify_user_id = self.room['customer_id']
+        
+        if notify_user_id and notify_user_id != sender.pk:
+            NotificationUtils.notify_chat_message(
+                self.room['id'], self.room['delivery_id'], notify_user_id, message
+            )
\ No newline at end of file
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.db.models import Q, Subquery
+
+from .models import ChatMessage
+
+# Largest page a client may ask for
+MAX_HISTORY_PAGE = 200
+
+def history_page_size(limit=None):
+    """
+    The requested page size, clamped; raises ValueError if it isn't a number
+    """
+    if limit in (None, ''):
+        return settings.BRIDGEDASH_CHAT_HISTORY_SIZE
+    return max(1, min(int(limit), MAX_HISTORY_PAGE))
+
+def message_data(message):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender': {
+            'id': message.sender.id,
+            'username': message.sender.username,
+            'role': message.sender.role
+        },
+        'message_type': message.message_type,
+        'timestamp': message.timestamp.isoformat(),
+        'is_read': message.is_read
+    }
+
+def _anchor_timestamp(room_id, message_id):
+    return Subquery(ChatMessage.objects.filter(room_id=room_id, id=message_id).values('timestamp')[:1])
+
+def latest_messages(room_id, before_id=None, limit=None):
+    """
+    The newest `limit` messages of a room, or the newest ones older than
+    message `before_id`, oldest first, and whether older ones remain.
+
+    Messages are ordered by (timestamp, id) and the cursor seeks on that
+    pair, so every page is one range scan of the (room, timestamp, id)
+    index however deep the history goes.
+    """
+    limit = limit or settings.BRIDGEDASH_CHAT_HISTORY_SIZE
+    messages = ChatMessage.objects.filter(room_id=room_id).select_related('sender')
+    if before_id is not None:
+        anchor = _anchor_timestamp(room_id, before_id)
+        messages = messages.filter(Q(timestamp__lt=anchor) | Q(timestamp=anchor, id__lt=before_id))
+    page = list(messages.order_by('-timestamp', '-id')[:limit + 1])
+    return page[:limit][::-1], len(page) > limit
+
+def messages_after(room_id, after_id, limit=None):
+    """
+    Messages newer than message `after_id`, oldest first, for a client
+    catching up after a reconnect. Returns (messages, complete); when more
+    than `limit` arrived, `complete` is False and only the newest `limit`
+    are returned, so the client should start over from them.
+    """
+    limit = limit or settings.BRIDGEDASH_CHAT_HISTORY_SIZE
+    anchor = _anchor_timestamp(room_id, after_id)
+    page = list(
+        ChatMessage.objects.filter(room_id=room_id)
+        .filter(Q(timestamp__gt=anchor) | Q(timestamp=anchor, id__gt=after_id))
+        .select_related('sender')
+        .order_by('timestamp', 'id')[:limit + 1]
+    )
+    if len(page) <= limit:
+        return page, True
+    messages, _ = latest_messages(room_id, limit=limit)
+    return messages, False
@@ -27,6 +27,10 @@ class ChatMessage(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Latest messages and before/after cursors, (timestamp, id) order
+            models.Index(fields=['room', 'timestamp', 'id'], name='chat_message_room_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.sender.username}: {self.content[:50]}"
\ No newline at end of file
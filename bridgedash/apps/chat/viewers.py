@@ -0,0 +1,41 @@
+from django.core.cache import cache
+
+# Open sockets refresh their viewer count as messages reach them, at most
+# every VIEWER_REFRESH_INTERVAL seconds. A count left behind by a worker that
+# died without decrementing it lapses after VIEWER_TTL, so the user isn't
+# kept from notifications for long.
+VIEWER_REFRESH_INTERVAL = 5 * 60
+VIEWER_TTL = 2 * VIEWER_REFRESH_INTERVAL
+
+def viewers_cache_key(room_id, user_id):
+    return f'chat_viewers_{room_id}_{user_id}'
+
+def join_room(room_id, user_id):
+    """
+    Count one more open chat socket of `user_id` in the room
+    """
+    key = viewers_cache_key(room_id, user_id)
+    cache.add(key, 0, timeout=VIEWER_TTL)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Expired between add and incr
+        cache.set(key, 1, timeout=VIEWER_TTL)
+    cache.touch(key, VIEWER_TTL)
+
+def leave_room(room_id, user_id):
+    key = viewers_cache_key(room_id, user_id)
+    try:
+        if cache.decr(key) <= 0:
+            cache.delete(key)
+    except ValueError:
+        pass
+
+def refresh_viewer(room_id, user_id):
+    cache.touch(viewers_cache_key(room_id, user_id), VIEWER_TTL)
+
+def is_viewing(room_id, user_id):
+    """
+    Whether the user has the room open, so it needs no notification
+    """
+    return (cache.get(viewers_cache_key(room_id, user_id)) or 0) > 0
@@ -5,6 +5,7 @@ from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 import json
 
+from .history import history_page_size, latest_messages, message_data, messages_after
 from .models import ChatRoom, ChatMessage
 from bridgedash.apps.deliveries.models import Delivery
 
@@ -17,12 +18,10 @@ def chat_room(request, room_id):
     if request.user not in [delivery.customer.user, delivery.driver.user] and request.user.role != 'admin':
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    messages = ChatMessage.objects.filter(room=chat_room).order_by('timestamp')[:100]
-    
+    # Messages are loaded over the WebSocket, latest page first
     context = {
         'room': chat_room,
         'delivery': delivery,
-        'messages': messages,
         'ws_url': f"ws://{request.get_host()}/ws/chat/{room_id}/"
     }
     return render(request, 'chat/room.html', context)
@@ -37,24 +36,26 @@ def get_chat_messages(request, room_id):
     if request.user not in [delivery.customer.user, delivery.driver.user] and request.user.role != 'admin':
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    messages = ChatMessage.objects.filter(room=chat_room).order_by('timestamp')
+    # Latest page by default; ?before_id= pages back, ?after_id= catches up
+    try:
+        limit = history_page_size(request.GET.get('limit'))
+        before_id = int(request.GET['before_id']) if request.GET.get('before_id') else None
+        after_id = int(request.GET['after_id']) if request.GET.get('after_id') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
     
-    messages_data = []
-    for msg in messages:
-        messages_data.append({
-            'id': msg.id,
-            'content': msg.content,
-            'sender': {
-                'id': msg.sender.id,
-                'username': msg.sender.username,
-                'role': msg.sender.role
-            },
-            'message_type': msg.message_type,
-            'timestamp': msg.timestamp.isoformat(),
-            'is_read': msg.is_read
+    if after_id is not None:
+        messages, complete = messages_after(chat_room.id, after_id, limit)
+        return JsonResponse({
+            'messages': [message_data(message) for message in messages],
+            'complete': complete
         })
     
-    return JsonResponse({'messages': messages_data})
+    messages, has_more = latest_messages(chat_room.id, before_id, limit)
+    return JsonResponse({
+        'messages': [message_data(message) for message in messages],
+        'has_more': has_more
+    })
 
 @login_required
 @require_http_methods(["POST"])
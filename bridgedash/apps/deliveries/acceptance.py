@@ -0,0 +1,69 @@
+import logging
+from django.conf import settings
+from django.db import transaction
+
+from bridgedash.apps.chat.models import ChatRoom, ChatMessage
+from bridgedash.apps.notifications.models import Notification
+from bridgedash.apps.notifications.outbox import publish
+from .feed import invalidate_pending_feed
+from .models import Delivery, DeliveryTracking
+from .status import invalidate_delivery_status
+from .tracking import update_delivery_position
+from .transitions import transition
+
+logger = logging.getLogger(__name__)
+
+def claim_delivery(delivery_id, driver, now=None):
+    """
+    Give a pending delivery to `driver` with one conditional UPDATE.
+
+    The row lock lasts only as long as the statement, so drivers racing for
+    the same delivery never queue behind each other's side effects; exactly
+    one of them sees a row updated. Returns the claimed delivery, or None
+    if it was no longer pending.
+    """
+    claimed = transition(Delivery.objects.filter(id=delivery_id), 'accepted', now, driver=driver)
+    if not claimed:
+        return None
+    invalidate_delivery_status(delivery_id)
+    invalidate_pending_feed()
+    return Delivery.objects.select_related('customer__user').get(id=delivery_id)
+
+def announce_acceptance(delivery, driver):
+    """
+    Side effects of a claimed delivery: chat message, first tracking point,
+    customer notification and the broadcast to other drivers
+    """
+    with transaction.atomic():
+        chat_room, created = ChatRoom.objects.get_or_create(delivery=delivery)
+        ChatMessage.objects.create(
+            room=chat_room,
+            sender=driver.user,
+            message_type='system',
+            content=f"Driver {driver.user.username} has accepted your delivery! They will contact you shortly."
+        )
+
+        tracking = DeliveryTracking.objects.create(
+            delivery=delivery,
+            driver_lat=driver.current_lat or settings.BRIDGEDASH_DEFAULT_LAT,
+            driver_lng=driver.current_lng or settings.BRIDGEDASH_DEFAULT_LNG
+        )
+        update_delivery_position(delivery.id, tracking.driver_lat, tracking.driver_lng, tracking.timestamp)
+
+        Notification.objects.create(
+            user=delivery.customer.user,
+            notification_type='delivery_accepted',
+            title='Delivery Accepted!',
+            message=f'Driver {driver.user.username} has accepted your delivery',
+            related_url=f'/deliveries/customer/active/{delivery.id}/'
+        )
+
+        # Tell the other drivers the delivery is taken, once committed
+        publish(
+            "drivers_updates",
+            {
+                "type": "delivery.accepted",
+                "delivery_id": delivery.id,
+                "driver_id": driver.user.id,
+            }
+        )
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Delivery, DeliveryTracking
+from .models import Delivery, DeliveryTracking, DeliveryPosition, DeliveryRoute, DriverDailyEarnings, GeocodedAddress
+from .pagination import EstimatedCountPaginator
 
 @admin.register(Delivery)
 class DeliveryAdmin(admin.ModelAdmin):
@@ -8,6 +9,11 @@ class DeliveryAdmin(admin.ModelAdmin):
     list_filter = ['status', 'created_at']
     search_fields = ['customer__user__username', 'driver__user__username', 'item_description']
     readonly_fields = ['created_at', 'accepted_at', 'picked_up_at', 'delivered_at']
+    list_select_related = ['customer__user', 'driver__user']
+    ordering = ['-created_at', '-id']
+    # Skip the exact COUNT(*) of the whole table on filtered/searched lists
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
     
     def delivery_status(self, obj):
         status_colors = {
@@ -30,4 +36,48 @@ class DeliveryAdmin(admin.ModelAdmin):
 class DeliveryTrackingAdmin(admin.ModelAdmin):
     list_display = ['delivery', 'driver_lat', 'driver_lng', 'timestamp']
     list_filter = ['timestamp']
-    readonly_fields = ['timestamp']
\ No newline at end of file
+    readonly_fields = ['timestamp']
+
+@admin.register(DeliveryPosition)
+class DeliveryPositionAdmin(admin.ModelAdmin):
+    list_display = ['delivery', 'driver_lat', 'driver_lng', 'timestamp']
+
+@admin.register(DeliveryRoute)
+class DeliveryRouteAdmin(admin.ModelAdmin):
+    list_display = ['delivery', 'point_count', 'raw_point_count', 'started_at', 'ended_at']
+    readonly_fields = ['created_at']
+
+@admin.register(DriverDailyEarnings)
+class DriverDailyEarningsAdmin(admin.ModelAdmin):
+    list_display = ['driver', 'date', 'gross', 'commission', 'delivery_count']
+    list_filter = ['date']
+    search_fields = ['driver__user__username']
+
+@admin.register(GeocodedAddress)
+class GeocodedAddressAdmin(admin.ModelAdmin):
+    list_display = ['address', 'lat', 'lng', 'source', 'created_at']
+    list_filter = ['source']
+    search_fields = ['address', 'normalized']
+    readonly_fields = ['normalized', 'created_at']
+    
+    # Other processes pick up edits when their cached entry expires
+    # (BRIDGEDASH_GEOCODE_CACHE_TTL); this one forgets them right away
+    def save_model(self, request, obj, form, change):
+        from .geocoding import address_cache, normalize_address
+        previous = obj.normalized
+        obj.normalized = normalize_address(obj.address)
+        super().save_model(request, obj, form, change)
+        address_cache.discard(previous)
+        address_cache.discard(obj.normalized)
+    
+    def delete_model(self, request, obj):
+        from .geocoding import address_cache
+        super().delete_model(request, obj)
+        address_cache.discard(obj.normalized)
+    
+    def delete_queryset(self, request, queryset):
+        from .geocoding import address_cache
+        normalized = list(queryset.values_list('normalized', flat=True))
+        super().delete_queryset(request, queryset)
+        for key in normalized:
+            address_cache.discard(key)
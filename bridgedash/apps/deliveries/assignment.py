@@ -0,0 +1,63 @@
+import numpy as np
+
+def min_cost_assignment(cost):
+    """
+    Minimum-cost assignment for a rectangular cost matrix (Hungarian method,
+    shortest augmenting paths with vectorized row scans).
+
+    Returns (rows, cols) index arrays pairing every row with a distinct
+    column when there are no more rows than columns, and every column with a
+    distinct row otherwise. Costs must be finite; use a large penalty for
+    pairs that should never be matched and filter them out afterwards.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = min_cost_assignment(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+
+    n, m = cost.shape
+    # Potentials and the row matched to each column; column 0 is a virtual
+    # column that holds the row being inserted.
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.intp)
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[match[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+
+        # Flip the augmenting path back to the virtual column
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+
+    cols = np.nonzero(match[1:])[0]
+    rows = match[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
@@ -1,12 +1,31 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.utils import timezone
+from .models import Delivery
+from .protocol import LOCATION_SUBPROTOCOL, LocationEncoder
+from .tracking import ACTIVE_STATUSES, LocationStream, parse_location_point
 
 class DeliveryConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.delivery_id = self.scope['url_route']['kwargs']['delivery_id']
         self.delivery_group_name = f'delivery_{self.delivery_id}'
+        self.location_stream = None
+        
+        user = self.scope['user']
+        delivery = await self.get_delivery(user)
+        if delivery is None:
+            await self.close()
+            return
+        
+        # Only the delivery's driver streams locations, while it is active
+        if delivery['driver_id'] == user.pk and delivery['status'] in ACTIVE_STATUSES:
+            self.location_stream = LocationStream(user.pk)
+        
+        # Clients that negotiate the binary protocol get location updates as
+        # delta-encoded binary frames instead of JSON
+        self.location_encoder = None
+        if LOCATION_SUBPROTOCOL in self.scope.get('subprotocols', []):
+            self.location_encoder = LocationEncoder()
         
         # Join delivery group
         await self.channel_layer.group_add(
@@ -14,41 +33,67 @@ class DeliveryConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
         
-        await self.accept()
+        await self.accept(subprotocol=LOCATION_SUBPROTOCOL if self.location_encoder else None)
 
     async def disconnect(self, close_code):
+        if self.location_stream is not None:
+            await self.location_stream.close()
+        
         # Leave delivery group
         await self.channel_layer.group_discard(
             self.delivery_group_name,
             self.channel_name
         )
 
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
-        message_type = text_data_json['type']
+    async def receive(self, text_data=None, bytes_data=None):
+        if text_data is None:
+            return
+        try:
+            text_data_json = json.loads(text_data)
+            message_type = text_data_json['type']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return
         
-        if message_type == 'location_update':
-            # Broadcast location update to all in the delivery group
-            await self.channel_layer.group_send(
-                self.delivery_group_name,
-                {
-                    'type': 'driver.location_update',
-                    'lat': text_data_json['lat'],
-                    'lng': text_data_json['lng'],
-                    'timestamp': timezone.now().isoformat()
-                }
-            )
+        if message_type == 'location_update' and self.location_stream is not None:
+            try:
+                point = parse_location_point(text_data_json)
+            except (KeyError, TypeError, ValueError):
+                return
+            # Persisted through the tracking buffer; frames within the
+            # stream interval are coalesced into one broadcast
+            self.location_stream.push(point)
+
+    @database_sync_to_async
+    def get_delivery(self, user):
+        """
+        The delivery's parties and status, if `user` may follow it
+        """
+        if not user.is_authenticated or not self.delivery_id.isdigit():
+            return None
+        delivery = Delivery.objects.filter(id=self.delivery_id).values('customer_id', 'driver_id', 'status').first()
+        if delivery is None or user.pk not in (delivery['customer_id'], delivery['driver_id']) and user.role != 'admin':
+            return None
+        return delivery
 
     async def driver_location_update(self, event):
+        if self.location_encoder is not None:
+            await self.send(bytes_data=self.location_encoder.encode(event))
+            return
+        
         # Send location update to WebSocket
         await self.send(text_data=json.dumps({
             'type': 'location_update',
             'lat': event['lat'],
             'lng': event['lng'],
-            'timestamp': event['timestamp']
+            'timestamp': event['timestamp'],
+            'eta': event.get('eta')
         }))
 
     async def delivery_status_update(self, event):
+        if self.location_stream is not None and event['status'] not in ACTIVE_STATUSES:
+            await self.location_stream.close()
+            self.location_stream = None
+        
         # Send status update to WebSocket
         await self.send(text_data=json.dumps({
             'type': 'status_update',
@@ -0,0 +1,196 @@
+import logging
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from bridgedash.apps.notifications.models import Notification
+from bridgedash.apps.users.models import Driver
+from .assignment import min_cost_assignment
+from .pricing import haversine_km_many
+from .presence import get_driver_presence, online_near
+
+logger = logging.getLogger(__name__)
+
+def offered_cache_key(delivery_id):
+    return f'dispatch:offered:{delivery_id}'
+
+def matched_cache_key(kind, pk):
+    return f'dispatch:matched:{kind}:{pk}'
+
+def dispatch_delivery(delivery):
+    """
+    Start dispatching a new delivery: offer it to the nearest drivers now, or
+    leave it for the next batch assignment in 'batch' mode
+    """
+    if settings.BRIDGEDASH_DISPATCH_MODE == 'batch':
+        return
+    offer_delivery(delivery)
+
+def dispatch_radii():
+    """
+    Search radius of each dispatch ring; the final ring is unbounded
+    """
+    return list(settings.BRIDGEDASH_DISPATCH_RADII_KM) + [None]
+
+def offer_delivery(delivery, ring=0):
+    """
+    Offer a pending delivery to the closest online drivers that have not been
+    offered it yet, starting at `ring` and widening until somebody is found.
+
+    Returns the ring that produced offers (or the last ring tried) and
+    schedules the next ring in case nobody accepts in time.
+    """
+    radii = dispatch_radii()
+    batch_size = settings.BRIDGEDASH_DISPATCH_BATCH_SIZE
+    already_offered = set(cache.get(offered_cache_key(delivery.id), ()))
+
+    offered = []
+    while ring < len(radii) and not offered:
+        candidates = online_near(
+            delivery.pickup_lat,
+            delivery.pickup_lng,
+            k=batch_size + len(already_offered),
+            radius_km=radii[ring],
+        )
+        candidate_ids = [driver_id for driver_id, _ in candidates if driver_id not in already_offered]
+        if candidate_ids:
+            # Presence says who is online; the database whether they may drive
+            eligible = Driver.objects.filter(
+                pk__in=candidate_ids,
+                user__status='active',
+            ).values_list('pk', flat=True)
+            eligible = set(eligible)
+            offered = [driver_id for driver_id in candidate_ids if driver_id in eligible][:batch_size]
+        if not offered:
+            ring += 1
+
+    if offered:
+        _notify_drivers(delivery, offered)
+        already_offered.update(offered)
+        cache.set(offered_cache_key(delivery.id), list(already_offered), timeout=60 * 60 * 24)
+
+    if ring + 1 < len(radii):
+        transaction.on_commit(lambda: schedule_next_ring(delivery.id, ring + 1))
+
+    return ring
+
+def schedule_next_ring(delivery_id, ring):
+    from .tasks import widen_delivery_offer
+    try:
+        widen_delivery_offer.apply_async(
+            (delivery_id, ring),
+            countdown=settings.BRIDGEDASH_DISPATCH_RING_TIMEOUT,
+        )
+    except Exception as e:
+        logger.error(f"Error scheduling dispatch ring {ring} for delivery {delivery_id}: {e}")
+
+def _notify_drivers(delivery, driver_ids):
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=driver_id,
+            notification_type='delivery_request',
+            title='New Delivery Request',
+            message=f'New delivery from {delivery.customer.user.username}',
+            related_url='/deliveries/driver/'
+        )
+        for driver_id in driver_ids
+    ])
+
+def match_deliveries(pickups, drivers, max_pickup_km, excluded=None):
+    """
+    Pair deliveries with drivers so the total pickup distance is minimal.
+
+    `pickups` and `drivers` are (lat, lng) sequences; `excluded` holds
+    (delivery index, driver index) pairs that must not be matched. Returns
+    (delivery index, driver index, pickup km) triples, leaving out pairs
+    further apart than `max_pickup_km`.
+    """
+    if not len(pickups) or not len(drivers):
+        return []
+    pickups = np.asarray(pickups, dtype=np.float64)
+    drivers = np.asarray(drivers, dtype=np.float64)
+    distances = haversine_km_many(
+        pickups[:, 0, None], pickups[:, 1, None], drivers[None, :, 0], drivers[None, :, 1]
+    )
+
+    # Out-of-range pairs cost more than any in-range assignment can, so the
+    # solver only uses them when nothing else is left, and they're dropped
+    penalty = max_pickup_km * (min(distances.shape) + 1)
+    cost = np.where(distances <= max_pickup_km, distances, penalty)
+    for delivery_index, driver_index in excluded or ():
+        cost[delivery_index, driver_index] = penalty
+
+    rows, cols = min_cost_assignment(cost)
+    return [
+        (int(row), int(col), float(distances[row, col]))
+        for row, col in zip(rows, cols)
+        if cost[row, col] < penalty
+    ]
+
+def run_batch_dispatch():
+    """
+    One batch assignment round: match the pending deliveries to free online
+    drivers at minimum total pickup distance and offer each delivery to its
+    driver only.
+
+    A matched delivery and driver sit out the following rounds until the
+    offer times out (BRIDGEDASH_DISPATCH_RING_TIMEOUT), after which the
+    delivery is re-matched to somebody else. Returns the number of offers.
+    """
+    from .models import Delivery
+
+    deliveries = list(
+        Delivery.objects.filter(status='pending').select_related('customer__user').order_by('created_at')[
+            :settings.BRIDGEDASH_DISPATCH_BATCH_MAX_DELIVERIES
+        ]
+    )
+    matched = cache.get_many([matched_cache_key('delivery', delivery.id) for delivery in deliveries])
+    deliveries = [delivery for delivery in deliveries if matched_cache_key('delivery', delivery.id) not in matched]
+    if not deliveries:
+        return 0
+
+    busy = Delivery.objects.filter(
+        status__in=['accepted', 'picked_up', 'in_transit'],
+        driver__isnull=False,
+    ).values_list('driver_id', flat=True)
+    # Online drivers at their live positions, minus the inactive and busy
+    online = {driver_id: (lat, lng) for driver_id, lat, lng in get_driver_presence().positions()}
+    available = Driver.objects.filter(
+        pk__in=list(online),
+        user__status='active',
+    ).exclude(pk__in=busy).values_list('pk', flat=True)
+    drivers = [(driver_id, *online[driver_id]) for driver_id in available]
+    matched = cache.get_many([matched_cache_key('driver', driver_id) for driver_id, _, _ in drivers])
+    drivers = [driver for driver in drivers if matched_cache_key('driver', driver[0]) not in matched]
+    if not drivers:
+        return 0
+
+    offered = cache.get_many([offered_cache_key(delivery.id) for delivery in deliveries])
+    driver_positions = {driver_id: index for index, (driver_id, _, _) in enumerate(drivers)}
+    excluded = [
+        (delivery_index, driver_positions[driver_id])
+        for delivery_index, delivery in enumerate(deliveries)
+        for driver_id in offered.get(offered_cache_key(delivery.id), ())
+        if driver_id in driver_positions
+    ]
+
+    pairs = match_deliveries(
+        [(delivery.pickup_lat, delivery.pickup_lng) for delivery in deliveries],
+        [(lat, lng) for _, lat, lng in drivers],
+        settings.BRIDGEDASH_DISPATCH_MAX_PICKUP_KM,
+        excluded,
+    )
+
+    timeout = settings.BRIDGEDASH_DISPATCH_RING_TIMEOUT
+    for delivery_index, driver_index, _ in pairs:
+        delivery = deliveries[delivery_index]
+        driver_id = drivers[driver_index][0]
+        _notify_drivers(delivery, [driver_id])
+        already_offered = offered.get(offered_cache_key(delivery.id), [])
+        cache.set(offered_cache_key(delivery.id), list(already_offered) + [driver_id], timeout=60 * 60 * 24)
+        cache.set_many({
+            matched_cache_key('delivery', delivery.id): driver_id,
+            matched_cache_key('driver', driver_id): delivery.id,
+        }, timeout=timeout)
+    return len(pairs)
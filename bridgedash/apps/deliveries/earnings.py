@@ -0,0 +1,136 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Delivery, DriverDailyEarnings
+
+logger = logging.getLogger(__name__)
+
+# Windows shown on the earnings pages, as days before today (inclusive)
+WEEK_DAYS = 7
+MONTH_DAYS = 30
+
+def record_delivery_earnings(delivery):
+    """
+    Add a just-delivered delivery to its driver's row for the day
+    """
+    date = timezone.localdate(delivery.delivered_at)
+    increments = {
+        'gross': F('gross') + delivery.total_price,
+        'commission': F('commission') + delivery.commission_amount,
+        'delivery_count': F('delivery_count') + 1,
+    }
+    rows = DriverDailyEarnings.objects.filter(driver_id=delivery.driver_id, date=date)
+    if rows.update(**increments):
+        return
+
+    try:
+        with transaction.atomic():
+            DriverDailyEarnings.objects.create(
+                driver_id=delivery.driver_id,
+                date=date,
+                gross=delivery.total_price,
+                commission=delivery.commission_amount,
+                delivery_count=1
+            )
+    except IntegrityError:
+        # Another delivery created the day's row first
+        rows.update(**increments)
+
+def earnings_summary(driver, today=None):
+    """
+    Gross earnings for today, the last week and the last month, read from
+    the daily rollup in one query
+    """
+    today = today or timezone.localdate()
+    week_ago = today - timedelta(days=WEEK_DAYS)
+    month_ago = today - timedelta(days=MONTH_DAYS)
+    totals = DriverDailyEarnings.objects.filter(
+        driver=driver,
+        date__gte=month_ago
+    ).aggregate(
+        today=Sum('gross', filter=Q(date=today)),
+        week=Sum('gross', filter=Q(date__gte=week_ago)),
+        month=Sum('gross'),
+    )
+    return {period: total or Decimal('0') for period, total in totals.items()}
+
+def daily_earnings_from_deliveries(driver=None, since=None):
+    """
+    Daily totals recomputed from the deliveries table, keyed by
+    (driver_id, date)
+    """
+    deliveries = Delivery.objects.filter(status='delivered', driver__isnull=False, delivered_at__isnull=False)
+    if driver is not None:
+        deliveries = deliveries.filter(driver=driver)
+    if since is not None:
+        deliveries = deliveries.filter(delivered_at__date__gte=since)
+
+    rows = deliveries.annotate(
+        date=TruncDate('delivered_at')
+    ).values('driver_id', 'date').annotate(
+        gross=Sum('total_price'),
+        commission=Sum('commission_amount'),
+        delivery_count=Count('id'),
+    ).order_by()
+    cents = Decimal('0.01')
+    return {
+        (row['driver_id'], row['date']): (
+            Decimal(row['gross']).quantize(cents),
+            Decimal(row['commission']).quantize(cents),
+            row['delivery_count']
+        )
+        for row in rows
+    }
+
+def reconcile_driver_earnings(driver=None, since=None, dry_run=False):
+    """
+    Bring the daily rollup in line with the deliveries table.
+
+    Returns (written, deleted) lists of (driver_id, date) keys that were
+    out of date; with `dry_run` nothing is changed.
+    """
+    expected = daily_earnings_from_deliveries(driver, since)
+
+    stored_rows = DriverDailyEarnings.objects.all()
+    if driver is not None:
+        stored_rows = stored_rows.filter(driver=driver)
+    if since is not None:
+        stored_rows = stored_rows.filter(date__gte=since)
+    stored = {
+        (row.driver_id, row.date): (row.gross, row.commission, row.delivery_count)
+        for row in stored_rows
+    }
+
+    written = [key for key, totals in expected.items() if stored.get(key) != totals]
+    deleted = [key for key in stored if key not in expected]
+    if dry_run:
+        return written, deleted
+
+    with transaction.atomic():
+        DriverDailyEarnings.objects.bulk_create(
+            [
+                DriverDailyEarnings(
+                    driver_id=driver_id,
+                    date=date,
+                    gross=expected[(driver_id, date)][0],
+                    commission=expected[(driver_id, date)][1],
+                    delivery_count=expected[(driver_id, date)][2]
+                )
+                for driver_id, date in written
+            ],
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['driver', 'date'],
+            update_fields=['gross', 'commission', 'delivery_count'],
+        )
+        for driver_id, date in deleted:
+            DriverDailyEarnings.objects.filter(driver_id=driver_id, date=date).delete()
+
+    if written or deleted:
+        logger.info(f"Driver earnings reconciled: {len(written)} days written, {len(deleted)} removed")
+    return written, deleted
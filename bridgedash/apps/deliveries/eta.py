@@ -0,0 +1,206 @@
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Delivery, DeliveryTracking
+from .spatial import KM_PER_DEGREE, haversine_km
+
+PROFILES_CACHE_KEY = 'eta:profiles'
+# How often a process checks for a rebuilt profile table
+PROFILES_RELOAD_SECONDS = 300
+ETA_CACHE_TIMEOUT = 60 * 60
+
+# Track segments spanning a longer gap than this (GPS off, app in the
+# background) say nothing about travel speed
+MAX_SEGMENT_SECONDS = 300
+# Observed travel time a cell needs in an hour before its speed is trusted
+MIN_CELL_SECONDS = 120
+
+# Cell rows are packed with their column into one int64 key
+_ROW_STRIDE = 1_000_003
+
+def eta_cache_key(delivery_id):
+    return f'eta:delivery:{delivery_id}'
+
+def _cell_keys(lat, lng, cell_km):
+    cell_deg = cell_km / KM_PER_DEGREE
+    rows = np.floor(np.asarray(lat) / cell_deg).astype(np.int64)
+    cols = np.floor(np.asarray(lng) / cell_deg).astype(np.int64)
+    return rows * _ROW_STRIDE + cols
+
+class SpeedProfiles:
+    """
+    Average travel speed (km/h) per grid cell and local hour of day, as a
+    sorted key array and a (cells, 24) speed table. Unknown cells or hours
+    fall back to the hour's fleet-wide speed, then to
+    BRIDGEDASH_ETA_DEFAULT_SPEED_KMH.
+    """
+
+    def __init__(self, cell_km, keys, speeds, hourly, built_at=None):
+        self.cell_km = cell_km
+        self.keys = np.asarray(keys, dtype=np.int64)
+        self.speeds = np.asarray(speeds, dtype=np.float32).reshape(-1, 24)
+        self.hourly = np.asarray(hourly, dtype=np.float32)
+        self.built_at = built_at
+
+    @classmethod
+    def empty(cls):
+        return cls(settings.BRIDGEDASH_ETA_CELL_KM, [], [], np.full(24, np.nan))
+
+    @classmethod
+    def build(cls, rows, cell_km=None):
+        """
+        Profiles from tracking points as (delivery_id, lat, lng, timestamp)
+        rows ordered by delivery and time
+        """
+        cell_km = cell_km or settings.BRIDGEDASH_ETA_CELL_KM
+        max_speed_kmh = settings.BRIDGEDASH_TRACKING_MAX_SPEED_KMH
+        totals = {}
+        previous = None
+        for delivery_id, lat, lng, timestamp in rows:
+            if previous is not None and previous[0] == delivery_id:
+                _, prev_lat, prev_lng, prev_timestamp = previous
+                seconds = (timestamp - prev_timestamp).total_seconds()
+                if 0 < seconds <= MAX_SEGMENT_SECONDS:
+                    distance_km = haversine_km(prev_lat, prev_lng, lat, lng)
+                    if distance_km / (seconds / 3600) <= max_speed_kmh:
+                        # Segments count towards the cell of their midpoint
+                        key = int(_cell_keys((lat + prev_lat) / 2, (lng + prev_lng) / 2, cell_km))
+                        hour = timezone.localtime(prev_timestamp).hour
+                        total = totals.setdefault((key, hour), [0.0, 0.0])
+                        total[0] += distance_km
+                        total[1] += seconds
+            previous = (delivery_id, lat, lng, timestamp)
+
+        keys = sorted({key for key, _ in totals})
+        positions = {key: i for i, key in enumerate(keys)}
+        speeds = np.full((len(keys), 24), np.nan, dtype=np.float32)
+        hourly_km = np.zeros(24)
+        hourly_seconds = np.zeros(24)
+        for (key, hour), (distance_km, seconds) in totals.items():
+            hourly_km[hour] += distance_km
+            hourly_seconds[hour] += seconds
+            if seconds >= MIN_CELL_SECONDS and distance_km > 0:
+                speeds[positions[key], hour] = distance_km / (seconds / 3600)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hourly = np.where(hourly_seconds >= MIN_CELL_SECONDS, hourly_km / (hourly_seconds / 3600), np.nan)
+        return cls(cell_km, keys, speeds, hourly, built_at=timezone.now())
+
+    def speed_kmh(self, lat, lng, hour):
+        """
+        Speeds for arrays of points at one local hour
+        """
+        default = settings.BRIDGEDASH_ETA_DEFAULT_SPEED_KMH
+        fallback = self.hourly[hour] if not np.isnan(self.hourly[hour]) else default
+        keys = _cell_keys(lat, lng, self.cell_km)
+        speeds = np.full(keys.shape, fallback, dtype=np.float64)
+        if len(self.keys):
+            positions = np.clip(np.searchsorted(self.keys, keys), 0, len(self.keys) - 1)
+            found = self.keys[positions] == keys
+            known = self.speeds[positions[found], hour]
+            speeds[found] = np.where(np.isnan(known), fallback, known)
+        # A stationary-looking cell must not make the ETA infinite
+        return np.maximum(speeds, settings.BRIDGEDASH_ETA_MIN_SPEED_KMH)
+
+    def travel_seconds(self, lat, lng, to_lat, to_lng, when=None):
+        """
+        Expected travel time between two points, along the straight line
+        scaled by BRIDGEDASH_ETA_DETOUR_FACTOR and sampled once per cell
+        """
+        hour = timezone.localtime(when or timezone.now()).hour
+        distance_km = haversine_km(lat, lng, to_lat, to_lng) * settings.BRIDGEDASH_ETA_DETOUR_FACTOR
+        if distance_km == 0:
+            return 0.0
+        steps = max(1, int(np.ceil(distance_km / self.cell_km)))
+        fractions = (np.arange(steps) + 0.5) / steps
+        speeds = self.speed_kmh(lat + (to_lat - lat) * fractions, lng + (to_lng - lng) * fractions, hour)
+        return float(np.sum((distance_km / steps) / speeds) * 3600)
+
+    def to_dict(self):
+        return {
+            'cell_km': self.cell_km,
+            'keys': self.keys,
+            'speeds': self.speeds,
+            'hourly': self.hourly,
+            'built_at': self.built_at,
+        }
+
+_profiles = None
+_profiles_loaded_at = 0.0
+
+def get_speed_profiles():
+    """
+    The precomputed speed profiles, reloaded from the cache every few
+    minutes so a rebuild reaches every process
+    """
+    global _profiles, _profiles_loaded_at
+    if _profiles is None or time.monotonic() - _profiles_loaded_at > PROFILES_RELOAD_SECONDS:
+        stored = cache.get(PROFILES_CACHE_KEY)
+        _profiles = SpeedProfiles(**stored) if stored else SpeedProfiles.empty()
+        _profiles_loaded_at = time.monotonic()
+    return _profiles
+
+def rebuild_speed_profiles(days=None):
+    """
+    Recompute the speed profiles from the last `days` of tracking history
+    and publish them to every process
+    """
+    global _profiles, _profiles_loaded_at
+    days = days or settings.BRIDGEDASH_ETA_HISTORY_DAYS
+    rows = DeliveryTracking.objects.filter(
+        timestamp__gte=timezone.now() - timedelta(days=days)
+    ).order_by('delivery_id', 'timestamp').values_list('delivery_id', 'driver_lat', 'driver_lng', 'timestamp')
+
+    profiles = SpeedProfiles.build(rows.iterator(chunk_size=5000))
+    cache.set(PROFILES_CACHE_KEY, profiles.to_dict(), timeout=None)
+    _profiles, _profiles_loaded_at = profiles, time.monotonic()
+    return profiles
+
+def eta_target(delivery):
+    """
+    Where the driver is heading next: ('pickup', lat, lng) before pickup,
+    ('dropoff', lat, lng) after, or None when not on the way
+    """
+    if delivery.status == 'accepted':
+        return ('pickup', delivery.pickup_lat, delivery.pickup_lng)
+    if delivery.status in ('picked_up', 'in_transit'):
+        return ('dropoff', delivery.delivery_lat, delivery.delivery_lng)
+    return None
+
+def get_delivery_eta(delivery_id, lat, lng, delivery=None):
+    """
+    ETA of an active delivery's driver at (lat, lng) as {'target',
+    'seconds', 'arrival'}, or None.
+
+    The cached ETA is reused until the driver has moved
+    BRIDGEDASH_ETA_RECOMPUTE_M from where it was computed, or the delivery
+    (when given) has moved on to another target.
+    """
+    cache_key = eta_cache_key(delivery_id)
+    entry = cache.get(cache_key)
+    if entry is not None and (delivery is None or entry['status'] == delivery.status):
+        moved_m = haversine_km(entry['lat'], entry['lng'], lat, lng) * 1000
+        if moved_m < settings.BRIDGEDASH_ETA_RECOMPUTE_M:
+            return entry['eta']
+
+    if delivery is None:
+        delivery = Delivery.objects.only(
+            'status', 'pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng'
+        ).filter(id=delivery_id).first()
+    target = eta_target(delivery) if delivery else None
+    if target is None:
+        cache.delete(cache_key)
+        return None
+
+    now = timezone.now()
+    seconds = get_speed_profiles().travel_seconds(lat, lng, target[1], target[2], now)
+    eta = {
+        'target': target[0],
+        'seconds': int(round(seconds)),
+        'arrival': (now + timedelta(seconds=seconds)).isoformat(),
+    }
+    cache.set(cache_key, {'lat': lat, 'lng': lng, 'status': delivery.status, 'eta': eta}, timeout=ETA_CACHE_TIMEOUT)
+    return eta
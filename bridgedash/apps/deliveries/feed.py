@@ -0,0 +1,76 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.template.loader import render_to_string
+
+from .models import Delivery
+from .spatial import KM_PER_DEGREE, get_driver_index, grid_cell, haversine_km
+
+FEED_VERSION_KEY = 'feed:pending:version'
+
+# Deliveries shown in the driver's available-deliveries feed
+FEED_SIZE = 10
+
+def _new_version():
+    return f'{time.time_ns():x}'
+
+def pending_feed_version():
+    """
+    Version of the pending-deliveries feed; changes whenever a delivery
+    enters or leaves the pending state, and at least every
+    BRIDGEDASH_FEED_TTL seconds so relative times stay current
+    """
+    version = cache.get(FEED_VERSION_KEY)
+    if version is None:
+        cache.add(FEED_VERSION_KEY, _new_version(), timeout=settings.BRIDGEDASH_FEED_TTL)
+        version = cache.get(FEED_VERSION_KEY)
+    return version
+
+def invalidate_pending_feed():
+    transaction.on_commit(lambda: cache.set(FEED_VERSION_KEY, _new_version(), timeout=settings.BRIDGEDASH_FEED_TTL))
+
+def driver_zone(driver_id):
+    """
+    Feed zone (grid cell) of an indexed driver, or None if their position
+    is unknown. Read from the driver index, so it costs no database query.
+    """
+    position = get_driver_index().position(driver_id)
+    if position is None:
+        return None
+    return grid_cell(position[0], position[1], settings.BRIDGEDASH_FEED_ZONE_KM)
+
+def zone_centre(zone):
+    cell_deg = settings.BRIDGEDASH_FEED_ZONE_KM / KM_PER_DEGREE
+    return ((zone[0] + 0.5) * cell_deg, (zone[1] + 0.5) * cell_deg)
+
+def pending_feed(zone=None):
+    """
+    Newest pending deliveries, with the pickup distance from the zone's
+    centre as `pickup_distance_km` when the zone is known
+    """
+    deliveries = list(
+        Delivery.objects.filter(status='pending').order_by('-created_at')[:FEED_SIZE]
+    )
+    if zone is not None:
+        lat, lng = zone_centre(zone)
+        for delivery in deliveries:
+            delivery.pickup_distance_km = haversine_km(lat, lng, delivery.pickup_lat, delivery.pickup_lng)
+    return deliveries
+
+def feed_etag(zone, version):
+    zone_part = 'all' if zone is None else f'{zone[0]},{zone[1]}'
+    return f'"feed:{zone_part}:{version}"'
+
+def render_pending_feed(zone, version):
+    """
+    Rendered feed fragment for a zone, cached until the feed version changes
+    """
+    cache_key = f'feed:pending:html:{feed_etag(zone, version)}'
+    html = cache.get(cache_key)
+    if html is None:
+        html = render_to_string('partials/available_deliveries.html', {
+            'available_deliveries': pending_feed(zone),
+        })
+        cache.set(cache_key, html, timeout=settings.BRIDGEDASH_FEED_TTL)
+    return html
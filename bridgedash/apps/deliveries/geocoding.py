@@ -0,0 +1,277 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .models import GeocodedAddress
+from .spatial import haversine_km
+
+logger = logging.getLogger(__name__)
+
+GeocodeResult = namedtuple('GeocodeResult', ['lat', 'lng', 'source'])
+
+# Cached in place of a result for addresses the gazetteer doesn't know, for
+# BRIDGEDASH_GEOCODE_MISS_TTL seconds: long enough that one order's pickup
+# and drop-off share a lookup, short enough that an address geocoded by
+# another process is picked up promptly
+NOT_FOUND = GeocodeResult(None, None, 'not_found')
+
+# Spelling variants folded together so "12 Main St." and "12 main street"
+# share one gazetteer entry
+ABBREVIATIONS = {
+    'st': 'street',
+    'rd': 'road',
+    'ave': 'avenue',
+    'av': 'avenue',
+    'dr': 'drive',
+    'cres': 'crescent',
+    'cnr': 'corner',
+    'opp': 'opposite',
+    'nr': 'near',
+}
+
+def normalize_address(address):
+    """
+    Canonical form of an address used as the gazetteer and cache key
+    """
+    words = re.sub(r'[^a-z0-9]+', ' ', address.lower()).split()
+    return ' '.join(ABBREVIATIONS.get(word, word) for word in words)[:255]
+
+class LRUCache:
+    """
+    Thread-safe in-process mapping that evicts the least recently used
+    entry once `max_size` entries are held. Entries expire `ttl` seconds
+    (or their own ttl) after they were set, so changes made by other
+    processes show up.
+    """
+
+    def __init__(self, max_size, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+class GazetteerGeocoder:
+    """
+    Addresses and landmarks stored in GeocodedAddress
+    """
+
+    def geocode(self, normalized, address):
+        row = GeocodedAddress.objects.filter(normalized=normalized).values_list('lat', 'lng').first()
+        return GeocodeResult(row[0], row[1], 'gazetteer') if row else None
+
+class NominatimGeocoder:
+    """
+    OpenStreetMap Nominatim, biased towards the service area. Only called
+    from Celery, never while a request waits.
+    """
+
+    def __init__(self):
+        self._geolocator = None
+
+    @property
+    def geolocator(self):
+        if self._geolocator is None:
+            from geopy.geocoders import Nominatim
+            self._geolocator = Nominatim(user_agent='bridgedash', timeout=settings.BRIDGEDASH_GEOCODER_TIMEOUT)
+        return self._geolocator
+
+    def geocode(self, normalized, address):
+        query = address
+        if settings.BRIDGEDASH_GEOCODER_REGION.lower() not in normalized:
+            query = f'{address}, {settings.BRIDGEDASH_GEOCODER_REGION}'
+        location = self.geolocator.geocode(query, country_codes=settings.BRIDGEDASH_GEOCODER_COUNTRY)
+        return GeocodeResult(location.latitude, location.longitude, 'nominatim') if location else None
+
+REMOTE_GEOCODERS = {
+    'nominatim': NominatimGeocoder,
+}
+
+address_cache = LRUCache(settings.BRIDGEDASH_GEOCODE_CACHE_SIZE, settings.BRIDGEDASH_GEOCODE_CACHE_TTL)
+_gazetteer = GazetteerGeocoder()
+_remote = None
+
+def warm_address_cache():
+    """
+    Load the most recent gazetteer entries into the in-process cache, so
+    common addresses resolve without a query
+    """
+    rows = GeocodedAddress.objects.order_by('-created_at').values_list('normalized', 'lat', 'lng')
+    for normalized, lat, lng in rows[:address_cache.max_size]:
+        address_cache.set(normalized, GeocodeResult(lat, lng, 'gazetteer'))
+
+def get_remote_geocoder():
+    """
+    The configured remote geocoder, or None when remote lookups are disabled
+    """
+    global _remote
+    backend = settings.BRIDGEDASH_GEOCODER_REMOTE
+    if not backend:
+        return None
+    if _remote is None:
+        _remote = REMOTE_GEOCODERS[backend]()
+    return _remote
+
+def geocode(address):
+    """
+    Resolve an address locally: the in-process LRU cache first, then the
+    gazetteer table. Returns a GeocodeResult, or None on a miss (see
+    geocode_remote for the slow path). Misses are cached briefly too.
+    """
+    normalized = normalize_address(address)
+    if not normalized:
+        return None
+    result = address_cache.get(normalized)
+    if result is None:
+        result = _gazetteer.geocode(normalized, address)
+        if result is None:
+            address_cache.set(normalized, NOT_FOUND, settings.BRIDGEDASH_GEOCODE_MISS_TTL)
+            return None
+        address_cache.set(normalized, result)
+    return None if result is NOT_FOUND else result
+
+def geocode_remote(address):
+    """
+    Resolve an address with the remote geocoder and store the answer in the
+    gazetteer so the next lookup is local
+    """
+    geocoder = get_remote_geocoder()
+    normalized = normalize_address(address)
+    if geocoder is None or not normalized:
+        return None
+
+    try:
+        result = geocoder.geocode(normalized, address)
+    except Exception as e:
+        logger.error(f"Error geocoding '{address}': {e}")
+        return None
+    if result is not None:
+        remember_address(address, result.lat, result.lng, result.source)
+    return result
+
+def remember_address(address, lat, lng, source):
+    """
+    Add an address to the gazetteer (keeping any existing entry) and cache it
+    """
+    normalized = normalize_address(address)
+    try:
+        with transaction.atomic():
+            GeocodedAddress.objects.get_or_create(
+                normalized=normalized,
+                defaults={'address': address.strip(), 'lat': lat, 'lng': lng, 'source': source}
+            )
+    except IntegrityError:
+        # Stored concurrently by another worker
+        pass
+    address_cache.discard(normalized)
+    return geocode(address)
+
+def seed_gazetteer(delivery_rows=None):
+    """
+    Add the addresses of past deliveries to the gazetteer. Ends still at the
+    default location were never really geocoded and are skipped; for an
+    address seen several times the most recent coordinates win. Returns the
+    number of new entries.
+    """
+    from .models import Delivery
+
+    if delivery_rows is None:
+        delivery_rows = Delivery.objects.order_by('created_at').values_list(
+            'pickup_address', 'pickup_lat', 'pickup_lng',
+            'delivery_address', 'delivery_lat', 'delivery_lng',
+        ).iterator()
+
+    default = default_location()
+    found = {}
+    for pickup_address, pickup_lat, pickup_lng, delivery_address, delivery_lat, delivery_lng in delivery_rows:
+        for address, lat, lng in ((pickup_address, pickup_lat, pickup_lng), (delivery_address, delivery_lat, delivery_lng)):
+            normalized = normalize_address(address)
+            if normalized and (lat, lng) != (default.lat, default.lng):
+                found[normalized] = (address.strip(), lat, lng)
+
+    known = set(GeocodedAddress.objects.filter(normalized__in=found).values_list('normalized', flat=True))
+    new = [
+        GeocodedAddress(normalized=normalized, address=address, lat=lat, lng=lng, source='delivery')
+        for normalized, (address, lat, lng) in found.items()
+        if normalized not in known
+    ]
+    GeocodedAddress.objects.bulk_create(new, batch_size=500, ignore_conflicts=True)
+    address_cache.clear()
+    warm_address_cache()
+    return len(new)
+
+def default_location():
+    return GeocodeResult(settings.BRIDGEDASH_DEFAULT_LAT, settings.BRIDGEDASH_DEFAULT_LNG, 'default')
+
+def distance_km(pickup, dropoff):
+    """
+    Great-circle trip distance between two GeocodeResults, as stored on
+    Delivery.distance_km
+    """
+    return Decimal(str(round(haversine_km(pickup.lat, pickup.lng, dropoff.lat, dropoff.lng), 2)))
+
+def locate_delivery(delivery):
+    """
+    Set a delivery's coordinates and distance from its addresses using the
+    local geocoder. Returns True if both ends were found; otherwise the
+    missing end falls back to the default location, and the distance to
+    BRIDGEDASH_DEFAULT_DISTANCE_KM, until geocode_delivery resolves it.
+    """
+    pickup = geocode(delivery.pickup_address)
+    dropoff = geocode(delivery.delivery_address)
+    resolved = pickup is not None and dropoff is not None
+    pickup = pickup or default_location()
+    dropoff = dropoff or default_location()
+
+    delivery.pickup_lat, delivery.pickup_lng = pickup.lat, pickup.lng
+    delivery.delivery_lat, delivery.delivery_lng = dropoff.lat, dropoff.lng
+    if resolved:
+        delivery.distance_km = distance_km(pickup, dropoff)
+    else:
+        delivery.distance_km = Decimal(str(settings.BRIDGEDASH_DEFAULT_DISTANCE_KM))
+    return resolved
+
+def schedule_geocoding(delivery_id):
+    from .tasks import geocode_delivery
+    if get_remote_geocoder() is None:
+        return
+    try:
+        geocode_delivery.delay(delivery_id)
+    except Exception as e:
+        logger.error(f"Error scheduling geocoding for delivery {delivery_id}: {e}")
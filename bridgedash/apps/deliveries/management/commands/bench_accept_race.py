@@ -0,0 +1,143 @@
+import random
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from bridgedash.apps.chat.models import ChatRoom
+from bridgedash.apps.users.models import User, Customer, Driver
+from bridgedash.apps.deliveries import views
+from bridgedash.apps.deliveries.acceptance import announce_acceptance
+from bridgedash.apps.deliveries.models import Delivery
+from bridgedash.apps.deliveries.presence import get_driver_presence
+
+class Command(BaseCommand):
+    help = (
+        'Fire N simultaneous accepts at one pending delivery and report latency and '
+        'whether exactly one driver won (needs a database with row locking, e.g. PostgreSQL; '
+        'creates committed rows and deletes them afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=50)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument(
+            '--mode',
+            choices=['conditional', 'locking', 'both'],
+            default='both',
+            help="'conditional' is accept_delivery; 'locking' is the old select_for_update path"
+        )
+
+    def handle(self, *args, **options):
+        modes = ['locking', 'conditional'] if options['mode'] == 'both' else [options['mode']]
+        customer, drivers = self._seed(options['drivers'])
+        failures = []
+        try:
+            self.stdout.write(f"{'mode':<12} {'accepts':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'winners':>12}")
+            for mode in modes:
+                latencies = []
+                winners = []
+                for _ in range(options['rounds']):
+                    round_latencies, round_winners = self._race(mode, customer, drivers)
+                    latencies.extend(round_latencies)
+                    winners.append(round_winners)
+                    if round_winners != 1:
+                        failures.append(f'{mode}: {round_winners} winners in one round')
+                self.stdout.write(
+                    f"{mode:<12} {len(latencies):>8} {statistics.median(latencies):>8.1f} "
+                    f"{self._p99(latencies):>8.1f} {max(latencies):>8.1f} "
+                    f"{'exactly 1' if set(winners) == {1} else ','.join(map(str, winners)):>12}"
+                )
+        finally:
+            presence = get_driver_presence()
+            for driver in drivers:
+                presence.go_offline(driver.pk)
+            User.objects.filter(pk__in=[customer.pk] + [driver.pk for driver in drivers]).delete()
+
+        if failures:
+            raise CommandError('Acceptance race check failed:\n' + '\n'.join(failures))
+
+    def _seed(self, count):
+        suffix = random.randint(100000, 999999)
+        customer_user = User.objects.create(username=f'race_c{suffix}', phone=f'rc{suffix}', role='customer', status='active')
+        customer = Customer.objects.create(user=customer_user, address='Race')
+        users = User.objects.bulk_create([
+            User(username=f'race_d{suffix}_{i}', phone=f'rd{suffix}{i}', role='driver', status='active')
+            for i in range(count)
+        ])
+        drivers = Driver.objects.bulk_create([
+            Driver(user=user, bike_registration='RACE', id_number='RACE', is_online=True, current_lat=-22.2167, current_lng=30.0)
+            for user in users
+        ])
+        presence = get_driver_presence()
+        for driver in drivers:
+            presence.go_online(driver.pk, driver.current_lat, driver.current_lng)
+        return customer, drivers
+
+    def _race(self, mode, customer, drivers):
+        delivery = Delivery.objects.create(
+            customer=customer,
+            pickup_address='Race',
+            delivery_address='Race',
+            item_description='Race'
+        )
+        ChatRoom.objects.create(delivery=delivery)
+        factory = RequestFactory()
+        barrier = threading.Barrier(len(drivers))
+        latencies = []
+        winners = []
+        lock = threading.Lock()
+
+        def accept(driver):
+            request = factory.post(f'/deliveries/driver/accept-delivery/{delivery.id}/')
+            request.user = User.objects.select_related('driver').get(pk=driver.pk)
+            try:
+                barrier.wait()
+                start = time.perf_counter()
+                if mode == 'locking':
+                    won = self._accept_locked(delivery.id, request.user.driver)
+                else:
+                    won = views.accept_delivery(request, delivery.id).status_code == 200
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    if won:
+                        winners.append(driver.pk)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=accept, args=(driver,)) for driver in drivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stored = Delivery.objects.get(id=delivery.id)
+        if len(winners) == 1 and stored.driver_id != winners[0]:
+            raise CommandError(f'Delivery {delivery.id} went to driver {stored.driver_id}, not winner {winners[0]}')
+        return latencies, len(winners)
+
+    def _accept_locked(self, delivery_id, driver):
+        # accept_delivery before conditional claims: every racer queues on
+        # the row lock while the winner's side effects run under it
+        try:
+            with transaction.atomic():
+                delivery = Delivery.objects.select_for_update().select_related('customer__user').get(
+                    id=delivery_id,
+                    status='pending'
+                )
+                delivery.driver = driver
+                delivery.status = 'accepted'
+                delivery.accepted_at = timezone.now()
+                delivery.save()
+                announce_acceptance(delivery, driver)
+        except Delivery.DoesNotExist:
+            return False
+        return True
+
+    def _p99(self, values):
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
@@ -0,0 +1,184 @@
+import asyncio
+import random
+import statistics
+import time
+from asgiref.sync import SyncToAsync, async_to_sync, sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import RequestFactory
+
+from bridgedash.apps.notifications import views as notification_views
+from bridgedash.apps.users.models import User, Customer, Driver
+from bridgedash.apps.deliveries import views
+from bridgedash.apps.deliveries.models import Delivery
+from bridgedash.apps.deliveries.presence import get_driver_presence
+from bridgedash.apps.deliveries.tracking import tracking_buffer
+
+ENDPOINTS = {
+    'location': views.update_driver_location,
+    'status': views.get_delivery_status,
+    'toggle': views.driver_online_toggle,
+    'unread': notification_views.unread_notifications_count,
+}
+
+# Degrees of latitude a driver moves between fixes, about 15 m
+STEP_DEG = 0.000135
+
+class Command(BaseCommand):
+    help = (
+        'Drive the hot JSON endpoints with N concurrent clients on one event loop, '
+        'natively async and serialized through the one sync thread as sync views '
+        'would be, and report throughput, latency, sync-thread queue depth and event '
+        'loop lag (creates committed rows and deletes them afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=5, help='Requests per client')
+        parser.add_argument('--think-ms', type=float, default=1000.0, help='Mean pause between a client\'s requests')
+        parser.add_argument('--endpoint', choices=list(ENDPOINTS) + ['all'], default='all')
+        parser.add_argument('--mode', choices=['sync', 'async', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        endpoints = list(ENDPOINTS) if options['endpoint'] == 'all' else [options['endpoint']]
+        modes = ['sync', 'async'] if options['mode'] == 'both' else [options['mode']]
+        self._seed(options['clients'])
+        try:
+            self.stdout.write(
+                f"{'endpoint':<10} {'mode':<6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>9} "
+                f"{'queue max':>10} {'queue avg':>10} {'pool max':>9} {'lag max ms':>11} {'errors':>7}"
+            )
+            for endpoint in endpoints:
+                for mode in modes:
+                    result = asyncio.run(self._run(endpoint, mode, options))
+                    close_old_connections()
+                    self.stdout.write(
+                        f"{endpoint:<10} {mode:<6} {result['throughput']:>8.0f} {result['p50']:>8.1f} "
+                        f"{result['p99']:>9.1f} {result['queue_max']:>10} {result['queue_mean']:>10.1f} "
+                        f"{result['pool_max']:>9} {result['lag_max']:>11.1f} {result['errors']:>7}"
+                    )
+        finally:
+            tracking_buffer.flush()
+            presence = get_driver_presence()
+            for driver in self.drivers:
+                presence.go_offline(driver.pk)
+            User.objects.filter(pk__in=[self.customer.pk] + [driver.pk for driver in self.drivers]).delete()
+
+    def _seed(self, count):
+        suffix = random.randint(100000, 999999)
+        customer_user = User.objects.create(username=f'av_c{suffix}', phone=f'ac{suffix}', role='customer', status='active')
+        self.customer = Customer.objects.create(user=customer_user, address='Async')
+        users = User.objects.bulk_create([
+            User(username=f'av_d{suffix}_{i}', phone=f'ad{suffix}{i}', role='driver', status='active')
+            for i in range(count)
+        ])
+        self.drivers = Driver.objects.bulk_create([
+            Driver(
+                user=user,
+                bike_registration='ASYNC',
+                id_number='ASYNC',
+                is_online=True,
+                current_lat=-22.2167 + random.uniform(-0.05, 0.05),
+                current_lng=30.0 + random.uniform(-0.05, 0.05)
+            )
+            for user in users
+        ])
+        # Every driver is on a delivery, so each fix takes the full path
+        self.deliveries = Delivery.objects.bulk_create([
+            Delivery(
+                customer=self.customer,
+                driver=driver,
+                status='accepted',
+                pickup_address='Async',
+                delivery_address='Async',
+                item_description='Async',
+                pickup_lat=driver.current_lat + 0.01,
+                pickup_lng=driver.current_lng,
+                delivery_lat=driver.current_lat + 0.03,
+                delivery_lng=driver.current_lng
+            )
+            for driver in self.drivers
+        ])
+        self.users = {user.pk: user for user in User.objects.filter(pk__in=[customer_user.pk] + [user.pk for user in users])}
+
+    def _request(self, endpoint, client, step):
+        factory = RequestFactory()
+        driver = self.drivers[client]
+        if endpoint == 'location':
+            request = factory.post('/deliveries/driver/update-location/', {
+                'lat': driver.current_lat + step * STEP_DEG,
+                'lng': driver.current_lng
+            })
+            return request, driver.pk, {}
+        if endpoint == 'status':
+            delivery = random.choice(self.deliveries)
+            request = factory.get(f'/deliveries/customer/status/{delivery.id}/')
+            return request, self.customer.pk, {'delivery_id': delivery.id}
+        if endpoint == 'toggle':
+            return factory.post('/deliveries/driver/online-toggle/'), driver.pk, {}
+        return factory.get('/notifications/unread-count/'), driver.pk, {}
+
+    async def _run(self, endpoint, mode, options):
+        view = ENDPOINTS[endpoint]
+        if mode == 'sync':
+            # The ASGI handler runs a sync view on the one thread-sensitive
+            # thread; blocking that thread for the whole view is the
+            # baseline the async view is measured against
+            view = sync_to_async(async_to_sync(view), thread_sensitive=True)
+        loop = asyncio.get_running_loop()
+        think = options['think_ms'] / 1000
+        latencies = []
+        errors = 0
+        samples = []
+        lags = []
+        pool_max = 0
+        running = True
+
+        async def client(index):
+            nonlocal errors
+            # Spread the clients' first requests over one think time
+            await asyncio.sleep(random.uniform(0, think))
+            for step in range(1, options['requests'] + 1):
+                request, user_pk, kwargs = self._request(endpoint, index, step)
+                request.user = self.users[user_pk]
+                start = time.perf_counter()
+                try:
+                    response = await view(request, **kwargs)
+                    if response.status_code >= 400:
+                        errors += 1
+                except Exception:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(random.expovariate(1 / think) if think else 0)
+
+        async def monitor():
+            nonlocal pool_max
+            interval = 0.01
+            while running:
+                expected = loop.time() + interval
+                await asyncio.sleep(interval)
+                lags.append(max(0.0, loop.time() - expected) * 1000)
+                samples.append(SyncToAsync.single_thread_executor._work_queue.qsize())
+                default_executor = getattr(loop, '_default_executor', None)
+                if default_executor is not None:
+                    pool_max = max(pool_max, default_executor._work_queue.qsize())
+
+        monitor_task = asyncio.create_task(monitor())
+        start = time.perf_counter()
+        await asyncio.gather(*(client(index) for index in range(len(self.drivers))))
+        elapsed = time.perf_counter() - start
+        running = False
+        await monitor_task
+        await sync_to_async(close_old_connections, thread_sensitive=True)()
+
+        latencies.sort()
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': statistics.median(latencies),
+            'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+            'queue_max': max(samples, default=0),
+            'queue_mean': statistics.fmean(samples) if samples else 0.0,
+            'pool_max': pool_max,
+            'lag_max': max(lags, default=0.0),
+            'errors': errors,
+        }
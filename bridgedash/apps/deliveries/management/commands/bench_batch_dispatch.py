@@ -0,0 +1,79 @@
+import random
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bridgedash.apps.deliveries.dispatch import match_deliveries
+from bridgedash.apps.deliveries.pricing import haversine_km_many
+
+# Synthetic fleets are spread over a square this many km wide
+AREA_KM = 20.0
+KM_PER_DEGREE = 111.32
+
+class Command(BaseCommand):
+    help = 'Compare batch assignment with first-come dispatch on synthetic fleets (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fleets', default='50,100,250,500,1000,2000')
+        parser.add_argument(
+            '--load',
+            type=float,
+            default=0.5,
+            help='Pending deliveries per driver in each batch (default: 0.5)'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        max_pickup_km = settings.BRIDGEDASH_DISPATCH_MAX_PICKUP_KM
+        batch_size = settings.BRIDGEDASH_DISPATCH_BATCH_SIZE
+
+        self.stdout.write(
+            f"{'drivers':>8} {'deliveries':>10} {'solve ms':>9} {'batch km':>9} "
+            f"{'first-come km':>14} {'greedy km':>10} {'matched':>8}"
+        )
+        for fleet in [int(size) for size in options['fleets'].split(',')]:
+            count = max(1, int(fleet * options['load']))
+            drivers = [self._point(rng) for _ in range(fleet)]
+            pickups = [self._point(rng) for _ in range(count)]
+
+            start = time.perf_counter()
+            pairs = match_deliveries(pickups, drivers, max_pickup_km)
+            solve_ms = (time.perf_counter() - start) * 1000
+
+            batch_km = self._mean([distance for _, _, distance in pairs])
+            first_come = self._sequential(pickups, drivers, max_pickup_km, lambda nearest: rng.choice(nearest[:batch_size]))
+            greedy = self._sequential(pickups, drivers, max_pickup_km, lambda nearest: nearest[0])
+            self.stdout.write(
+                f"{fleet:>8} {count:>10} {solve_ms:>9.1f} {batch_km:>9.2f} "
+                f"{self._mean(first_come):>14.2f} {self._mean(greedy):>10.2f} {len(pairs):>8}"
+            )
+
+    def _point(self, rng):
+        half = AREA_KM / 2 / KM_PER_DEGREE
+        return (
+            settings.BRIDGEDASH_DEFAULT_LAT + rng.uniform(-half, half),
+            settings.BRIDGEDASH_DEFAULT_LNG + rng.uniform(-half, half),
+        )
+
+    def _sequential(self, pickups, drivers, max_pickup_km, choose):
+        """
+        Pickup distances when deliveries are dispatched one at a time in
+        arrival order, each taken by `choose` from its nearest free drivers
+        """
+        drivers = np.asarray(drivers)
+        free = np.ones(len(drivers), dtype=bool)
+        distances = []
+        for lat, lng in pickups:
+            to_drivers = haversine_km_many(lat, lng, drivers[:, 0], drivers[:, 1])
+            nearest = [i for i in np.argsort(to_drivers) if free[i] and to_drivers[i] <= max_pickup_km]
+            if not nearest:
+                continue
+            chosen = choose(nearest)
+            free[chosen] = False
+            distances.append(float(to_drivers[chosen]))
+        return distances
+
+    def _mean(self, values):
+        return sum(values) / len(values) if values else 0.0
@@ -0,0 +1,106 @@
+import json
+import random
+import time
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from bridgedash.apps.users.models import User, Customer, Driver
+from bridgedash.apps.deliveries import views
+from bridgedash.apps.deliveries.models import Delivery, DeliveryTracking
+from bridgedash.apps.deliveries.tracking import tracking_buffer
+
+class Command(BaseCommand):
+    help = 'Benchmark location ingest: per-point POSTs against the batch endpoint (runs in a rolled-back transaction)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=50)
+
+    def handle(self, *args, **options):
+        total = options['points']
+        batch_size = options['batch_size']
+        factory = RequestFactory()
+
+        # Keep the background flusher out of the measurement
+        saved = (tracking_buffer.max_size, tracking_buffer.max_age)
+        tracking_buffer.max_age = 3600
+
+        try:
+            # Measure raw ingest cost, not how many synthetic fixes the filter keeps
+            with transaction.atomic(), override_settings(BRIDGEDASH_TRACKING_MAX_SPEED_KMH=float('inf'), BRIDGEDASH_TRACKING_MIN_DISTANCE_M=0):
+                driver = self._seed()
+                rows = []
+
+                tracking_buffer.max_size = 1
+                rows.append(self._run('per-point POST, unbuffered', total, lambda points: self._post_single(factory, driver, points), 1))
+
+                tracking_buffer.max_size = saved[0]
+                rows.append(self._run('per-point POST, buffered', total, lambda points: self._post_single(factory, driver, points), 1))
+
+                rows.append(self._run(f'batch POST ({batch_size}/request)', total, lambda points: self._post_batch(factory, driver, points), batch_size))
+
+                self._report(rows)
+                transaction.set_rollback(True)
+        finally:
+            tracking_buffer.max_size, tracking_buffer.max_age = saved
+
+    def _seed(self):
+        suffix = random.randint(100000, 999999)
+        customer_user = User.objects.create(username=f'bench_customer_{suffix}', phone=f'b{suffix}c', role='customer', status='active')
+        customer = Customer.objects.create(user=customer_user, address='Benchmark')
+        driver_user = User.objects.create(username=f'bench_driver_{suffix}', phone=f'b{suffix}d', role='driver', status='active')
+        driver = Driver.objects.create(user=driver_user, bike_registration='BENCH', id_number='BENCH', is_online=True)
+        self.driver_id = driver.pk
+        Delivery.objects.create(
+            customer=customer,
+            driver=driver,
+            status='in_transit',
+            pickup_address='Benchmark',
+            delivery_address='Benchmark',
+            item_description='Benchmark'
+        )
+        return driver
+
+    def _points(self, count):
+        now = time.time() * 1000
+        return [
+            {'lat': -22.2167 + i * 1e-5, 'lng': 30.0 + i * 1e-5, 'timestamp': now - (count - i) * 1000}
+            for i in range(count)
+        ]
+
+    def _post_single(self, factory, driver, points):
+        for point in points:
+            request = factory.post('/deliveries/driver/update-location/', {'lat': point['lat'], 'lng': point['lng']})
+            request.user = driver.user
+            async_to_sync(views.update_driver_location)(request)
+
+    def _post_batch(self, factory, driver, points):
+        request = factory.post(
+            '/deliveries/driver/update-location/batch/',
+            data=json.dumps({'points': points}),
+            content_type='application/json'
+        )
+        request.user = driver.user
+        views.update_driver_location_batch(request)
+
+    def _run(self, label, total, send, chunk):
+        points = self._points(total)
+        cache.delete(f'tracking:last:driver:{self.driver_id}')
+        before = DeliveryTracking.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for start in range(0, total, chunk):
+                send(points[start:start + chunk])
+            tracking_buffer.flush()
+            elapsed = time.perf_counter() - started
+        stored = DeliveryTracking.objects.count() - before
+        return (label, total / elapsed, len(queries) / total, stored)
+
+    def _report(self, rows):
+        self.stdout.write(f"{'mode':<32} {'points/sec':>12} {'queries/point':>14} {'rows':>8}")
+        for label, rate, queries_per_point, stored in rows:
+            self.stdout.write(f"{label:<32} {rate:>12.0f} {queries_per_point:>14.2f} {stored:>8}")
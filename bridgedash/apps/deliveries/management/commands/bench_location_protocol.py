@@ -0,0 +1,98 @@
+import json
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bridgedash.apps.deliveries.protocol import LocationDecoder, LocationEncoder
+
+class Command(BaseCommand):
+    help = (
+        'Encode a simulated stream of driver.location_update events as JSON and with the '
+        'binary location protocol, and report encode time and bytes per 1,000 updates'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--updates', type=int, default=1000)
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between fixes')
+
+    def handle(self, *args, **options):
+        events = self._events(options['updates'], options['interval'])
+        self._check_round_trip(events)
+
+        results = {}
+        for name, encode in (('json', self._encode_json), ('binary', self._encode_binary)):
+            timings = []
+            for _ in range(options['rounds']):
+                start = time.perf_counter()
+                frames = encode(events)
+                timings.append(time.perf_counter() - start)
+            results[name] = (min(timings), sum(len(frame) for frame in frames))
+
+        per_thousand = 1000 / len(events)
+        self.stdout.write(f"{'encoding':<10} {'ms/1k':>8} {'bytes/1k':>10} {'bytes/update':>13}")
+        for name, (seconds, size) in results.items():
+            self.stdout.write(
+                f"{name:<10} {seconds * 1000 * per_thousand:>8.2f} {size * per_thousand:>10.0f} {size / len(events):>13.1f}"
+            )
+        json_bytes, binary_bytes = results['json'][1], results['binary'][1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Binary frames are {binary_bytes / json_bytes:.0%} of the JSON bytes, '
+            f'encoded in {results["binary"][0] / results["json"][0]:.0%} of the time'
+        ))
+
+    def _events(self, count, interval):
+        # A driver riding at 15-40 km/h; the ETA is recomputed every tenth fix
+        lat, lng = -22.2167, 30.0
+        fixed_at = timezone.now()
+        eta = None
+        events = []
+        for i in range(count):
+            step_m = random.uniform(15, 40) / 3.6 * interval
+            lat += random.uniform(-1, 1) * step_m / 111320
+            lng += random.uniform(-1, 1) * step_m / 111320
+            fixed_at += timedelta(seconds=interval * random.uniform(0.8, 1.2))
+            if i % 10 == 0:
+                seconds = random.randint(60, 1800)
+                eta = {
+                    'target': 'pickup' if i < count // 2 else 'dropoff',
+                    'seconds': seconds,
+                    'arrival': (fixed_at + timedelta(seconds=seconds)).isoformat(),
+                }
+            events.append({
+                'type': 'driver.location_update',
+                'delivery_id': 1,
+                'lat': lat,
+                'lng': lng,
+                'timestamp': fixed_at.isoformat(),
+                'eta': eta,
+            })
+        return events
+
+    def _encode_json(self, events):
+        # As DeliveryConsumer.driver_location_update sends it
+        return [
+            json.dumps({
+                'type': 'location_update',
+                'lat': event['lat'],
+                'lng': event['lng'],
+                'timestamp': event['timestamp'],
+                'eta': event.get('eta')
+            }).encode()
+            for event in events
+        ]
+
+    def _encode_binary(self, events):
+        encoder = LocationEncoder()
+        return [encoder.encode(event) for event in events]
+
+    def _check_round_trip(self, events):
+        decoder = LocationDecoder()
+        for event, frame in zip(events, self._encode_binary(events)):
+            decoded = decoder.decode(frame)
+            if abs(decoded['lat'] - event['lat']) > 1e-6 or abs(decoded['lng'] - event['lng']) > 1e-6:
+                raise CommandError(f'Round trip moved the driver: {event} -> {decoded}')
+            if decoded['eta'] is not None and decoded['eta']['target'] != event['eta']['target']:
+                raise CommandError(f'Round trip changed the ETA: {event} -> {decoded}')
@@ -0,0 +1,59 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bridgedash.apps.deliveries.pricing import PricingEngine
+from bridgedash.apps.deliveries.spatial import haversine_km
+
+# Spread of generated trips around Beitbridge, in degrees
+SPREAD_DEG = 0.1
+
+class Command(BaseCommand):
+    help = 'Benchmark batch quotes (distance and fare) against the per-delivery Decimal path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,10000')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        engine = PricingEngine()
+
+        self.stdout.write(f"{'pairs':>8} {'scalar p50 ms':>14} {'batch p50 ms':>13} {'batch us/pair':>14}")
+        for size in sizes:
+            origins = [self._point() for _ in range(size)]
+            destinations = [self._point() for _ in range(size)]
+
+            scalar = self._time(options['repeat'], lambda: self._scalar(origins, destinations))
+            batch = self._time(options['repeat'], lambda: engine.quote_pairs(origins, destinations))
+            self.stdout.write(
+                f"{size:>8} {statistics.median(scalar):>14.3f} {statistics.median(batch):>13.3f} "
+                f"{statistics.median(batch) * 1000 / size:>14.3f}"
+            )
+
+    def _point(self):
+        return (
+            settings.BRIDGEDASH_DEFAULT_LAT + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+            settings.BRIDGEDASH_DEFAULT_LNG + random.uniform(-SPREAD_DEG, SPREAD_DEG),
+        )
+
+    def _scalar(self, origins, destinations):
+        # What Delivery.calculate_price did, one trip at a time
+        base_fare = Decimal(str(settings.BRIDGEDASH_BASE_FARE))
+        per_km_rate = Decimal(str(settings.BRIDGEDASH_PER_KM_RATE))
+        commission_rate = Decimal(str(settings.BRIDGEDASH_COMMISSION_RATE))
+        for (lat1, lng1), (lat2, lng2) in zip(origins, destinations):
+            distance = Decimal(str(round(haversine_km(lat1, lng1, lat2, lng2), 2)))
+            total = base_fare + distance * per_km_rate
+            total * commission_rate
+
+    def _time(self, repeat, fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
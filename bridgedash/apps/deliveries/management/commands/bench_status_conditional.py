@@ -0,0 +1,113 @@
+import random
+import statistics
+import time
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bridgedash.apps.users.models import User, Customer, Driver
+from bridgedash.apps.deliveries import views
+from bridgedash.apps.deliveries.models import Delivery
+from bridgedash.apps.deliveries.status import build_status_snapshot, snapshot_cache_key, version_cache_key
+from bridgedash.apps.deliveries.tracking import update_delivery_position
+
+class Command(BaseCommand):
+    help = (
+        'Load test get_delivery_status polling: DB queries and latency per poll '
+        'without the snapshot, with it, and with If-None-Match (rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, default=50, help='Open dashboards polling at once')
+        parser.add_argument('--polls', type=int, default=30, help='Polls per dashboard')
+        parser.add_argument(
+            '--move-every',
+            type=int,
+            default=3,
+            help='The driver reports a new position every N poll rounds'
+        )
+
+    def handle(self, *args, **options):
+        self.factory = RequestFactory()
+        with transaction.atomic():
+            deliveries = self._seed(options['customers'])
+            self.stdout.write(f"{'mode':<14} {'queries/poll':>12} {'304 share':>10} {'p50 ms':>8} {'p99 ms':>8}")
+            for mode in ('uncached', 'snapshot', 'conditional'):
+                for delivery in deliveries:
+                    cache.delete_many([snapshot_cache_key(delivery.id), version_cache_key(delivery.id)])
+                self._report(mode, self._load(mode, deliveries, options['polls'], options['move_every']))
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        suffix = random.randint(100000, 999999)
+        driver_user = User.objects.create(username=f'bench_driver_{suffix}', phone=f'b{suffix}d', role='driver', status='active')
+        driver = Driver.objects.create(user=driver_user, bike_registration='BENCH', id_number='BENCH', is_online=True)
+        deliveries = []
+        for i in range(count):
+            user = User.objects.create(username=f'bench_customer_{suffix}_{i}', phone=f'b{suffix}c{i}', role='customer', status='active')
+            customer = Customer.objects.create(user=user, address='Benchmark')
+            delivery = Delivery.objects.create(
+                customer=customer,
+                driver=driver,
+                status='in_transit',
+                pickup_address='Benchmark',
+                delivery_address='Benchmark',
+                item_description='Benchmark'
+            )
+            update_delivery_position(delivery.id, -22.2167, 30.0, timezone.now())
+            deliveries.append(delivery)
+        self._run_on_commit()
+        return deliveries
+
+    def _load(self, mode, deliveries, polls, move_every):
+        etags = {}
+        samples = []
+        queries = 0
+        not_modified = 0
+        for round_number in range(polls):
+            if round_number and round_number % move_every == 0:
+                for delivery in deliveries:
+                    update_delivery_position(delivery.id, -22.2167 + round_number * 1e-4, 30.0, timezone.now())
+                    # Inside the benchmark's transaction on_commit never fires,
+                    # so run the pending invalidations by hand
+                    self._run_on_commit()
+
+            for delivery in deliveries:
+                headers = {}
+                if mode == 'conditional' and delivery.id in etags:
+                    headers['HTTP_IF_NONE_MATCH'] = etags[delivery.id]
+                request = self.factory.get(f'/deliveries/customer/status/{delivery.id}/', **headers)
+                request.user = User.objects.get(pk=delivery.customer_id)
+
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as captured:
+                    if mode == 'uncached':
+                        # Every poll reads the delivery, driver and position
+                        build_status_snapshot(delivery.id, None)
+                        status_code = 200
+                    else:
+                        response = async_to_sync(views.get_delivery_status)(request, delivery.id)
+                        status_code = response.status_code
+                        etags[delivery.id] = response.get('ETag', etags.get(delivery.id))
+                samples.append((time.perf_counter() - started) * 1000)
+                queries += len(captured.captured_queries)
+                not_modified += status_code == 304
+        return samples, queries, not_modified
+
+    def _run_on_commit(self):
+        pending = connection.run_on_commit
+        connection.run_on_commit = []
+        for _, callback, *_ in pending:
+            callback()
+
+    def _report(self, mode, result):
+        samples, queries, not_modified = result
+        p99 = sorted(samples)[int(len(samples) * 0.99) - 1]
+        self.stdout.write(
+            f"{mode:<14} {queries / len(samples):>12.2f} {not_modified / len(samples):>10.0%} "
+            f"{statistics.median(samples):>8.3f} {p99:>8.3f}"
+        )
@@ -0,0 +1,86 @@
+import random
+import statistics
+import time
+from asgiref.sync import async_to_sync
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from bridgedash.apps.users.models import User, Customer, Driver
+from bridgedash.apps.deliveries import views
+from bridgedash.apps.deliveries.models import Delivery, DeliveryTracking
+from bridgedash.apps.deliveries.tracking import update_delivery_position
+
+class Command(BaseCommand):
+    help = 'Benchmark get_delivery_status poll latency as the track grows (runs in a rolled-back transaction)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000,10000,100000')
+        parser.add_argument('--polls', type=int, default=200)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        polls = options['polls']
+        factory = RequestFactory()
+
+        self.stdout.write(f"{'track points':>12} {'poll p50 ms':>12} {'poll p99 ms':>12} {'history scan p50 ms':>20}")
+        with transaction.atomic():
+            customer, driver = self._seed()
+            for size in sizes:
+                delivery = self._delivery(customer, driver, size)
+                request = factory.get(f'/deliveries/customer/status/{delivery.id}/')
+                request.user = customer.user
+
+                poll = self._time(polls, lambda: async_to_sync(views.get_delivery_status)(request, delivery.id))
+                scan = self._time(polls, lambda: DeliveryTracking.objects.filter(delivery=delivery).order_by('-timestamp').first())
+                self.stdout.write(
+                    f"{size:>12} {statistics.median(poll):>12.3f} {self._p99(poll):>12.3f} {statistics.median(scan):>20.3f}"
+                )
+            transaction.set_rollback(True)
+
+    def _seed(self):
+        suffix = random.randint(100000, 999999)
+        customer_user = User.objects.create(username=f'bench_customer_{suffix}', phone=f'b{suffix}c', role='customer', status='active')
+        customer = Customer.objects.create(user=customer_user, address='Benchmark')
+        driver_user = User.objects.create(username=f'bench_driver_{suffix}', phone=f'b{suffix}d', role='driver', status='active')
+        driver = Driver.objects.create(user=driver_user, bike_registration='BENCH', id_number='BENCH', is_online=True)
+        return customer, driver
+
+    def _delivery(self, customer, driver, size):
+        now = timezone.now()
+        delivery = Delivery.objects.create(
+            customer=customer,
+            driver=driver,
+            status='in_transit',
+            pickup_address='Benchmark',
+            delivery_address='Benchmark',
+            item_description='Benchmark',
+            created_at=now - timedelta(seconds=size + 1)
+        )
+        DeliveryTracking.objects.bulk_create(
+            (
+                DeliveryTracking(
+                    delivery=delivery,
+                    driver_lat=-22.2167 + i * 1e-5,
+                    driver_lng=30.0 + i * 1e-5,
+                    timestamp=now - timedelta(seconds=size - i)
+                )
+                for i in range(size)
+            ),
+            batch_size=5000
+        )
+        update_delivery_position(delivery.id, -22.2167 + size * 1e-5, 30.0 + size * 1e-5, now)
+        return delivery
+
+    def _time(self, runs, func):
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples
+
+    def _p99(self, samples):
+        return sorted(samples)[int(len(samples) * 0.99) - 1]
@@ -0,0 +1,22 @@
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from bridgedash.apps.deliveries.eta import rebuild_speed_profiles
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-cell, per-hour ETA speed profiles from tracking history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.BRIDGEDASH_ETA_HISTORY_DAYS)
+
+    def handle(self, *args, **options):
+        profiles = rebuild_speed_profiles(options['days'])
+        known = int(np.count_nonzero(~np.isnan(profiles.speeds)))
+        hours = np.flatnonzero(~np.isnan(profiles.hourly))
+        self.stdout.write(f'Cells: {len(profiles.keys)}')
+        self.stdout.write(f'Cell-hours with a speed: {known}')
+        self.stdout.write(f"Hours with a fleet-wide speed: {', '.join(str(hour) for hour in hours) or 'none'}")
+        self.stdout.write(self.style.SUCCESS(
+            f'ETA profiles rebuilt ({profiles.speeds.nbytes + profiles.keys.nbytes} bytes)'
+        ))
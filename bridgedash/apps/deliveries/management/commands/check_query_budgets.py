@@ -0,0 +1,265 @@
+import json
+import random
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from datetime import timedelta
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bridgedash.apps.chat.models import ChatRoom, ChatMessage
+from bridgedash.apps.notifications.models import Notification
+from bridgedash.apps.users.models import User, Customer, Driver
+from bridgedash.apps.deliveries import urls
+from bridgedash.apps.deliveries.models import Delivery, DeliveryTracking
+from bridgedash.apps.deliveries.pagination import encode_cursor
+from bridgedash.apps.deliveries.presence import get_driver_presence
+from bridgedash.apps.deliveries.tracking import tracking_buffer, update_delivery_position
+
+# Maximum queries per request for every view in deliveries/urls.py. A new
+# view without a budget fails the check, so every endpoint stays covered.
+QUERY_BUDGETS = {
+    'customer_dashboard': 3,
+    'new_delivery': 10,
+    'active_delivery': 4,
+    'cancel_delivery': 2,
+    'order_history': 3,
+    'get_delivery_status': 3,
+    'delivery_history_api': 2,
+    'driver_dashboard': 5,
+    'available_deliveries': 1,
+    'delivery_quotes': 2,
+    'driver_online_toggle': 1,
+    'accept_delivery': 13,
+    'update_delivery_status': 14,
+    'update_driver_location': 3,
+    'update_driver_location_batch': 3,
+    'driver_earnings': 3,
+    'driver_delivery_history': 2,
+}
+
+LARGE_TABLES = [
+    Delivery._meta.db_table,
+    DeliveryTracking._meta.db_table,
+    ChatMessage._meta.db_table,
+    Notification._meta.db_table,
+]
+
+class Command(BaseCommand):
+    help = (
+        'Run every deliveries view against a seeded large dataset, fail if any '
+        'exceeds its query budget and report EXPLAIN plans (rolled back afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--deliveries', type=int, default=20000)
+        parser.add_argument('--explain', action='store_true', help='Print the EXPLAIN plan of every query')
+        parser.add_argument('--strict', action='store_true', help='Also fail on full scans of large tables')
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in urls.urlpatterns]
+        missing = [name for name in names if name not in QUERY_BUDGETS]
+        if missing:
+            raise CommandError(f"Views without a query budget: {', '.join(missing)}")
+
+        self.factory = RequestFactory()
+        failures = []
+        with transaction.atomic():
+            self._seed(options['deliveries'])
+            # Presence lives outside the transaction: the acting drivers go
+            # online for the run and offline again afterwards
+            presence = get_driver_presence()
+            for driver in (self.driver, self.idle_driver):
+                presence.go_online(driver.pk, driver.current_lat, driver.current_lng)
+            for name in names:
+                queries, status = self._run(name)
+                budget = QUERY_BUDGETS[name]
+                scans = self._full_scans(queries, options['explain'])
+                verdict = 'ok' if len(queries) <= budget else 'OVER BUDGET'
+                self.stdout.write(f"{name:<30} {len(queries):>3}/{budget:<3} HTTP {status}  {verdict}")
+                for table in scans:
+                    self.stdout.write(self.style.WARNING(f"    full scan of {table}"))
+
+                if len(queries) > budget:
+                    failures.append(f'{name}: {len(queries)} queries (budget {budget})')
+                    for query in queries:
+                        self.stdout.write(f"    {query['sql']}")
+                if scans and options['strict']:
+                    failures.append(f"{name}: full scan of {', '.join(scans)}")
+            for driver in (self.driver, self.idle_driver):
+                presence.go_offline(driver.pk)
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError('Query budget check failed:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All views within their query budgets'))
+
+    def _seed(self, count):
+        now = timezone.now()
+        suffix = random.randint(100000, 999999)
+        users = User.objects.bulk_create(
+            [User(username=f'qb_c{suffix}_{i}', phone=f'qc{suffix}{i}', role='customer', status='active') for i in range(50)]
+            + [User(username=f'qb_d{suffix}_{i}', phone=f'qd{suffix}{i}', role='driver', status='active') for i in range(50)]
+        )
+        customers = Customer.objects.bulk_create([Customer(user=user, address='Budget') for user in users[:50]])
+        drivers = Driver.objects.bulk_create([
+            Driver(
+                user=user,
+                bike_registration='QB',
+                id_number='QB',
+                is_online=True,
+                current_lat=-22.2167 + random.uniform(-0.05, 0.05),
+                current_lng=30.0 + random.uniform(-0.05, 0.05)
+            )
+            for user in users[50:]
+        ])
+
+        statuses = ['delivered'] * 6 + ['cancelled', 'pending']
+        Delivery.objects.bulk_create(
+            (
+                Delivery(
+                    customer=random.choice(customers),
+                    driver=random.choice(drivers),
+                    status=random.choice(statuses),
+                    pickup_address='Budget',
+                    delivery_address='Budget',
+                    item_description='Budget',
+                    created_at=now - timedelta(minutes=i),
+                    delivered_at=now - timedelta(minutes=i),
+                    total_price=10,
+                    commission_amount=1.5
+                )
+                for i in range(count)
+            ),
+            batch_size=2000
+        )
+
+        # The actors every scenario runs as
+        self.customer = customers[0]
+        self.driver = drivers[0]
+        self.idle_driver = drivers[1]
+        Delivery.objects.filter(driver=self.idle_driver, status__in=['accepted', 'picked_up', 'in_transit']).update(status='delivered')
+        self.active = Delivery.objects.create(
+            customer=self.customer,
+            driver=self.driver,
+            status='accepted',
+            pickup_address='Budget',
+            delivery_address='Budget',
+            item_description='Budget',
+            accepted_at=now
+        )
+        self.pending = Delivery.objects.create(
+            customer=customers[1],
+            status='pending',
+            pickup_address='Budget',
+            delivery_address='Budget',
+            item_description='Budget'
+        )
+        for delivery in (self.active, self.pending):
+            room = ChatRoom.objects.create(delivery=delivery)
+            ChatMessage.objects.bulk_create([
+                ChatMessage(room=room, sender=self.customer.user, content=f'Message {i}') for i in range(200)
+            ])
+        DeliveryTracking.objects.bulk_create(
+            (
+                DeliveryTracking(
+                    delivery=self.active,
+                    driver_lat=-22.2167 + i * 1e-5,
+                    driver_lng=30.0,
+                    timestamp=now - timedelta(seconds=5000 - i)
+                )
+                for i in range(5000)
+            ),
+            batch_size=2000
+        )
+        update_delivery_position(self.active.id, -22.2167, 30.0, now)
+        
+        # History pages are requested deep into the list, where OFFSET would hurt
+        history = Delivery.objects.filter(customer=self.customer).order_by('-created_at', '-id')
+        self.deep_cursor = encode_cursor(history[history.count() // 2])
+
+    def _request(self, method, path, user, data=None, content_type=None):
+        if method == 'GET':
+            request = self.factory.get(path, data)
+        elif content_type:
+            request = self.factory.post(path, data, content_type=content_type)
+        else:
+            request = self.factory.post(path, data or {})
+        request.user = User.objects.get(pk=user.pk)
+        request._messages = CookieStorage(request)
+        return request
+
+    def _scenario(self, name):
+        """
+        (request, view kwargs) for one view, as the user who normally calls it
+        """
+        customer = self.customer.user
+        driver = self.driver.user
+        now_ms = timezone.now().timestamp() * 1000
+        scenarios = {
+            'customer_dashboard': lambda: (self._request('GET', '/', customer), {}),
+            'new_delivery': lambda: (self._request('POST', '/', customer, {
+                'pickup_address': 'Budget', 'delivery_address': 'Budget', 'item_description': 'Budget'
+            }), {}),
+            'active_delivery': lambda: (self._request('GET', '/', customer), {'delivery_id': self.active.id}),
+            'cancel_delivery': lambda: (self._request('GET', '/', customer), {'delivery_id': self.active.id}),
+            'order_history': lambda: (self._request('GET', '/', customer), {}),
+            'get_delivery_status': lambda: (self._request('GET', '/', customer), {'delivery_id': self.active.id}),
+            'delivery_history_api': lambda: (self._request('GET', '/', customer, {'cursor': self.deep_cursor}), {}),
+            'driver_dashboard': lambda: (self._request('GET', '/', driver), {}),
+            'available_deliveries': lambda: (self._request('GET', '/', driver), {}),
+            'delivery_quotes': lambda: (self._request('GET', '/', driver), {}),
+            'driver_online_toggle': lambda: (self._request('POST', '/', driver), {}),
+            'accept_delivery': lambda: (self._request('POST', '/', self.idle_driver.user), {'delivery_id': self.pending.id}),
+            'update_delivery_status': lambda: (self._request('POST', '/', driver, {
+                'status': 'picked_up', 'lat': -22.2, 'lng': 30.0
+            }), {'delivery_id': self.active.id}),
+            'update_driver_location': lambda: (self._request('POST', '/', driver, {'lat': -22.21, 'lng': 30.01}), {}),
+            'update_driver_location_batch': lambda: (self._request('POST', '/', driver, json.dumps({'points': [
+                {'lat': -22.22 + i * 1e-3, 'lng': 30.02, 'timestamp': now_ms - (50 - i) * 10000} for i in range(50)
+            ]}), content_type='application/json'), {}),
+            'driver_earnings': lambda: (self._request('GET', '/', driver), {}),
+            'driver_delivery_history': lambda: (self._request('GET', '/', driver, {'cursor': self.deep_cursor}), {}),
+        }
+        return scenarios[name]()
+
+    def _run(self, name):
+        view = next(pattern.callback for pattern in urls.urlpatterns if pattern.name == name)
+        with transaction.atomic():
+            # Start every scenario with no fix filter state left over
+            cache.delete(f'tracking:last:driver:{self.driver.pk}')
+            request, kwargs = self._scenario(name)
+            with CaptureQueriesContext(connection) as captured:
+                if iscoroutinefunction(view):
+                    response = async_to_sync(view)(request, **kwargs)
+                else:
+                    response = view(request, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+            # Buffered tracking rows belong to this scenario's savepoint
+            tracking_buffer.flush()
+            transaction.set_rollback(True)
+        return captured.captured_queries, response.status_code
+
+    def _full_scans(self, queries, explain):
+        prefix = connection.ops.explain_query_prefix()
+        scans = set()
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'{prefix} {sql}')
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+            if explain:
+                self.stdout.write(f"    {sql}")
+                for line in plan:
+                    self.stdout.write(f"        {line}")
+            for line in plan:
+                for table in LARGE_TABLES:
+                    if f'Seq Scan on {table}' in line or (f'SCAN {table}' in line and 'INDEX' not in line):
+                        scans.add(table)
+        return sorted(scans)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bridgedash.apps.deliveries.partitions import get_tracking_partitions, maintain_tracking_partitions
+
+class Command(BaseCommand):
+    help = 'Roll up delivered routes, create upcoming tracking partitions and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            help='Convert the tracking table to a partitioned table first (PostgreSQL, run once)'
+        )
+        parser.add_argument('--retention-months', type=int, default=settings.BRIDGEDASH_TRACKING_RETENTION_MONTHS)
+        parser.add_argument('--months-ahead', type=int, default=settings.BRIDGEDASH_TRACKING_PARTITIONS_AHEAD)
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options['convert']:
+            if get_tracking_partitions().convert(now):
+                self.stdout.write(self.style.SUCCESS('Tracking table converted to monthly partitions'))
+            else:
+                self.stdout.write('Tracking table already partitioned or partitioning not supported')
+
+        rolled_up, created, dropped = maintain_tracking_partitions(
+            now,
+            retention_months=options['retention_months'],
+            months_ahead=options['months_ahead'],
+        )
+        self.stdout.write(f'Routes rolled up: {rolled_up}')
+        self.stdout.write(f"Partitions created: {', '.join(created) or 'none'}")
+        self.stdout.write(f"Partitions dropped: {', '.join(dropped) or 'none'}")
@@ -0,0 +1,45 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bridgedash.apps.users.models import Driver
+from bridgedash.apps.deliveries.earnings import reconcile_driver_earnings
+
+class Command(BaseCommand):
+    help = 'Backfill the daily driver earnings rollup from delivered deliveries and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--driver', help='Only this driver (username)')
+        parser.add_argument('--days', type=int, help='Only the last N days (default: all history)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Report out-of-date days without writing; fails if any are found'
+        )
+
+    def handle(self, *args, **options):
+        driver = None
+        if options['driver']:
+            try:
+                driver = Driver.objects.get(user__username=options['driver'])
+            except Driver.DoesNotExist:
+                raise CommandError(f"Driver {options['driver']} does not exist")
+
+        since = None
+        if options['days'] is not None:
+            since = timezone.localdate() - timedelta(days=options['days'])
+
+        written, deleted = reconcile_driver_earnings(driver, since, dry_run=options['check'])
+        for driver_id, date in written:
+            self.stdout.write(f'{"stale" if options["check"] else "written"}: driver {driver_id} {date}')
+        for driver_id, date in deleted:
+            self.stdout.write(f'{"orphaned" if options["check"] else "removed"}: driver {driver_id} {date}')
+
+        if options['check']:
+            if written or deleted:
+                raise CommandError(f'{len(written) + len(deleted)} daily earnings rows out of date')
+            self.stdout.write(self.style.SUCCESS('Daily earnings rollup is up to date'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Daily earnings reconciled: {len(written)} days written, {len(deleted)} removed'
+            ))
@@ -0,0 +1,43 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+
+from bridgedash.apps.deliveries.geocoding import normalize_address, remember_address, seed_gazetteer
+
+class Command(BaseCommand):
+    help = 'Seed the local geocoding gazetteer from past delivery addresses and a landmarks file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--landmarks',
+            help='CSV file of known places with address,lat,lng columns (stored as admin entries)'
+        )
+        parser.add_argument(
+            '--skip-deliveries',
+            action='store_true',
+            help='Do not seed from past delivery addresses'
+        )
+
+    def handle(self, *args, **options):
+        if not options['skip_deliveries']:
+            created = seed_gazetteer()
+            self.stdout.write(f'Addresses from past deliveries: {created}')
+
+        if options['landmarks']:
+            try:
+                with open(options['landmarks'], newline='') as f:
+                    rows = list(csv.DictReader(f))
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['landmarks']}: {e}")
+
+            loaded = 0
+            for row in rows:
+                try:
+                    address, lat, lng = row['address'], float(row['lat']), float(row['lng'])
+                except (KeyError, TypeError, ValueError):
+                    raise CommandError(f'Bad landmark row: {row}')
+                if normalize_address(address):
+                    remember_address(address, lat, lng, 'manual')
+                    loaded += 1
+            self.stdout.write(f'Landmarks loaded: {loaded}')
+
+        self.stdout.write(self.style.SUCCESS('Gazetteer seeded'))
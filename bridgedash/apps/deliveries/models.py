@@ -53,11 +53,24 @@ class Delivery(models.Model):
     cancellation_reason = models.CharField(max_length=50, choices=CANCELLATION_REASONS, null=True, blank=True)
     cancellation_fee = models.DecimalField(max_digits=8, decimal_places=2, default=0)
     
+    class Meta:
+        indexes = [
+            # Pending feed for drivers, newest first
+            models.Index(fields=['status', '-created_at'], name='delivery_status_created_idx'),
+            # Active delivery lookups and earnings (driver, status, delivered_at)
+            models.Index(fields=['driver', 'status', 'delivered_at'], name='delivery_driver_status_idx'),
+            models.Index(fields=['customer', 'status'], name='delivery_customer_status_idx'),
+            # Recent deliveries and keyset-paginated history, (created_at, id) order
+            models.Index(fields=['customer', '-created_at', '-id'], name='delivery_customer_created_idx'),
+            models.Index(fields=['driver', '-created_at', '-id'], name='delivery_driver_created_idx'),
+        ]
+    
     def calculate_price(self):
-        from django.conf import settings
-        self.total_price = self.base_fare + (self.distance_km * self.per_km_rate)
-        self.commission_amount = self.total_price * settings.BRIDGEDASH_COMMISSION_RATE
-        self.save()
+        """
+        Set the fare fields from distance_km; the caller saves the delivery
+        """
+        from .pricing import get_pricing_engine
+        get_pricing_engine().price(self)
     
     def __str__(self):
         return f"Delivery #{self.id} - {self.customer.user.username}"
@@ -69,4 +82,67 @@ class DeliveryTracking(models.Model):
     timestamp = models.DateTimeField(default=timezone.now)
     
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['delivery', '-timestamp'], name='tracking_delivery_ts_idx'),
+        ]
+
+# Latest known driver position per delivery, upserted on every location
+# update so status reads never scan the tracking history
+class DeliveryPosition(models.Model):
+    delivery = models.OneToOneField(Delivery, on_delete=models.CASCADE, primary_key=True, related_name='position')
+    driver_lat = models.FloatField()
+    driver_lng = models.FloatField()
+    timestamp = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Position for Delivery #{self.delivery_id}"
+
+# Compact summary of a delivered delivery's track, kept after the raw
+# tracking partitions it came from are dropped
+class DeliveryRoute(models.Model):
+    delivery = models.OneToOneField(Delivery, on_delete=models.CASCADE, related_name='route')
+    polyline = models.TextField()
+    point_count = models.PositiveIntegerField(default=0)
+    raw_point_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    ended_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"Route for Delivery #{self.delivery_id}"
+
+# Per-driver, per-day (local time) totals of delivered deliveries, kept up to
+# date as deliveries complete so earnings pages read a handful of rows
+class DriverDailyEarnings(models.Model):
+    driver = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='daily_earnings')
+    date = models.DateField()
+    gross = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    commission = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    delivery_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['driver', 'date']
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.driver.user.username} - {self.date}"
+
+# Local gazetteer of known addresses and landmarks, keyed by normalized
+# address, so order creation can geocode without an external call
+class GeocodedAddress(models.Model):
+    SOURCE_CHOICES = (
+        ('delivery', 'Past Delivery'),
+        ('manual', 'Entered by Admin'),
+        ('nominatim', 'Nominatim'),
+    )
+    
+    normalized = models.CharField(max_length=255, unique=True)
+    address = models.TextField()
+    lat = models.FloatField()
+    lng = models.FloatField()
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES, default='manual')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return self.address
@@ -0,0 +1,71 @@
+import base64
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+def encode_cursor(delivery):
+    """
+    Opaque cursor pointing just after `delivery` in (created_at, id) order
+    """
+    raw = f'{delivery.created_at.isoformat()}|{delivery.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    (created_at, id) from a cursor; raises ValueError if it is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, delivery_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        delivery_id = int(delivery_id)
+    except (TypeError, UnicodeDecodeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+    if created_at is None:
+        raise ValueError('Invalid cursor')
+    return created_at, delivery_id
+
+def keyset_page(queryset, cursor=None, page_size=None):
+    """
+    One page of deliveries, newest first, and the cursor for the next page
+    (None on the last page).
+
+    Pages seek past the previous page's last (created_at, id) instead of
+    using OFFSET, so every page costs one index range scan.
+    """
+    page_size = page_size or settings.BRIDGEDASH_HISTORY_PAGE_SIZE
+    queryset = queryset.order_by('-created_at', '-id')
+    if cursor:
+        created_at, delivery_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=delivery_id)
+        )
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+    return items[:page_size], next_cursor
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses PostgreSQL's row estimate for unfiltered lists of
+    large tables instead of an exact COUNT(*)
+    """
+
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if connection.vendor == 'postgresql' and query is not None and not query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                    [self.object_list.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.estimate_threshold:
+                return row[0]
+        return super().count
@@ -0,0 +1,249 @@
+import logging
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Delivery, DeliveryRoute, DeliveryTracking
+from .tracking import rollup_delivery_route
+
+logger = logging.getLogger(__name__)
+
+def month_start(moment, offset=0):
+    """
+    First instant (UTC) of the month `offset` months after `moment`
+    """
+    index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+def partition_name(start):
+    return f'{DeliveryTracking._meta.db_table}_p{start:%Y%m}'
+
+class PostgresTrackingPartitions:
+    """
+    Native monthly range partitions of the tracking table.
+
+    `convert` turns the existing table into a partitioned one once; the old
+    table is kept as the partition for everything before next month.
+    """
+
+    def __init__(self):
+        self.parent = DeliveryTracking._meta.db_table
+        self.quote = connection.ops.quote_name
+
+    def is_partitioned(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)",
+                [self.parent]
+            )
+            return cursor.fetchone() is not None
+
+    def convert(self, now):
+        if self.is_partitioned():
+            return False
+
+        q = self.quote
+        legacy = f'{self.parent}_legacy'
+        sequence = f'{self.parent}_part_id_seq'
+        delivery_table = Delivery._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {q(self.parent)} RENAME TO {q(legacy)}")
+            cursor.execute(f"ALTER TABLE {q(legacy)} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                [legacy]
+            )
+            for (constraint,) in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {q(legacy)} DROP CONSTRAINT {q(constraint)}")
+
+            cursor.execute(f"CREATE SEQUENCE {q(sequence)}")
+            cursor.execute(
+                f"SELECT setval(%s, COALESCE((SELECT MAX(id) FROM {q(legacy)}), 0) + 1, false)",
+                [sequence]
+            )
+            cursor.execute(f"""
+                CREATE TABLE {q(self.parent)} (
+                    id bigint NOT NULL DEFAULT nextval('{sequence}'),
+                    delivery_id bigint NOT NULL REFERENCES {q(delivery_table)} (id) DEFERRABLE INITIALLY DEFERRED,
+                    driver_lat double precision NOT NULL,
+                    driver_lng double precision NOT NULL,
+                    timestamp timestamp with time zone NOT NULL,
+                    PRIMARY KEY (id, timestamp)
+                ) PARTITION BY RANGE (timestamp)
+            """)
+            cursor.execute(f"ALTER SEQUENCE {q(sequence)} OWNED BY {q(self.parent)}.id")
+            # Recreate the model's indexes on the parent; attaching the
+            # legacy table then builds them on it as well
+            for index in DeliveryTracking._meta.indexes:
+                cursor.execute(f"DROP INDEX IF EXISTS {q(index.name)}")
+                cursor.execute(str(index.create_sql(DeliveryTracking, connection.schema_editor())))
+            cursor.execute(
+                f"ALTER TABLE {q(self.parent)} ATTACH PARTITION {q(legacy)} FOR VALUES FROM (MINVALUE) TO (%s)",
+                [month_start(now, 1)]
+            )
+        return True
+
+    def ensure(self, now, months_ahead):
+        q = self.quote
+        legacy_upper = dict(self.partitions()).get(f'{self.parent}_legacy')
+        created = []
+        with connection.cursor() as cursor:
+            for offset in range(months_ahead + 1):
+                start = month_start(now, offset)
+                if legacy_upper is not None and start < legacy_upper:
+                    continue
+                name = partition_name(start)
+                cursor.execute("SELECT to_regclass(%s)", [name])
+                if cursor.fetchone()[0] is not None:
+                    continue
+                cursor.execute(
+                    f"CREATE TABLE {q(name)} PARTITION OF {q(self.parent)} FOR VALUES FROM (%s) TO (%s)",
+                    [start, month_start(start, 1)]
+                )
+                created.append(name)
+        return created
+
+    def partitions(self):
+        """
+        (name, upper bound) of every partition, upper bound None if unbounded
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+                FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                WHERE pg_inherits.inhparent = to_regclass(%s)
+            """, [self.parent])
+            rows = cursor.fetchall()
+
+        result = []
+        for name, bound in rows:
+            match = re.search(r"TO \('([^']+)'\)", bound or '')
+            upper = datetime.fromisoformat(match.group(1)) if match else None
+            if upper is not None and upper.tzinfo is None:
+                upper = upper.replace(tzinfo=dt_timezone.utc)
+            result.append((name, upper))
+        return result
+
+    def drop_before(self, cutoff):
+        q = self.quote
+        dropped = []
+        for name, upper in self.partitions():
+            if upper is not None and upper <= cutoff:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"ALTER TABLE {q(self.parent)} DETACH PARTITION {q(name)}")
+                    cursor.execute(f"DROP TABLE {q(name)}")
+                dropped.append(name)
+        return dropped
+
+class TablePerPeriodTrackingPartitions:
+    """
+    Fallback for databases without declarative partitioning (SQLite).
+
+    The model's table only holds the current month; `ensure` moves older
+    rows into one archive table per month, which are dropped whole once
+    they fall out of retention.
+    """
+
+    def __init__(self):
+        self.parent = DeliveryTracking._meta.db_table
+        self.quote = connection.ops.quote_name
+
+    def convert(self, now):
+        return False
+
+    def ensure(self, now, months_ahead):
+        q = self.quote
+        adapt = connection.ops.adapt_datetimefield_value
+        current = month_start(now)
+        created = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(timestamp) FROM {q(self.parent)} WHERE timestamp < %s", [adapt(current)])
+            oldest = cursor.fetchone()[0]
+            if oldest is None:
+                return created
+            if isinstance(oldest, str):
+                oldest = datetime.fromisoformat(oldest)
+
+            start = month_start(oldest)
+            while start < current:
+                end = month_start(start, 1)
+                name = partition_name(start)
+                if name not in self._archive_tables(cursor):
+                    cursor.execute(f"CREATE TABLE {q(name)} AS SELECT * FROM {q(self.parent)} WHERE 0")
+                    created.append(name)
+                cursor.execute(
+                    f"INSERT INTO {q(name)} SELECT * FROM {q(self.parent)} WHERE timestamp >= %s AND timestamp < %s",
+                    [adapt(start), adapt(end)]
+                )
+                start = end
+
+            cursor.execute(f"DELETE FROM {q(self.parent)} WHERE timestamp < %s", [adapt(current)])
+        return created
+
+    def partitions(self):
+        with connection.cursor() as cursor:
+            names = self._archive_tables(cursor)
+        result = []
+        for name in names:
+            period = datetime.strptime(name.rsplit('_p', 1)[1], '%Y%m').replace(tzinfo=dt_timezone.utc)
+            result.append((name, month_start(period, 1)))
+        return result
+
+    def drop_before(self, cutoff):
+        q = self.quote
+        dropped = []
+        for name, upper in self.partitions():
+            if upper <= cutoff:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP TABLE {q(name)}")
+                dropped.append(name)
+        return dropped
+
+    def _archive_tables(self, cursor):
+        pattern = re.compile(rf'^{re.escape(self.parent)}_p\d{{6}}$')
+        return sorted(
+            name for name in connection.introspection.table_names(cursor)
+            if pattern.match(name)
+        )
+
+def get_tracking_partitions():
+    if connection.vendor == 'postgresql':
+        return PostgresTrackingPartitions()
+    return TablePerPeriodTrackingPartitions()
+
+def rollup_delivered_routes():
+    """
+    Roll up delivered deliveries that don't have a stored route yet.
+    Deliveries without any tracking get an empty route, so each delivery
+    is looked at once rather than on every run.
+    """
+    pending = Delivery.objects.filter(
+        status='delivered',
+        route__isnull=True,
+    ).values_list('id', flat=True)
+    count = 0
+    for delivery_id in list(pending):
+        if rollup_delivery_route(delivery_id):
+            count += 1
+        else:
+            DeliveryRoute.objects.get_or_create(delivery_id=delivery_id, defaults={'polyline': ''})
+    return count
+
+def maintain_tracking_partitions(now, retention_months=None, months_ahead=None):
+    """
+    Roll up finished routes, create upcoming partitions (or archive past
+    months) and drop partitions older than the retention window
+    """
+    if retention_months is None:
+        retention_months = settings.BRIDGEDASH_TRACKING_RETENTION_MONTHS
+    if months_ahead is None:
+        months_ahead = settings.BRIDGEDASH_TRACKING_PARTITIONS_AHEAD
+
+    partitions = get_tracking_partitions()
+    rolled_up = rollup_delivered_routes()
+    created = partitions.ensure(now, months_ahead)
+    dropped = partitions.drop_before(month_start(now, -retention_months))
+    logger.info(f"Tracking partitions: {rolled_up} routes rolled up, created {created}, dropped {dropped}")
+    return rolled_up, created, dropped
@@ -0,0 +1,215 @@
+import threading
+import time
+from django.conf import settings
+
+from .spatial import get_driver_index
+
+class MemoryPresence:
+    """
+    Per-process driver presence for the memory driver index: the last
+    heartbeat of every online driver, who counts as online for
+    BRIDGEDASH_PRESENCE_TTL seconds after it.
+    """
+
+    def __init__(self, index, ttl=None):
+        self.index = index
+        self.ttl = ttl or settings.BRIDGEDASH_PRESENCE_TTL
+        self._beats = {}
+        self._lock = threading.Lock()
+
+    def go_online(self, driver_id, lat=None, lng=None, now=None):
+        with self._lock:
+            self._beats[driver_id] = now or time.time()
+        if lat is not None and lng is not None:
+            self.index.update(driver_id, lat, lng)
+
+    def go_offline(self, driver_id):
+        with self._lock:
+            self._beats.pop(driver_id, None)
+        self.index.remove(driver_id)
+
+    def touch(self, driver_id, lat=None, lng=None, now=None):
+        now = now or time.time()
+        with self._lock:
+            if self._beats.get(driver_id, 0) < now - self.ttl:
+                return False
+            self._beats[driver_id] = now
+        if lat is not None and lng is not None:
+            self.index.update(driver_id, lat, lng)
+        return True
+
+    def online_ids(self, driver_ids=None, now=None):
+        cutoff = (now or time.time()) - self.ttl
+        with self._lock:
+            candidates = list(self._beats) if driver_ids is None else driver_ids
+            return {driver_id for driver_id in candidates if self._beats.get(driver_id, 0) >= cutoff}
+
+    def expire(self, now=None):
+        cutoff = (now or time.time()) - self.ttl
+        with self._lock:
+            stale = [driver_id for driver_id, beat in self._beats.items() if beat < cutoff]
+            for driver_id in stale:
+                del self._beats[driver_id]
+        for driver_id in stale:
+            self.index.remove(driver_id)
+        return stale
+
+    def positions(self):
+        self.expire()
+        positions = ((driver_id, self.index.position(driver_id)) for driver_id in self.online_ids())
+        return [(driver_id, position[0], position[1]) for driver_id, position in positions if position]
+
+class RedisPresence:
+    """
+    Driver presence shared by every process: a sorted set of online drivers
+    scored by their last heartbeat, next to the Redis driver index.
+
+    Drivers whose last heartbeat is older than BRIDGEDASH_PRESENCE_TTL are
+    offline whether or not they have been swept yet; expire() removes them
+    from both sets in one round trip.
+    """
+
+    key = 'bridgedash:drivers:presence'
+
+    # Refresh a live driver's heartbeat (and position); expired or offline
+    # drivers stay offline until they go online again
+    TOUCH_SCRIPT = """
+    local beat = redis.call('ZSCORE', KEYS[1], ARGV[2])
+    if not beat or tonumber(beat) < tonumber(ARGV[3]) then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    if ARGV[4] ~= '' then
+        redis.call('GEOADD', KEYS[2], ARGV[4], ARGV[5], ARGV[2])
+    end
+    return 1
+    """
+
+    EXPIRE_SCRIPT = """
+    local stale = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', '(' .. ARGV[1], 'LIMIT', 0, 1000)
+    if #stale > 0 then
+        redis.call('ZREM', KEYS[1], unpack(stale))
+        redis.call('ZREM', KEYS[2], unpack(stale))
+    end
+    return stale
+    """
+
+    def __init__(self, index, ttl=None):
+        self.index = index
+        self.ttl = ttl or settings.BRIDGEDASH_PRESENCE_TTL
+        self._touch = None
+        self._expire = None
+
+    @property
+    def client(self):
+        return self.index.client
+
+    def go_online(self, driver_id, lat=None, lng=None, now=None):
+        pipe = self.client.pipeline()
+        pipe.zadd(self.key, {driver_id: now or time.time()})
+        if lat is not None and lng is not None:
+            pipe.geoadd(self.index.key, (lng, lat, driver_id))
+        pipe.execute()
+
+    def go_offline(self, driver_id):
+        pipe = self.client.pipeline()
+        pipe.zrem(self.key, driver_id)
+        pipe.zrem(self.index.key, driver_id)
+        pipe.execute()
+
+    def touch(self, driver_id, lat=None, lng=None, now=None):
+        if self._touch is None:
+            self._touch = self.client.register_script(self.TOUCH_SCRIPT)
+        now = now or time.time()
+        has_position = lat is not None and lng is not None
+        return bool(self._touch(
+            keys=[self.key, self.index.key],
+            args=[now, driver_id, now - self.ttl, lng if has_position else '', lat if has_position else ''],
+        ))
+
+    def online_ids(self, driver_ids=None, now=None):
+        cutoff = (now or time.time()) - self.ttl
+        if driver_ids is None:
+            return {int(member) for member in self.client.zrangebyscore(self.key, cutoff, '+inf')}
+        driver_ids = list(driver_ids)
+        if not driver_ids:
+            return set()
+        scores = self.client.zmscore(self.key, driver_ids)
+        return {driver_id for driver_id, score in zip(driver_ids, scores) if score is not None and score >= cutoff}
+
+    def expire(self, now=None):
+        if self._expire is None:
+            self._expire = self.client.register_script(self.EXPIRE_SCRIPT)
+        cutoff = (now or time.time()) - self.ttl
+        stale = []
+        while True:
+            batch = self._expire(keys=[self.key, self.index.key], args=[cutoff])
+            stale.extend(int(member) for member in batch)
+            if len(batch) < 1000:
+                return stale
+
+    def positions(self):
+        self.expire()
+        driver_ids = sorted(self.online_ids())
+        if not driver_ids:
+            return []
+        positions = self.client.geopos(self.index.key, *driver_ids)
+        return [(driver_id, pos[1], pos[0]) for driver_id, pos in zip(driver_ids, positions) if pos]
+
+def is_online(driver_id):
+    return bool(get_driver_presence().online_ids([driver_id]))
+
+def toggle_online(driver):
+    """
+    Flip a driver between online and offline, going online at their last
+    stored position. Returns whether they are now online.
+    """
+    presence = get_driver_presence()
+    if presence.online_ids([driver.pk]):
+        presence.go_offline(driver.pk)
+        return False
+    presence.go_online(driver.pk, driver.current_lat, driver.current_lng)
+    return True
+
+def online_near(lat, lng, k=None, radius_km=None):
+    """
+    Online drivers near a point, closest first, as (driver_id, distance_km)
+    """
+    presence = get_driver_presence()
+    presence.expire()
+    return presence.index.nearest(lat, lng, k=k, radius_km=radius_km)
+
+_presence = None
+
+def get_driver_presence():
+    """
+    The presence service matching the configured driver index
+    """
+    global _presence
+    if _presence is None:
+        index = get_driver_index()
+        if settings.BRIDGEDASH_DRIVER_INDEX == 'memory':
+            presence = MemoryPresence(index)
+            # Start from the drivers last recorded as online
+            from bridgedash.apps.users.models import Driver
+            for driver_id in Driver.objects.filter(is_online=True).values_list('pk', flat=True):
+                presence.go_online(driver_id)
+        else:
+            presence = RedisPresence(index)
+        _presence = presence
+    return _presence
+
+def sync_online_flags():
+    """
+    Expire stale drivers and bring Driver.is_online in line with presence.
+    The column is only kept for reporting and the admin; nothing reads it
+    to decide who is online. Returns the number of drivers changed.
+    """
+    from bridgedash.apps.users.models import Driver
+
+    presence = get_driver_presence()
+    presence.expire()
+    online = presence.online_ids()
+    changed = Driver.objects.filter(is_online=True).exclude(pk__in=online).update(is_online=False)
+    changed += Driver.objects.filter(pk__in=online, is_online=False).update(is_online=True)
+    return changed
@@ -0,0 +1,143 @@
+import math
+from decimal import Decimal
+import numpy as np
+from django.conf import settings
+
+from .spatial import EARTH_RADIUS_KM, KM_PER_DEGREE
+
+# Most pending deliveries priced for one quote request
+QUOTE_MAX_CANDIDATES = 1000
+
+def haversine_km_many(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distances in kilometres between arrays of points (scalars
+    broadcast, so one origin can be measured against many destinations)
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.subtract(lng2, lng1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _round_cents(amounts):
+    # Half up, after dropping float noise below a millionth of a cent
+    return np.floor(np.round(amounts * 100, 6) + 0.5) / 100
+
+def _cents(value):
+    return Decimal(f'{value:.2f}')
+
+class PricingEngine:
+    """
+    Fares for many trips at once. The rates are read from settings when the
+    engine is built; amounts are computed in cents and rounded half up like
+    the Decimal fields they end up in.
+    """
+
+    def __init__(self, base_fare=None, per_km_rate=None, commission_rate=None):
+        self.base_fare = settings.BRIDGEDASH_BASE_FARE if base_fare is None else base_fare
+        self.per_km_rate = settings.BRIDGEDASH_PER_KM_RATE if per_km_rate is None else per_km_rate
+        self.commission_rate = settings.BRIDGEDASH_COMMISSION_RATE if commission_rate is None else commission_rate
+
+    def fares(self, distances_km):
+        """
+        (total, commission) arrays in currency units for an array of trip
+        distances, each rounded to the cent
+        """
+        distances = np.round(np.asarray(distances_km, dtype=np.float64), 2)
+        totals = _round_cents(self.base_fare + distances * self.per_km_rate)
+        commissions = _round_cents(totals * self.commission_rate)
+        return totals, commissions
+
+    def quote_pairs(self, origins, destinations):
+        """
+        Quotes for trips between paired (lat, lng) arrays of shape (n, 2), as
+        (distance_km, total, commission) arrays
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 2)
+        destinations = np.asarray(destinations, dtype=np.float64).reshape(-1, 2)
+        distances = np.round(haversine_km_many(
+            origins[:, 0], origins[:, 1], destinations[:, 0], destinations[:, 1]
+        ), 2)
+        totals, commissions = self.fares(distances)
+        return distances, totals, commissions
+
+    def quote_deliveries(self, deliveries, lat=None, lng=None):
+        """
+        Quotes for delivery instances over their stored trip distance, one
+        dict per delivery in order. With a driver position, each quote also
+        carries the distance to the pickup.
+        """
+        if not deliveries:
+            return []
+        distances = np.array([float(d.distance_km) for d in deliveries], dtype=np.float64)
+        totals, commissions = self.fares(distances)
+        pickup_distances = None
+        if lat is not None and lng is not None:
+            pickups = np.array([(d.pickup_lat, d.pickup_lng) for d in deliveries], dtype=np.float64)
+            pickup_distances = haversine_km_many(lat, lng, pickups[:, 0], pickups[:, 1])
+
+        quotes = []
+        for i, delivery in enumerate(deliveries):
+            total, commission = _cents(totals[i]), _cents(commissions[i])
+            quote = {
+                'delivery_id': delivery.id,
+                'distance_km': _cents(distances[i]),
+                'total_price': total,
+                'commission_amount': commission,
+                'driver_share': total - commission,
+            }
+            if pickup_distances is not None:
+                quote['pickup_distance_km'] = round(float(pickup_distances[i]), 2)
+            quotes.append(quote)
+        return quotes
+
+    def price(self, delivery):
+        """
+        Set a delivery's fare fields from its distance_km without saving it
+        """
+        totals, commissions = self.fares([float(delivery.distance_km)])
+        delivery.base_fare = _cents(self.base_fare)
+        delivery.per_km_rate = _cents(self.per_km_rate)
+        delivery.total_price = _cents(totals[0])
+        delivery.commission_amount = _cents(commissions[0])
+        return delivery
+
+_engine = None
+
+def get_pricing_engine():
+    """
+    Shared engine built from the pricing settings on first use
+    """
+    global _engine
+    if _engine is None:
+        _engine = PricingEngine()
+    return _engine
+
+def quote_pending_deliveries(lat, lng, deliveries=None, limit=None, radius_km=None):
+    """
+    Quotes for pending deliveries as seen from a driver's position, nearest
+    pickup first. Only pickups within `radius_km` (by default
+    BRIDGEDASH_DISPATCH_MAX_PICKUP_KM) are quoted: the database narrows the
+    pending deliveries to a bounding box, newest first and at most
+    QUOTE_MAX_CANDIDATES of them, before any are priced.
+    """
+    from .models import Delivery
+
+    if radius_km is None:
+        radius_km = settings.BRIDGEDASH_DISPATCH_MAX_PICKUP_KM
+    if deliveries is None:
+        dlat = radius_km / KM_PER_DEGREE
+        dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+        deliveries = Delivery.objects.filter(
+            status='pending',
+            pickup_lat__range=(lat - dlat, lat + dlat),
+            pickup_lng__range=(lng - dlng, lng + dlng),
+        ).only(
+            'id', 'pickup_lat', 'pickup_lng', 'distance_km'
+        ).order_by('-created_at')[:QUOTE_MAX_CANDIDATES]
+    quotes = get_pricing_engine().quote_deliveries(list(deliveries), lat, lng)
+    # The box's corners lie beyond the radius
+    quotes = [quote for quote in quotes if quote['pickup_distance_km'] <= radius_km]
+    quotes.sort(key=lambda quote: quote['pickup_distance_km'])
+    return quotes[:limit] if limit else quotes
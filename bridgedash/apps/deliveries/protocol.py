@@ -0,0 +1,109 @@
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+# Opt-in WebSocket subprotocol for location updates. Other messages stay
+# JSON text frames; location updates become binary frames:
+#
+#   key frame    B flags | i lat | i lng | q timestamp (epoch ms)
+#   delta frame  B flags | h dlat | h dlng | H dt (ms)
+#
+# followed, when FLAG_ETA is set, by B target | i arrival (seconds after
+# the fix). Coordinates are fixed point in COORD_SCALE units and deltas are
+# against the previous frame on the connection. Without FLAG_ETA or
+# FLAG_ETA_CLEARED the ETA is unchanged.
+LOCATION_SUBPROTOCOL = 'bridgedash.location.v1'
+
+COORD_SCALE = 1_000_000
+
+FRAME_KEY = 0x01
+FRAME_DELTA = 0x02
+FLAG_ETA = 0x80
+FLAG_ETA_CLEARED = 0x40
+FRAME_TYPE_MASK = 0x0F
+
+ETA_TARGETS = {'pickup': 1, 'dropoff': 2}
+ETA_TARGET_NAMES = {code: name for name, code in ETA_TARGETS.items()}
+
+_KEY = struct.Struct('<Biiq')
+_DELTA = struct.Struct('<BhhH')
+_ETA = struct.Struct('<Bi')
+_INT16 = range(-32768, 32768)
+_UINT16 = range(0, 65536)
+
+def _epoch_ms(value):
+    return int(datetime.fromisoformat(value).timestamp() * 1000)
+
+class LocationEncoder:
+    """
+    Encodes one connection's driver.location_update events, keeping the
+    previous frame so the next one can be sent as a delta
+    """
+
+    def __init__(self):
+        self._previous = None
+        self._eta = None
+
+    def encode(self, event):
+        lat = round(event['lat'] * COORD_SCALE)
+        lng = round(event['lng'] * COORD_SCALE)
+        timestamp = _epoch_ms(event['timestamp'])
+
+        eta = event.get('eta')
+        flags = 0
+        eta_block = b''
+        if eta != self._eta:
+            if eta is None:
+                flags = FLAG_ETA_CLEARED
+            else:
+                flags = FLAG_ETA
+                arrival = round((_epoch_ms(eta['arrival']) - timestamp) / 1000)
+                eta_block = _ETA.pack(ETA_TARGETS[eta['target']], arrival)
+            self._eta = eta
+
+        previous = self._previous
+        self._previous = (lat, lng, timestamp)
+        if previous is not None:
+            dlat, dlng, dt = lat - previous[0], lng - previous[1], timestamp - previous[2]
+            if dlat in _INT16 and dlng in _INT16 and dt in _UINT16:
+                return _DELTA.pack(FRAME_DELTA | flags, dlat, dlng, dt) + eta_block
+        return _KEY.pack(FRAME_KEY | flags, lat, lng, timestamp) + eta_block
+
+class LocationDecoder:
+    """
+    Python counterpart of the decoder in static/js/map.js; returns events
+    shaped like the JSON location_update message
+    """
+
+    def __init__(self):
+        self._previous = None
+        self._eta = None
+
+    def decode(self, frame):
+        flags = frame[0]
+        if flags & FRAME_TYPE_MASK == FRAME_KEY:
+            _, lat, lng, timestamp = _KEY.unpack_from(frame)
+            offset = _KEY.size
+        else:
+            _, dlat, dlng, dt = _DELTA.unpack_from(frame)
+            lat, lng, timestamp = self._previous[0] + dlat, self._previous[1] + dlng, self._previous[2] + dt
+            offset = _DELTA.size
+        self._previous = (lat, lng, timestamp)
+
+        fixed_at = datetime.fromtimestamp(timestamp / 1000, tz=dt_timezone.utc)
+        if flags & FLAG_ETA:
+            target, arrival = _ETA.unpack_from(frame, offset)
+            self._eta = {
+                'target': ETA_TARGET_NAMES[target],
+                'seconds': arrival,
+                'arrival': (fixed_at + timedelta(seconds=arrival)).isoformat(),
+            }
+        elif flags & FLAG_ETA_CLEARED:
+            self._eta = None
+
+        return {
+            'type': 'location_update',
+            'lat': lat / COORD_SCALE,
+            'lng': lng / COORD_SCALE,
+            'timestamp': fixed_at.isoformat(),
+            'eta': self._eta,
+        }
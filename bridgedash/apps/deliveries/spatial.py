@@ -0,0 +1,206 @@
+import math
+import threading
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance between two points in kilometres
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def grid_cell(lat, lng, cell_km=None):
+    """
+    Grid cell (row, col) containing a point, for cells roughly `cell_km` wide
+    """
+    cell_deg = (cell_km or settings.BRIDGEDASH_DRIVER_INDEX_CELL_KM) / KM_PER_DEGREE
+    return (math.floor(lat / cell_deg), math.floor(lng / cell_deg))
+
+class MemoryDriverIndex:
+    """
+    Per-process grid index of online driver positions.
+
+    Drivers are bucketed into square cells; queries scan rings of cells
+    outwards from the query point and stop as soon as no unscanned cell can
+    hold a closer driver.
+    """
+
+    def __init__(self, cell_km=None):
+        self.cell_km = cell_km or settings.BRIDGEDASH_DRIVER_INDEX_CELL_KM
+        self._cells = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def update(self, driver_id, lat, lng):
+        cell = grid_cell(lat, lng, self.cell_km)
+        with self._lock:
+            old = self._positions.get(driver_id)
+            if old is not None and old[2] != cell:
+                self._discard(driver_id, old[2])
+            self._positions[driver_id] = (lat, lng, cell)
+            self._cells.setdefault(cell, set()).add(driver_id)
+
+    def remove(self, driver_id):
+        with self._lock:
+            old = self._positions.pop(driver_id, None)
+            if old is not None:
+                self._discard(driver_id, old[2])
+
+    def position(self, driver_id):
+        entry = self._positions.get(driver_id)
+        return (entry[0], entry[1]) if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._positions.clear()
+
+    def nearest(self, lat, lng, k=None, radius_km=None):
+        """
+        Drivers ordered by distance as a list of (driver_id, distance_km)
+        """
+        cx, cy = grid_cell(lat, lng, self.cell_km)
+        # The narrowest a cell gets at this latitude bounds how far away the
+        # next ring of cells can be.
+        min_cell_km = self.cell_km * max(math.cos(math.radians(lat)), 0.01)
+
+        with self._lock:
+            if not self._cells:
+                return []
+            max_ring = max(max(abs(x - cx), abs(y - cy)) for x, y in self._cells)
+            if radius_km is not None:
+                max_ring = min(max_ring, int(radius_km / min_cell_km) + 1)
+
+            results = []
+            for ring in range(max_ring + 1):
+                for cell in self._ring_cells(cx, cy, ring):
+                    for driver_id in self._cells.get(cell, ()):
+                        d_lat, d_lng, _ = self._positions[driver_id]
+                        distance = haversine_km(lat, lng, d_lat, d_lng)
+                        if radius_km is None or distance <= radius_km:
+                            results.append((driver_id, distance))
+
+                if k and len(results) >= k:
+                    results.sort(key=lambda item: item[1])
+                    if results[k - 1][1] <= ring * min_cell_km:
+                        break
+
+        results.sort(key=lambda item: item[1])
+        return results[:k] if k else results
+
+    def within(self, lat, lng, radius_km):
+        return self.nearest(lat, lng, radius_km=radius_km)
+
+    def _discard(self, driver_id, cell):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(driver_id)
+            if not members:
+                del self._cells[cell]
+
+    @staticmethod
+    def _ring_cells(cx, cy, ring):
+        if ring == 0:
+            yield (cx, cy)
+            return
+        for dy in range(-ring, ring + 1):
+            yield (cx - ring, cy + dy)
+            yield (cx + ring, cy + dy)
+        for dx in range(-ring + 1, ring):
+            yield (cx + dx, cy - ring)
+            yield (cx + dx, cy + ring)
+
+class RedisDriverIndex:
+    """
+    Online driver positions in a Redis GEO set (geohash-scored sorted set),
+    shared by every web worker and Celery process.
+    """
+
+    key = 'bridgedash:drivers:geo'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from bridgedash.redis_client import get_redis
+            self._client = get_redis()
+        return self._client
+
+    def update(self, driver_id, lat, lng):
+        self.client.geoadd(self.key, (lng, lat, driver_id))
+
+    def remove(self, driver_id):
+        self.client.zrem(self.key, driver_id)
+
+    def position(self, driver_id):
+        (pos,) = self.client.geopos(self.key, driver_id)
+        return (pos[1], pos[0]) if pos else None
+
+    def clear(self):
+        self.client.delete(self.key)
+
+    def nearest(self, lat, lng, k=None, radius_km=None):
+        """
+        Drivers ordered by distance as a list of (driver_id, distance_km)
+        """
+        if radius_km is None:
+            # Half the earth's circumference covers every member
+            radius_km = math.pi * EARTH_RADIUS_KM
+        rows = self.client.geosearch(
+            self.key,
+            longitude=lng,
+            latitude=lat,
+            radius=radius_km,
+            unit='km',
+            sort='ASC',
+            count=k,
+            withdist=True,
+        )
+        return [(int(member), float(distance)) for member, distance in rows]
+
+    def within(self, lat, lng, radius_km):
+        return self.nearest(lat, lng, radius_km=radius_km)
+
+_index = None
+
+def get_driver_index():
+    """
+    The configured online-driver index, loaded from the database on first use
+    """
+    global _index
+    if _index is None:
+        if settings.BRIDGEDASH_DRIVER_INDEX == 'memory':
+            index = MemoryDriverIndex()
+            rebuild_driver_index(index)
+        else:
+            index = RedisDriverIndex()
+        _index = index
+    return _index
+
+def rebuild_driver_index(index=None):
+    """
+    Reload the index from the online drivers stored in the database
+    """
+    from bridgedash.apps.users.models import Driver
+
+    index = index or get_driver_index()
+    index.clear()
+    online = Driver.objects.filter(
+        is_online=True,
+        current_lat__isnull=False,
+        current_lng__isnull=False,
+    ).values_list('pk', 'current_lat', 'current_lng')
+    count = 0
+    for driver_id, lat, lng in online:
+        index.update(driver_id, lat, lng)
+        count += 1
+    return count
@@ -0,0 +1,115 @@
+import time
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Delivery
+
+# Snapshots outlive the 10 second poll interval comfortably; every write
+# path bumps the version, so the timeouts only bound memory use
+SNAPSHOT_TIMEOUT = 60 * 60
+VERSION_TIMEOUT = 60 * 60 * 24
+
+def snapshot_cache_key(delivery_id):
+    return f'delivery:status:{delivery_id}'
+
+def version_cache_key(delivery_id):
+    return f'delivery:status:version:{delivery_id}'
+
+def _new_version():
+    # Unique across cache evictions, so a reset never reuses an old ETag
+    return f'{time.time_ns():x}'
+
+def status_etag(delivery_id, version):
+    return f'"{delivery_id}-{version}"'
+
+def invalidate_delivery_status(delivery_id):
+    """
+    Give the delivery's status a new version once the current transaction
+    commits, so polls never cache data that could still roll back
+    """
+    transaction.on_commit(lambda: cache.set(version_cache_key(delivery_id), _new_version(), timeout=VERSION_TIMEOUT))
+
+async def ainvalidate_delivery_status(delivery_id):
+    """
+    invalidate_delivery_status for async callers, which run in autocommit
+    so the change is already committed
+    """
+    await cache.aset(version_cache_key(delivery_id), _new_version(), timeout=VERSION_TIMEOUT)
+
+def build_status_snapshot(delivery_id, version):
+    from .eta import get_delivery_eta
+    from .tracking import current_position
+
+    delivery = Delivery.objects.select_related('driver__user').filter(id=delivery_id).first()
+    if delivery is None:
+        return None
+    latest_tracking = current_position(delivery)
+    eta = None
+    if latest_tracking:
+        eta = get_delivery_eta(delivery.id, latest_tracking.driver_lat, latest_tracking.driver_lng, delivery)
+
+    return {
+        'version': version,
+        'customer_id': delivery.customer_id,
+        'data': {
+            'status': delivery.status,
+            'status_display': delivery.get_status_display(),
+            'driver_name': delivery.driver.user.username if delivery.driver else None,
+            'driver_phone': delivery.driver.user.phone if delivery.driver else None,
+            'current_location': {
+                'lat': latest_tracking.driver_lat if latest_tracking else delivery.pickup_lat,
+                'lng': latest_tracking.driver_lng if latest_tracking else delivery.pickup_lng,
+            } if latest_tracking or delivery.pickup_lat else None,
+            'total_price': str(delivery.total_price),
+            'eta': eta,
+        },
+    }
+
+def get_status_snapshot(delivery_id):
+    """
+    Current status snapshot of a delivery as {'version', 'customer_id',
+    'data'}, or None if it doesn't exist.
+
+    Both cache keys are read in one round trip; the database is only hit
+    when the cached snapshot is missing or older than the current version.
+    """
+    snapshot_key = snapshot_cache_key(delivery_id)
+    version_key = version_cache_key(delivery_id)
+    cached = cache.get_many([snapshot_key, version_key])
+
+    version = cached.get(version_key)
+    if version is None:
+        cache.add(version_key, _new_version(), timeout=VERSION_TIMEOUT)
+        version = cache.get(version_key)
+
+    snapshot = cached.get(snapshot_key)
+    if snapshot is not None and snapshot['version'] == version:
+        return snapshot
+
+    snapshot = build_status_snapshot(delivery_id, version)
+    if snapshot is not None:
+        cache.set(snapshot_key, snapshot, timeout=SNAPSHOT_TIMEOUT)
+    return snapshot
+
+async def aget_status_snapshot(delivery_id):
+    """
+    get_status_snapshot for async views; only a rebuild touches the ORM
+    """
+    snapshot_key = snapshot_cache_key(delivery_id)
+    version_key = version_cache_key(delivery_id)
+    cached = await cache.aget_many([snapshot_key, version_key])
+
+    version = cached.get(version_key)
+    if version is None:
+        await cache.aadd(version_key, _new_version(), timeout=VERSION_TIMEOUT)
+        version = await cache.aget(version_key)
+
+    snapshot = cached.get(snapshot_key)
+    if snapshot is not None and snapshot['version'] == version:
+        return snapshot
+
+    snapshot = await sync_to_async(build_status_snapshot)(delivery_id, version)
+    if snapshot is not None:
+        await cache.aset(snapshot_key, snapshot, timeout=SNAPSHOT_TIMEOUT)
+    return snapshot
@@ -0,0 +1,110 @@
+import logging
+from celery import shared_task
+from django.conf import settings
+
+from .models import Delivery
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def widen_delivery_offer(delivery_id, ring):
+    """
+    Re-offer a delivery nobody accepted to drivers in the next dispatch ring
+    """
+    from .dispatch import offer_delivery
+
+    delivery = Delivery.objects.select_related('customer__user').filter(
+        id=delivery_id,
+        status='pending'
+    ).first()
+    if delivery:
+        offer_delivery(delivery, ring)
+
+@shared_task
+def batch_dispatch():
+    """
+    Periodic batch assignment of pending deliveries in 'batch' dispatch mode
+    """
+    from .dispatch import run_batch_dispatch
+
+    if settings.BRIDGEDASH_DISPATCH_MODE != 'batch':
+        return 0
+    return run_batch_dispatch()
+
+@shared_task
+def sync_driver_presence():
+    """
+    Expire drivers whose heartbeats stopped and sync Driver.is_online with
+    presence for reporting
+    """
+    from .presence import sync_online_flags
+
+    return sync_online_flags()
+
+@shared_task
+def compact_track(delivery_id):
+    """
+    Simplify a delivered delivery's stored track and store its route summary
+    """
+    from .tracking import compact_delivery_track, rollup_delivery_route
+
+    removed = compact_delivery_track(delivery_id)
+    rollup_delivery_route(delivery_id)
+    return removed
+
+def schedule_track_compaction(delivery_id):
+    # Wait out the tracking buffers so late fixes are compacted too
+    try:
+        compact_track.apply_async(
+            (delivery_id,),
+            countdown=settings.BRIDGEDASH_TRACKING_BUFFER_SECONDS * 2,
+        )
+    except Exception as e:
+        logger.error(f"Error scheduling track compaction for delivery {delivery_id}: {e}")
+
+@shared_task
+def maintain_tracking_partitions():
+    """
+    Periodic tracking storage upkeep: rollups, new partitions and retention
+    """
+    from django.utils import timezone
+    from .partitions import maintain_tracking_partitions as maintain
+
+    maintain(timezone.now())
+
+@shared_task
+def rebuild_eta_profiles():
+    """
+    Nightly rebuild of the ETA speed profiles from recent tracking history
+    """
+    from .eta import rebuild_speed_profiles
+
+    profiles = rebuild_speed_profiles()
+    return len(profiles.keys)
+
+@shared_task(rate_limit='1/s')
+def geocode_delivery(delivery_id):
+    """
+    Resolve a pending delivery's unknown addresses with the remote geocoder,
+    then reprice it from the real distance
+    """
+    from .geocoding import geocode, geocode_remote, locate_delivery
+    from .feed import invalidate_pending_feed
+    from .status import invalidate_delivery_status
+
+    delivery = Delivery.objects.filter(id=delivery_id, status='pending').first()
+    if delivery is None:
+        return
+
+    for address in (delivery.pickup_address, delivery.delivery_address):
+        if geocode(address) is None:
+            geocode_remote(address)
+
+    if locate_delivery(delivery):
+        delivery.calculate_price()
+        delivery.save(update_fields=[
+            'pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng', 'distance_km',
+            'base_fare', 'per_km_rate', 'total_price', 'commission_amount',
+        ])
+        invalidate_delivery_status(delivery.id)
+        invalidate_pending_feed()
@@ -0,0 +1,602 @@
+import asyncio
+import atexit
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from bridgedash.apps.notifications.outbox import broadcast, channel_sender
+from bridgedash.apps.users.models import Driver
+from .models import Delivery, DeliveryTracking, DeliveryPosition, DeliveryRoute
+from .eta import get_delivery_eta
+from .presence import get_driver_presence
+from .spatial import KM_PER_DEGREE, haversine_km
+from .status import ainvalidate_delivery_status, invalidate_delivery_status
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ['accepted', 'picked_up', 'in_transit']
+
+# Consecutive rejected fixes after which the newest one becomes the new
+# anchor, so a bad first fix can't lock out every real one after it
+MAX_CONSECUTIVE_REJECTS = 3
+FIX_STATE_TIMEOUT = 60 * 60 * 12
+
+# Flushes a buffered tracking row may fail (the database being unavailable)
+# before it is dropped
+MAX_FLUSH_ATTEMPTS = 3
+
+def parse_location_point(point):
+    """
+    A (lat, lng, timestamp) fix from a client's {lat, lng, timestamp}, where
+    the timestamp is epoch milliseconds or ISO 8601 and defaults to now.
+    Fixes older than BRIDGEDASH_TRACKING_MAX_FIX_AGE seconds are rejected.
+    """
+    lat = float(point['lat'])
+    lng = float(point['lng'])
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError('Coordinates out of range')
+
+    raw_timestamp = point.get('timestamp')
+    if raw_timestamp is None:
+        timestamp = timezone.now()
+    elif isinstance(raw_timestamp, (int, float)):
+        # Epoch milliseconds, as produced by Date.now() in the driver app.
+        # json.loads accepts 1e300 and Infinity, which datetime can't hold.
+        if not math.isfinite(raw_timestamp) or raw_timestamp < 0:
+            raise ValueError('Invalid timestamp')
+        try:
+            timestamp = datetime.fromtimestamp(raw_timestamp / 1000, tz=dt_timezone.utc)
+        except (OverflowError, OSError):
+            raise ValueError('Invalid timestamp')
+    else:
+        timestamp = parse_datetime(raw_timestamp)
+        if timestamp is None:
+            raise ValueError('Invalid timestamp')
+        if timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+
+    # Don't trust device clocks that run ahead of the server, and keep stale
+    # fixes out of the tracking partitions, which don't cover old months
+    now = timezone.now()
+    if timestamp < now - timedelta(seconds=settings.BRIDGEDASH_TRACKING_MAX_FIX_AGE):
+        raise ValueError('Fix too old')
+    return lat, lng, min(timestamp, now)
+
+def filter_fixes(state_key, points):
+    """
+    Drop implausible and near-duplicate fixes from (lat, lng, timestamp)
+    points, oldest first.
+
+    A fix is rejected when reaching it from the last accepted fix needs a
+    speed above BRIDGEDASH_TRACKING_MAX_SPEED_KMH, and skipped when it is
+    within BRIDGEDASH_TRACKING_MIN_DISTANCE_M of it. The last accepted fix
+    is kept in the cache under `state_key` between calls.
+    """
+    cache_key = f'tracking:last:{state_key}'
+    accepted, state = _filter_fixes(cache.get(cache_key), points)
+    if state is not None:
+        cache.set(cache_key, state, timeout=FIX_STATE_TIMEOUT)
+    return accepted
+
+async def afilter_fixes(state_key, points):
+    """
+    filter_fixes for async callers
+    """
+    cache_key = f'tracking:last:{state_key}'
+    accepted, state = _filter_fixes(await cache.aget(cache_key), points)
+    if state is not None:
+        await cache.aset(cache_key, state, timeout=FIX_STATE_TIMEOUT)
+    return accepted
+
+def _filter_fixes(state, points):
+    max_speed_kmh = settings.BRIDGEDASH_TRACKING_MAX_SPEED_KMH
+    min_distance_km = settings.BRIDGEDASH_TRACKING_MIN_DISTANCE_M / 1000
+
+    accepted = []
+    for lat, lng, timestamp in points:
+        epoch = timestamp.timestamp()
+        if state is None:
+            state = {'lat': lat, 'lng': lng, 'epoch': epoch, 'rejects': 0}
+            accepted.append((lat, lng, timestamp))
+            continue
+
+        elapsed = epoch - state['epoch']
+        if elapsed <= 0:
+            # Out of order or repeated fix
+            continue
+
+        distance_km = haversine_km(state['lat'], state['lng'], lat, lng)
+        if distance_km / (elapsed / 3600) > max_speed_kmh and state['rejects'] < MAX_CONSECUTIVE_REJECTS:
+            state['rejects'] += 1
+            continue
+        if distance_km < min_distance_km:
+            state['rejects'] = 0
+            continue
+
+        state = {'lat': lat, 'lng': lng, 'epoch': epoch, 'rejects': 0}
+        accepted.append((lat, lng, timestamp))
+    return accepted, state
+
+def _offset_m(origin, point):
+    """
+    Local east/north offset of `point` from `origin` in metres
+    """
+    lat0, lng0 = origin
+    lat, lng = point
+    x = (lng - lng0) * KM_PER_DEGREE * 1000 * math.cos(math.radians(lat0))
+    y = (lat - lat0) * KM_PER_DEGREE * 1000
+    return x, y
+
+def _segment_distance_m(point, start, end):
+    px, py = _offset_m(start, point)
+    ex, ey = _offset_m(start, end)
+    length_sq = ex * ex + ey * ey
+    if length_sq == 0:
+        return math.hypot(px, py)
+    t = max(0.0, min(1.0, (px * ex + py * ey) / length_sq))
+    return math.hypot(px - t * ex, py - t * ey)
+
+def douglas_peucker(points, tolerance_m):
+    """
+    Indexes of the (lat, lng) points kept by Douglas-Peucker simplification
+    """
+    if len(points) < 3:
+        return list(range(len(points)))
+
+    keep = {0, len(points) - 1}
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance = 0.0
+        split = None
+        for i in range(first + 1, last):
+            distance = _segment_distance_m(points[i], points[first], points[last])
+            if distance > max_distance:
+                max_distance = distance
+                split = i
+        if split is not None and max_distance > tolerance_m:
+            keep.add(split)
+            stack.append((first, split))
+            stack.append((split, last))
+    return sorted(keep)
+
+def compact_delivery_track(delivery_id, tolerance_m=None, window=1000):
+    """
+    Simplify a delivery's stored track in place and return the rows removed.
+
+    The track is streamed in windows of `window` points that share their
+    boundary point, so long tracks are compacted without loading them whole.
+    """
+    tolerance_m = tolerance_m or settings.BRIDGEDASH_TRACK_SIMPLIFY_TOLERANCE_M
+    rows = DeliveryTracking.objects.filter(delivery_id=delivery_id).order_by('timestamp', 'id')
+
+    doomed = []
+    chunk = []
+    for row in rows.values_list('id', 'driver_lat', 'driver_lng').iterator(chunk_size=window):
+        chunk.append(row)
+        if len(chunk) == window:
+            doomed.extend(_window_drops(chunk, tolerance_m))
+            chunk = [chunk[-1]]
+    if len(chunk) > 1:
+        doomed.extend(_window_drops(chunk, tolerance_m))
+
+    for start in range(0, len(doomed), window):
+        DeliveryTracking.objects.filter(id__in=doomed[start:start + window]).delete()
+    return len(doomed)
+
+def _window_drops(chunk, tolerance_m):
+    kept = set(douglas_peucker([(lat, lng) for _, lat, lng in chunk], tolerance_m))
+    return [row_id for i, (row_id, _, _) in enumerate(chunk) if i not in kept]
+
+def update_delivery_position(delivery_id, lat, lng, timestamp):
+    """
+    Upsert the delivery's latest position in a single statement
+    """
+    DeliveryPosition.objects.bulk_create(
+        [DeliveryPosition(delivery_id=delivery_id, driver_lat=lat, driver_lng=lng, timestamp=timestamp)],
+        update_conflicts=True,
+        unique_fields=['delivery'],
+        update_fields=['driver_lat', 'driver_lng', 'timestamp'],
+    )
+    invalidate_delivery_status(delivery_id)
+
+async def aupdate_delivery_position(delivery_id, lat, lng, timestamp):
+    """
+    update_delivery_position for async callers (outside any transaction)
+    """
+    await DeliveryPosition.objects.abulk_create(
+        [DeliveryPosition(delivery_id=delivery_id, driver_lat=lat, driver_lng=lng, timestamp=timestamp)],
+        update_conflicts=True,
+        unique_fields=['delivery'],
+        update_fields=['driver_lat', 'driver_lng', 'timestamp'],
+    )
+    await ainvalidate_delivery_status(delivery_id)
+
+def current_position(delivery):
+    """
+    Latest known driver position of a delivery (DeliveryPosition, or the
+    newest tracking point for deliveries tracked before positions existed)
+    """
+    position = DeliveryPosition.objects.filter(delivery=delivery).first()
+    return position or latest_tracking(delivery)
+
+def latest_tracking(delivery):
+    """
+    Most recent tracking point of a delivery.
+
+    Bounding the scan by the delivery's creation time lets partition
+    pruning skip every partition older than the delivery itself.
+    """
+    return DeliveryTracking.objects.filter(
+        delivery=delivery,
+        timestamp__gte=delivery.created_at
+    ).order_by('-timestamp').first()
+
+def encode_polyline(points, precision=5):
+    """
+    Encode (lat, lng) points with the Google encoded polyline algorithm
+    """
+    factor = 10 ** precision
+    encoded = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_e = int(round(lat * factor))
+        lng_e = int(round(lng * factor))
+        for delta in (lat_e - prev_lat, lng_e - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                encoded.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            encoded.append(chr(value + 63))
+        prev_lat, prev_lng = lat_e, lng_e
+    return ''.join(encoded)
+
+def decode_polyline(encoded, precision=5):
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append((lat / factor, lng / factor))
+    return points
+
+def rollup_delivery_route(delivery_id, tolerance_m=None):
+    """
+    Store one simplified, polyline-encoded route for a delivery's track
+    """
+    tolerance_m = tolerance_m or settings.BRIDGEDASH_TRACK_SIMPLIFY_TOLERANCE_M
+    rows = list(
+        DeliveryTracking.objects.filter(delivery_id=delivery_id)
+        .order_by('timestamp', 'id')
+        .values_list('driver_lat', 'driver_lng', 'timestamp')
+    )
+    if not rows:
+        return None
+
+    points = [(lat, lng) for lat, lng, _ in rows]
+    kept = [points[i] for i in douglas_peucker(points, tolerance_m)]
+    route, _ = DeliveryRoute.objects.update_or_create(
+        delivery_id=delivery_id,
+        defaults={
+            'polyline': encode_polyline(kept),
+            'point_count': len(kept),
+            'raw_point_count': len(rows),
+            'started_at': rows[0][2],
+            'ended_at': rows[-1][2],
+        }
+    )
+    return route
+
+class TrackingBuffer:
+    """
+    Write-behind buffer for DeliveryTracking rows.
+
+    Points are held in memory and written with a single bulk_create once
+    `max_size` rows are queued or the oldest row is `max_age` seconds old.
+    A daemon thread flushes idle buffers and the process flushes on exit.
+
+    A failed flush loses nothing it doesn't have to: a batch rejected for
+    its data is split until the offending rows are isolated and dropped,
+    and rows that fail for any other reason are queued again, up to
+    MAX_FLUSH_ATTEMPTS times.
+    """
+
+    def __init__(self, max_size=None, max_age=None):
+        self.max_size = max_size or settings.BRIDGEDASH_TRACKING_BUFFER_SIZE
+        self.max_age = max_age or settings.BRIDGEDASH_TRACKING_BUFFER_SECONDS
+        self._rows = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, delivery_id, lat, lng, timestamp):
+        self.extend([DeliveryTracking(
+            delivery_id=delivery_id,
+            driver_lat=lat,
+            driver_lng=lng,
+            timestamp=timestamp
+        )])
+
+    def extend(self, rows):
+        if self.queue(rows):
+            self.flush()
+
+    def queue(self, rows):
+        """
+        Add rows without flushing; returns True if a flush is due
+        """
+        with self._lock:
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.extend(rows)
+            due = len(self._rows) >= self.max_size or time.monotonic() - self._oldest >= self.max_age
+        if not due:
+            self._ensure_flusher()
+        return due
+
+    def flush(self):
+        """
+        Write the queued rows; returns how many were written
+        """
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._oldest = None
+        if not rows:
+            return 0
+
+        written, failed = self._write(rows)
+        retry = []
+        for row in failed:
+            row._flush_attempts = getattr(row, '_flush_attempts', 0) + 1
+            if row._flush_attempts < MAX_FLUSH_ATTEMPTS:
+                retry.append(row)
+        if len(retry) < len(failed):
+            logger.error(f"Dropped {len(failed) - len(retry)} tracking rows after {MAX_FLUSH_ATTEMPTS} failed flushes")
+        if retry:
+            with self._lock:
+                self._rows[:0] = retry
+                self._oldest = time.monotonic()
+            self._ensure_flusher()
+        return written
+
+    def _write(self, rows):
+        """
+        Insert rows, isolating the ones the database rejects. Returns the
+        number written and the rows to retry.
+        """
+        try:
+            with transaction.atomic():
+                DeliveryTracking.objects.bulk_create(rows, batch_size=self.max_size)
+            return len(rows), []
+        except (DataError, IntegrityError) as e:
+            if len(rows) == 1:
+                logger.error(f"Dropped tracking row for delivery {rows[0].delivery_id}: {e}")
+                return 0, []
+            middle = len(rows) // 2
+            written_head, failed_head = self._write(rows[:middle])
+            written_tail, failed_tail = self._write(rows[middle:])
+            return written_head + written_tail, failed_head + failed_tail
+        except Exception as e:
+            logger.error(f"Error flushing tracking buffer: {e}")
+            return 0, rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _ensure_flusher(self):
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run, name='tracking-buffer', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.max_age)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing tracking buffer: {e}")
+            finally:
+                close_old_connections()
+
+tracking_buffer = TrackingBuffer()
+atexit.register(tracking_buffer.flush)
+
+def record_driver_locations(driver, points):
+    """
+    Ingest a driver's location fixes, oldest first, as (lat, lng, timestamp).
+
+    Implausible and stationary fixes are filtered out first. The driver's
+    position is set to the last remaining fix with one UPDATE, every fix is
+    queued on the tracking buffer for the active delivery and only the
+    latest one is broadcast to the delivery group, with the delivery's ETA.
+    Returns the active delivery, if any.
+    """
+    points = filter_fixes(f'driver:{driver.pk}', points)
+    if not points:
+        return None
+
+    lat, lng, timestamp = points[-1]
+    driver.current_lat = lat
+    driver.current_lng = lng
+    Driver.objects.filter(pk=driver.pk).update(current_lat=lat, current_lng=lng)
+    # The fix is also a heartbeat for an online driver
+    get_driver_presence().touch(driver.pk, lat, lng)
+
+    active_delivery = Delivery.objects.filter(
+        driver=driver,
+        status__in=ACTIVE_STATUSES
+    ).only('id', 'status', 'pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng').first()
+
+    if active_delivery:
+        tracking_buffer.extend([
+            DeliveryTracking(
+                delivery_id=active_delivery.id,
+                driver_lat=point_lat,
+                driver_lng=point_lng,
+                timestamp=point_timestamp
+            )
+            for point_lat, point_lng, point_timestamp in points
+        ])
+        update_delivery_position(active_delivery.id, lat, lng, timestamp)
+        eta = get_delivery_eta(active_delivery.id, lat, lng, active_delivery)
+
+        # Broadcast location update to customer (not recorded: the next
+        # fix supersedes it)
+        broadcast(
+            f"delivery_{active_delivery.id}",
+            {
+                "type": "driver.location_update",
+                "delivery_id": active_delivery.id,
+                "lat": lat,
+                "lng": lng,
+                "timestamp": timestamp.isoformat(),
+                "eta": eta
+            }
+        )
+
+    return active_delivery
+
+async def arecord_driver_locations(driver, points):
+    """
+    record_driver_locations for async views: the same steps, awaiting the
+    ORM and cache instead of blocking on them
+    """
+    points = await afilter_fixes(f'driver:{driver.pk}', points)
+    if not points:
+        return None
+
+    lat, lng, timestamp = points[-1]
+    driver.current_lat = lat
+    driver.current_lng = lng
+    await Driver.objects.filter(pk=driver.pk).aupdate(current_lat=lat, current_lng=lng)
+    # Resolved in the thread too: the memory index is built from the ORM on
+    # first use, which can't run on the event loop
+    await sync_to_async(lambda: get_driver_presence().touch(driver.pk, lat, lng), thread_sensitive=False)()
+
+    active_delivery = await Delivery.objects.filter(
+        driver_id=driver.pk,
+        status__in=ACTIVE_STATUSES
+    ).only('id', 'status', 'pickup_lat', 'pickup_lng', 'delivery_lat', 'delivery_lng').afirst()
+
+    if active_delivery:
+        due = tracking_buffer.queue([
+            DeliveryTracking(
+                delivery_id=active_delivery.id,
+                driver_lat=point_lat,
+                driver_lng=point_lng,
+                timestamp=point_timestamp
+            )
+            for point_lat, point_lng, point_timestamp in points
+        ])
+        if due:
+            await sync_to_async(tracking_buffer.flush)()
+        await aupdate_delivery_position(active_delivery.id, lat, lng, timestamp)
+        eta = await sync_to_async(get_delivery_eta, thread_sensitive=False)(active_delivery.id, lat, lng, active_delivery)
+
+        # Queued for the channel sender rather than awaited, so the request
+        # doesn't wait on Redis and a send error can't fail a stored fix
+        channel_sender.send(
+            f"delivery_{active_delivery.id}",
+            {
+                "type": "driver.location_update",
+                "delivery_id": active_delivery.id,
+                "lat": lat,
+                "lng": lng,
+                "timestamp": timestamp.isoformat(),
+                "eta": eta
+            }
+        )
+
+    return active_delivery
+
+class LocationStream:
+    """
+    Location fixes streamed by one driver's WebSocket connection.
+
+    Frames beyond BRIDGEDASH_LOCATION_STREAM_RATE per second (after a burst
+    of BRIDGEDASH_LOCATION_STREAM_BURST) are dropped. Accepted fixes are
+    held and ingested together at most every
+    BRIDGEDASH_LOCATION_STREAM_INTERVAL seconds, so every fix reaches the
+    tracking buffer but only the latest is fanned out.
+    """
+
+    def __init__(self, driver_id, rate=None, burst=None, interval=None):
+        self.driver_id = driver_id
+        self.rate = rate or settings.BRIDGEDASH_LOCATION_STREAM_RATE
+        self.burst = burst or settings.BRIDGEDASH_LOCATION_STREAM_BURST
+        self.interval = settings.BRIDGEDASH_LOCATION_STREAM_INTERVAL if interval is None else interval
+        self._tokens = float(self.burst)
+        self._refilled_at = time.monotonic()
+        self._pending = []
+        self._flushed_at = 0.0
+        self._flush_task = None
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def push(self, point):
+        """
+        Queue a (lat, lng, timestamp) fix; returns False if it was rate limited
+        """
+        if not self._take_token():
+            return False
+        self._pending.append(point)
+        if self._flush_task is None:
+            delay = max(0.0, self._flushed_at + self.interval - time.monotonic())
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_after(delay))
+        return True
+
+    async def _flush_after(self, delay):
+        await asyncio.sleep(delay)
+        # Fixes arriving during the flush schedule the next one
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        points, self._pending = self._pending, []
+        if not points:
+            return
+        self._flushed_at = time.monotonic()
+        try:
+            await database_sync_to_async(self._ingest)(sorted(points, key=lambda point: point[2]))
+        except Exception as e:
+            logger.error(f"Error recording streamed locations for driver {self.driver_id}: {e}")
+
+    def _ingest(self, points):
+        record_driver_locations(Driver(pk=self.driver_id), points)
+
+    async def close(self):
+        """
+        Ingest whatever is still held, e.g. when the connection drops
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
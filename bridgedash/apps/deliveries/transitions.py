@@ -0,0 +1,65 @@
+from collections import namedtuple
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Delivery
+
+Transition = namedtuple('Transition', ['sources', 'timestamp'])
+
+# Legal delivery status changes: target status -> the statuses it can be
+# reached from and the timestamp column it stamps (kept if already set)
+TRANSITIONS = {
+    'accepted': Transition(('pending',), 'accepted_at'),
+    'picked_up': Transition(('accepted',), 'picked_up_at'),
+    'in_transit': Transition(('picked_up',), None),
+    'delivered': Transition(('picked_up', 'in_transit'), 'delivered_at'),
+    'cancelled': Transition(('pending', 'accepted'), None),
+}
+
+# The transitions a driver makes from update_delivery_status
+DRIVER_TRANSITIONS = ('picked_up', 'in_transit', 'delivered')
+
+class InvalidTransition(ValueError):
+    pass
+
+def can_transition(current, target):
+    return target in TRANSITIONS and current in TRANSITIONS[target].sources
+
+def transition(queryset, target, now=None, **values):
+    """
+    Move every delivery in `queryset` that may legally reach `target` there
+    with one UPDATE, setting only the status, the transition's timestamp and
+    `values`. Returns the number of deliveries moved.
+    """
+    if target not in TRANSITIONS:
+        raise InvalidTransition(f'Unknown delivery status {target!r}')
+    sources, timestamp = TRANSITIONS[target]
+    changes = {'status': target, **values}
+    if timestamp:
+        changes[timestamp] = Coalesce(F(timestamp), now or timezone.now())
+    return queryset.filter(status__in=sources).update(**changes)
+
+def advance(delivery, target, now=None, **values):
+    """
+    Move a delivery from the status it was read with to `target`.
+
+    The UPDATE only matches while the row still has that status, so a
+    concurrent change makes it a no-op instead of a lost update. On success
+    the instance is updated to match and True is returned; False means the
+    delivery changed underneath the caller.
+    """
+    if not can_transition(delivery.status, target):
+        raise InvalidTransition(f'Cannot change delivery status from {delivery.status} to {target}')
+    now = now or timezone.now()
+    moved = transition(Delivery.objects.filter(pk=delivery.pk, status=delivery.status), target, now, **values)
+    if not moved:
+        return False
+
+    delivery.status = target
+    timestamp = TRANSITIONS[target].timestamp
+    if timestamp and getattr(delivery, timestamp) is None:
+        setattr(delivery, timestamp, now)
+    for field, value in values.items():
+        setattr(delivery, field, value)
+    return True
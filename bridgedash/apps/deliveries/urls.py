@@ -9,12 +9,17 @@ urlpatterns = [
     path('customer/cancel/<int:delivery_id>/', views.cancel_delivery, name='cancel_delivery'),
     path('customer/history/', views.order_history, name='order_history'),
     path('customer/status/<int:delivery_id>/', views.get_delivery_status, name='get_delivery_status'),
+    path('history/api/', views.delivery_history_api, name='delivery_history_api'),
     
     # Driver URLs
     path('driver/', views.driver_dashboard, name='driver_dashboard'),
+    path('driver/available/', views.available_deliveries, name='available_deliveries'),
+    path('driver/quotes/', views.delivery_quotes, name='delivery_quotes'),
     path('driver/online-toggle/', views.driver_online_toggle, name='driver_online_toggle'),
     path('driver/accept-delivery/<int:delivery_id>/', views.accept_delivery, name='accept_delivery'),
     path('driver/update-status/<int:delivery_id>/', views.update_delivery_status, name='update_delivery_status'),
     path('driver/update-location/', views.update_driver_location, name='update_driver_location'),
+    path('driver/update-location/batch/', views.update_driver_location_batch, name='update_driver_location_batch'),
     path('driver/earnings/', views.driver_earnings, name='driver_earnings'),
+    path('driver/history/', views.driver_delivery_history, name='driver_delivery_history'),
 ]
\ No newline at end of file
@@ -1,25 +1,43 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, Http404
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_POST
 import json
-from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
+from decimal import Decimal
 import logging
+from asgiref.sync import sync_to_async
 
 from .models import Delivery, DeliveryTracking
 from .forms import DeliveryRequestForm, DeliveryCancelForm
+from .acceptance import announce_acceptance, claim_delivery
+from .dispatch import dispatch_delivery
+from .earnings import earnings_summary, record_delivery_earnings
+from .geocoding import locate_delivery, schedule_geocoding
+from .feed import driver_zone, feed_etag, invalidate_pending_feed, pending_feed, pending_feed_version, render_pending_feed
+from .pagination import keyset_page
+from .pricing import quote_pending_deliveries
+from .status import aget_status_snapshot, invalidate_delivery_status, status_etag
+from .presence import get_driver_presence, is_online, toggle_online
+from .spatial import get_driver_index
+from .tasks import schedule_track_compaction
+from .tracking import arecord_driver_locations, current_position, parse_location_point, record_driver_locations, update_delivery_position
+from .transitions import DRIVER_TRANSITIONS, advance, can_transition
 from bridgedash.apps.chat.models import ChatRoom, ChatMessage
 from bridgedash.apps.notifications.models import Notification
+from bridgedash.apps.notifications.outbox import channel_sender, publish
 from bridgedash.apps.users.models import Driver
-import asyncio
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from bridgedash.decorators import async_login_required
 
 logger = logging.getLogger(__name__)
-geolocator = Nominatim(user_agent="bridgedash")
+
+# Deliveries per page in the driver dashboard's recent list
+DRIVER_RECENT_PAGE_SIZE = 10
 
 @login_required
 def customer_dashboard(request):
@@ -31,9 +49,9 @@ def customer_dashboard(request):
     active_delivery = Delivery.objects.filter(
         customer=customer, 
         status__in=['pending', 'accepted', 'picked_up', 'in_transit']
-    ).first()
+    ).select_related('driver__user').first()
     
-    recent_deliveries = Delivery.objects.filter(customer=customer).order_by('-created_at')[:10]
+    recent_deliveries = Delivery.objects.filter(customer=customer).select_related('driver__user').order_by('-created_at')[:10]
     
     context = {
         'active_delivery': active_delivery,
@@ -56,19 +74,17 @@ def new_delivery(request):
                     delivery = form.save(commit=False)
                     delivery.customer = request.user.customer
                     
-                    # Calculate coordinates (simplified - in production use proper geocoding)
-                    delivery.pickup_lat = -22.2167  # Beitbridge coordinates
-                    delivery.pickup_lng = 30.0000
-                    delivery.delivery_lat = -22.2167
-                    delivery.delivery_lng = 30.0000
-                    
-                    # Calculate distance (simplified)
-                    delivery.distance_km = 5.0  # Default distance
+                    # Coordinates and distance from the local gazetteer
+                    resolved = locate_delivery(delivery)
                     
                     # Calculate price
                     delivery.calculate_price()
                     delivery.save()
                     
+                    # Unknown addresses are geocoded remotely and repriced
+                    if not resolved:
+                        transaction.on_commit(lambda: schedule_geocoding(delivery.id))
+                    
                     # Create chat room
                     chat_room = ChatRoom.objects.create(delivery=delivery)
                     
@@ -80,17 +96,9 @@ def new_delivery(request):
                         content=f"Delivery request created. Waiting for driver acceptance..."
                     )
                     
-                    # Notify online drivers
-                    online_drivers = Driver.objects.filter(is_online=True, user__status='active')
-                    
-                    for driver in online_drivers:
-                        Notification.objects.create(
-                            user=driver.user,
-                            notification_type='delivery_request',
-                            title='New Delivery Request',
-                            message=f'New delivery from {delivery.customer.user.username}',
-                            related_url=f'/deliveries/driver/'
-                        )
+                    # Notify the closest online drivers (or wait for the next batch)
+                    dispatch_delivery(delivery)
+                    invalidate_pending_feed()
                     
                     messages.success(request, '🚀 Delivery request created! Drivers are being notified.')
                     return redirect('customer_dashboard')
@@ -109,12 +117,16 @@ def active_delivery(request, delivery_id):
         messages.error(request, "Access denied. Customer area only.")
         return redirect('dashboard')
     
-    delivery = get_object_or_404(Delivery, id=delivery_id, customer=request.user.customer)
+    delivery = get_object_or_404(
+        Delivery.objects.select_related('driver__user'),
+        id=delivery_id,
+        customer=request.user.customer
+    )
     chat_room = ChatRoom.objects.get(delivery=delivery)
     messages_list = ChatMessage.objects.filter(room=chat_room).order_by('timestamp')
     
     # Get latest tracking info
-    latest_tracking = DeliveryTracking.objects.filter(delivery=delivery).order_by('-timestamp').first()
+    latest_tracking = current_position(delivery)
     
     context = {
         'delivery': delivery,
@@ -130,10 +142,14 @@ def cancel_delivery(request, delivery_id):
         messages.error(request, "Access denied. Customer area only.")
         return redirect('dashboard')
     
-    delivery = get_object_or_404(Delivery, id=delivery_id, customer=request.user.customer)
+    delivery = get_object_or_404(
+        Delivery.objects.select_related('driver__user'),
+        id=delivery_id,
+        customer=request.user.customer
+    )
     
     # Check if delivery can be cancelled
-    if delivery.status not in ['pending', 'accepted']:
+    if not can_transition(delivery.status, 'cancelled'):
         messages.error(request, "This delivery cannot be cancelled at this stage.")
         return redirect('active_delivery', delivery_id=delivery_id)
     
@@ -142,16 +158,24 @@ def cancel_delivery(request, delivery_id):
         if form.is_valid():
             try:
                 with transaction.atomic():
-                    # Update delivery status
-                    delivery.status = 'cancelled'
-                    delivery.cancelled_by = request.user
-                    delivery.cancellation_reason = form.cleaned_data['reason']
-                    
                     # Apply cancellation fee if driver already accepted
+                    cancellation_fee = delivery.cancellation_fee
                     if delivery.status == 'accepted':
-                        delivery.cancellation_fee = delivery.total_price * 0.5  # 50% fee
+                        cancellation_fee = delivery.total_price * Decimal('0.5')  # 50% fee
                     
-                    delivery.save()
+                    # Only cancels if the status is still the one the fee is based on
+                    cancelled = advance(
+                        delivery,
+                        'cancelled',
+                        cancelled_by=request.user,
+                        cancellation_reason=form.cleaned_data['reason'],
+                        cancellation_fee=cancellation_fee,
+                    )
+                    if not cancelled:
+                        messages.error(request, "This delivery cannot be cancelled at this stage.")
+                        return redirect('active_delivery', delivery_id=delivery_id)
+                    invalidate_delivery_status(delivery.id)
+                    invalidate_pending_feed()
                     
                     # Add system message
                     chat_room = ChatRoom.objects.get(delivery=delivery)
@@ -197,35 +221,88 @@ def order_history(request):
         messages.error(request, "Access denied. Customer area only.")
         return redirect('dashboard')
     
-    deliveries = Delivery.objects.filter(customer=request.user.customer).order_by('-created_at')
+    customer_deliveries = Delivery.objects.filter(customer=request.user.customer)
+    try:
+        deliveries, next_cursor = keyset_page(
+            customer_deliveries.select_related('driver__user'),
+            request.GET.get('cursor')
+        )
+    except ValueError:
+        # A fallback to the first page would be appended to the scroll as
+        # duplicate rows
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
     
     context = {
         'deliveries': deliveries,
+        'next_cursor': next_cursor,
     }
-    return render(request, 'customer/order_history.html', context)
-
-@login_required
-def get_delivery_status(request, delivery_id):
-    """API endpoint for real-time delivery status updates"""
-    if request.user.role != 'customer':
-        return JsonResponse({'error': 'Access denied'}, status=403)
     
-    delivery = get_object_or_404(Delivery, id=delivery_id, customer=request.user.customer)
-    latest_tracking = DeliveryTracking.objects.filter(delivery=delivery).order_by('-timestamp').first()
+    # Infinite scroll fetches the following pages as bare fragments
+    if request.headers.get('HX-Request'):
+        return render(request, 'partials/order_history_page.html', context)
     
-    data = {
+    context['history_stats'] = customer_deliveries.aggregate(
+        total=Count('id'),
+        completed=Count('id', filter=Q(status='delivered')),
+        spent=Sum('total_price', filter=Q(status='delivered')),
+    )
+    return render(request, 'customer/order_history.html', context)
+
+def _history_item(delivery):
+    return {
+        'id': delivery.id,
         'status': delivery.status,
         'status_display': delivery.get_status_display(),
-        'driver_name': delivery.driver.user.username if delivery.driver else None,
-        'driver_phone': delivery.driver.user.phone if delivery.driver else None,
-        'current_location': {
-            'lat': latest_tracking.driver_lat if latest_tracking else delivery.pickup_lat,
-            'lng': latest_tracking.driver_lng if latest_tracking else delivery.pickup_lng,
-        } if latest_tracking or delivery.pickup_lat else None,
+        'item_description': delivery.item_description,
+        'pickup_address': delivery.pickup_address,
+        'delivery_address': delivery.delivery_address,
         'total_price': str(delivery.total_price),
+        'created_at': delivery.created_at.isoformat(),
+        'delivered_at': delivery.delivered_at.isoformat() if delivery.delivered_at else None,
     }
+
+@login_required
+def delivery_history_api(request):
+    """API endpoint for the user's delivery history, one keyset page at a time"""
+    if request.user.role == 'customer':
+        deliveries = Delivery.objects.filter(customer=request.user.customer)
+    elif request.user.role == 'driver':
+        deliveries = Delivery.objects.filter(driver=request.user.driver)
+    else:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        page_size = min(int(request.GET.get('page_size', settings.BRIDGEDASH_HISTORY_PAGE_SIZE)), 100)
+        if page_size < 1:
+            raise ValueError('Invalid page size')
+        page, next_cursor = keyset_page(deliveries, request.GET.get('cursor'), page_size)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or page size'}, status=400)
     
-    return JsonResponse(data)
+    return JsonResponse({
+        'results': [_history_item(delivery) for delivery in page],
+        'next_cursor': next_cursor,
+    })
+
+@async_login_required
+async def get_delivery_status(request, delivery_id):
+    """API endpoint for real-time delivery status updates"""
+    if request.user.role != 'customer':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    # Served from the versioned snapshot; a customer's pk is their user's pk
+    snapshot = await aget_status_snapshot(delivery_id)
+    if snapshot is None or snapshot['customer_id'] != request.user.pk:
+        raise Http404('No Delivery matches the given query.')
+    
+    # Unchanged since the client's last poll: 304 without touching the ORM
+    etag = status_etag(delivery_id, snapshot['version'])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(snapshot['data'])
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 @login_required
 def driver_dashboard(request):
@@ -237,51 +314,123 @@ def driver_dashboard(request):
     active_delivery = Delivery.objects.filter(
         driver=driver,
         status__in=['accepted', 'picked_up', 'in_transit']
-    ).first()
+    ).select_related('customer__user', 'chatroom').first()
     
     # Get available deliveries (pending ones)
-    available_deliveries = Delivery.objects.filter(
-        status='pending'
-    ).order_by('-created_at')[:10]
+    available_deliveries = pending_feed(driver_zone(driver.pk))
     
-    recent_deliveries = Delivery.objects.filter(driver=driver).order_by('-created_at')[:10]
+    recent_deliveries, next_cursor = keyset_page(
+        Delivery.objects.filter(driver=driver),
+        page_size=DRIVER_RECENT_PAGE_SIZE
+    )
     
-    # Calculate today's earnings
-    today = timezone.now().date()
-    from django.db.models import Sum
-    today_earnings = Delivery.objects.filter(
-        driver=driver,
-        status='delivered',
-        delivered_at__date=today
-    ).aggregate(total=Sum('total_price'))['total'] or 0
+    # Today's earnings from the daily rollup
+    today_earnings = earnings_summary(driver)['today']
+    
+    # Presence, not the lazily synced column, says whether they're online
+    driver.is_online = is_online(driver.pk)
     
     context = {
         'driver': driver,
         'active_delivery': active_delivery,
         'available_deliveries': available_deliveries,
         'recent_deliveries': recent_deliveries,
+        'next_cursor': next_cursor,
         'today_earnings': today_earnings,
     }
     return render(request, 'driver/dashboard.html', context)
 
 @login_required
-def driver_online_toggle(request):
+def driver_delivery_history(request):
+    """HTMX fragment with the next page of the driver's recent deliveries"""
     if request.user.role != 'driver':
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    driver = request.user.driver
-    driver.is_online = not driver.is_online
-    driver.save()
+    try:
+        recent_deliveries, next_cursor = keyset_page(
+            Delivery.objects.filter(driver=request.user.driver),
+            request.GET.get('cursor'),
+            DRIVER_RECENT_PAGE_SIZE
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
     
-    # Notify customers about driver status change
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
+    context = {
+        'recent_deliveries': recent_deliveries,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'partials/driver_recent_deliveries.html', context)
+
+@login_required
+def available_deliveries(request):
+    """HTMX fragment with the pending-deliveries feed for the driver's zone"""
+    if request.user.role != 'driver':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    # The feed poll doubles as the online driver's heartbeat
+    get_driver_presence().touch(request.user.pk)
+    
+    # A driver's pk is their user's pk; the zone comes from the driver index
+    zone = driver_zone(request.user.pk)
+    version = pending_feed_version()
+    etag = feed_etag(zone, version)
+    
+    # Unchanged feed: 304 without rendering anything
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(render_pending_feed(zone, version))
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@login_required
+def delivery_quotes(request):
+    """API endpoint quoting the pending deliveries near the driver's position"""
+    if request.user.role != 'driver':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        limit = min(int(request.GET.get('limit', 50)), 500)
+        if limit < 1:
+            raise ValueError('Invalid limit')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    
+    # Position from the driver index, falling back to the last stored one
+    position = get_driver_index().position(request.user.pk)
+    if position is None:
+        driver = request.user.driver
+        if driver.current_lat is None or driver.current_lng is None:
+            return JsonResponse({'error': 'Location unknown'}, status=400)
+        position = (driver.current_lat, driver.current_lng)
+    
+    quotes = quote_pending_deliveries(position[0], position[1], limit=limit)
+    return JsonResponse({
+        'results': [
+            {key: str(value) if isinstance(value, Decimal) else value for key, value in quote.items()}
+            for quote in quotes
+        ],
+    })
+
+@async_login_required
+async def driver_online_toggle(request):
+    if request.user.role != 'driver':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    # A driver's pk is their user's pk
+    driver = await Driver.objects.only('current_lat', 'current_lng').aget(pk=request.user.pk)
+    driver.is_online = await sync_to_async(toggle_online, thread_sensitive=False)(driver)
+    
+    # Presence lives in Redis, outside any transaction, so notify customers
+    # straight away without recording it; a lost message is superseded by
+    # the next toggle
+    channel_sender.send(
         "drivers_updates",
         {
             "type": "driver.status_update",
-            "driver_id": driver.user.id,
+            "driver_id": request.user.id,
             "is_online": driver.is_online,
-            "username": driver.user.username,
+            "username": request.user.username,
         }
     )
     
@@ -297,71 +446,25 @@ def accept_delivery(request, delivery_id):
     
     driver = request.user.driver
     
-    if not driver.is_online:
+    if not is_online(driver.pk):
         return JsonResponse({'error': 'You must be online to accept deliveries'}, status=400)
     
-    try:
-        with transaction.atomic():
-            delivery = Delivery.objects.select_for_update().get(
-                id=delivery_id, 
-                status='pending'
-            )
-            
-            # Accept the delivery
-            delivery.driver = driver
-            delivery.status = 'accepted'
-            delivery.accepted_at = timezone.now()
-            delivery.save()
-            
-            # Create chat room if not exists
-            chat_room, created = ChatRoom.objects.get_or_create(delivery=delivery)
-            
-            # Add system message
-            ChatMessage.objects.create(
-                room=chat_room,
-                sender=request.user,
-                message_type='system',
-                content=f"Driver {driver.user.username} has accepted your delivery! They will contact you shortly."
-            )
-            
-            # Create initial tracking point
-            DeliveryTracking.objects.create(
-                delivery=delivery,
-                driver_lat=driver.current_lat or -22.2167,
-                driver_lng=driver.current_lng or 30.0000
-            )
-            
-            # Notify customer
-            Notification.objects.create(
-                user=delivery.customer.user,
-                notification_type='delivery_accepted',
-                title='Delivery Accepted!',
-                message=f'Driver {driver.user.username} has accepted your delivery',
-                related_url=f'/deliveries/customer/active/{delivery.id}/'
-            )
-            
-            # Broadcast to other drivers that delivery is taken
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "drivers_updates",
-                {
-                    "type": "delivery.accepted",
-                    "delivery_id": delivery.id,
-                    "driver_id": driver.user.id,
-                }
-            )
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Delivery accepted successfully!',
-                'delivery_id': delivery.id
-            })
-            
-    except Delivery.DoesNotExist:
+    # The claim commits on its own; only one racing driver can win it
+    delivery = claim_delivery(delivery_id, driver)
+    if delivery is None:
         return JsonResponse({'error': 'Delivery not available or already taken'}, status=400)
+    
+    # Side effects run after the claim, outside any lock on the delivery
+    try:
+        announce_acceptance(delivery, driver)
     except Exception as e:
-        logger.error(f"Error accepting delivery: {e}")
-        return JsonResponse({'error': 'Error accepting delivery'}, status=500)
+        logger.error(f"Error announcing accepted delivery {delivery.id}: {e}")
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Delivery accepted successfully!',
+        'delivery_id': delivery.id
+    })
 
 @login_required
 def update_delivery_status(request, delivery_id):
@@ -376,39 +479,43 @@ def update_delivery_status(request, delivery_id):
         current_lat = request.POST.get('lat')
         current_lng = request.POST.get('lng')
         
-        if new_status not in ['picked_up', 'in_transit', 'delivered']:
+        if new_status not in DRIVER_TRANSITIONS:
             return JsonResponse({'error': 'Invalid status'}, status=400)
+        if not can_transition(delivery.status, new_status):
+            return JsonResponse({'error': f'Cannot change status from {delivery.status} to {new_status}'}, status=400)
         
         try:
             with transaction.atomic():
-                old_status = delivery.status
-                delivery.status = new_status
+                # One conditional UPDATE of the changed columns
+                if not advance(delivery, new_status):
+                    return JsonResponse({'error': 'Delivery status changed, please refresh'}, status=409)
+                invalidate_delivery_status(delivery.id)
                 
-                # Update timestamps
-                if new_status == 'picked_up' and not delivery.picked_up_at:
-                    delivery.picked_up_at = timezone.now()
-                elif new_status == 'delivered' and not delivery.delivered_at:
-                    delivery.delivered_at = timezone.now()
-                    
+                if new_status == 'delivered':
                     # Update driver earnings
-                    driver.total_earnings += delivery.total_price
-                    driver.commission_owed += delivery.commission_amount
-                    driver.save()
-                
-                delivery.save()
+                    Driver.objects.filter(pk=driver.pk).update(
+                        total_earnings=F('total_earnings') + delivery.total_price,
+                        commission_owed=F('commission_owed') + delivery.commission_amount,
+                    )
+                    record_delivery_earnings(delivery)
+                    
+                    # Compact the stored route once the delivery is done
+                    transaction.on_commit(lambda: schedule_track_compaction(delivery.id))
                 
                 # Update driver location if provided
                 if current_lat and current_lng:
                     driver.current_lat = float(current_lat)
                     driver.current_lng = float(current_lng)
-                    driver.save()
+                    Driver.objects.filter(pk=driver.pk).update(current_lat=driver.current_lat, current_lng=driver.current_lng)
+                    get_driver_presence().touch(driver.pk, driver.current_lat, driver.current_lng)
                     
                     # Create tracking point
-                    DeliveryTracking.objects.create(
+                    tracking = DeliveryTracking.objects.create(
                         delivery=delivery,
                         driver_lat=driver.current_lat,
                         driver_lng=driver.current_lng
                     )
+                    update_delivery_position(delivery.id, tracking.driver_lat, tracking.driver_lng, tracking.timestamp)
                 
                 # Add system message
                 chat_room = ChatRoom.objects.get(delivery=delivery)
@@ -440,9 +547,8 @@ def update_delivery_status(request, delivery_id):
                     related_url=f'/deliveries/customer/active/{delivery.id}/'
                 )
                 
-                # Broadcast status update
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
+                # Broadcast status update once committed
+                publish(
                     f"delivery_{delivery.id}",
                     {
                         "type": "delivery.status_update",
@@ -464,63 +570,65 @@ def update_delivery_status(request, delivery_id):
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+@async_login_required
+async def update_driver_location(request):
+    if request.user.role != 'driver':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    lat = request.POST.get('lat')
+    lng = request.POST.get('lng')
+    if not lat or not lng:
+        return JsonResponse({'error': 'Latitude and longitude required'}, status=400)
+    
+    try:
+        point = parse_location_point({'lat': lat, 'lng': lng})
+    except ValueError:
+        return JsonResponse({'error': 'Invalid coordinates'}, status=400)
+    
+    try:
+        # A driver's pk is their user's pk; nothing else of theirs is needed
+        await arecord_driver_locations(Driver(pk=request.user.pk), [point])
+    except Exception as e:
+        logger.error(f"Error updating location: {e}")
+        return JsonResponse({'error': 'Error updating location'}, status=500)
+    
+    return JsonResponse({
+        'success': True,
+        'message': 'Location updated'
+    })
+
 @login_required
-def update_driver_location(request):
+@require_POST
+def update_driver_location_batch(request):
+    """API endpoint for queued location fixes uploaded in one request"""
     if request.user.role != 'driver':
         return JsonResponse({'error': 'Access denied'}, status=403)
     
-    driver = request.user.driver
+    try:
+        data = json.loads(request.body)
+        raw_points = data['points']
+        if not isinstance(raw_points, list) or not raw_points:
+            return JsonResponse({'error': 'At least one point required'}, status=400)
+        if len(raw_points) > settings.BRIDGEDASH_LOCATION_BATCH_MAX_POINTS:
+            return JsonResponse({'error': 'Too many points in one batch'}, status=400)
+        points = sorted((parse_location_point(point) for point in raw_points), key=lambda point: point[2])
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid location batch'}, status=400)
     
-    if request.method == 'POST':
-        lat = request.POST.get('lat')
-        lng = request.POST.get('lng')
-        
-        if not lat or not lng:
-            return JsonResponse({'error': 'Latitude and longitude required'}, status=400)
-        
-        try:
-            driver.current_lat = float(lat)
-            driver.current_lng = float(lng)
-            driver.save()
-            
-            # Update active delivery tracking if exists
-            active_delivery = Delivery.objects.filter(
-                driver=driver,
-                status__in=['accepted', 'picked_up', 'in_transit']
-            ).first()
-            
-            if active_delivery:
-                DeliveryTracking.objects.create(
-                    delivery=active_delivery,
-                    driver_lat=driver.current_lat,
-                    driver_lng=driver.current_lng
-                )
-                
-                # Broadcast location update to customer
-                channel_layer = get_channel_layer()
-                async_to_sync(channel_layer.group_send)(
-                    f"delivery_{active_delivery.id}",
-                    {
-                        "type": "driver.location_update",
-                        "delivery_id": active_delivery.id,
-                        "lat": driver.current_lat,
-                        "lng": driver.current_lng,
-                        "timestamp": timezone.now().isoformat()
-                    }
-                )
-            
-            return JsonResponse({
-                'success': True,
-                'message': 'Location updated'
-            })
-            
-        except ValueError:
-            return JsonResponse({'error': 'Invalid coordinates'}, status=400)
-        except Exception as e:
-            logger.error(f"Error updating location: {e}")
-            return JsonResponse({'error': 'Error updating location'}, status=500)
+    try:
+        record_driver_locations(Driver(pk=request.user.pk), points)
+    except Exception as e:
+        logger.error(f"Error updating location batch: {e}")
+        return JsonResponse({'error': 'Error updating location'}, status=500)
     
-    return JsonResponse({'error': 'Invalid request'}, status=400)
+    return JsonResponse({
+        'success': True,
+        'message': 'Location updated',
+        'accepted': len(points)
+    })
 
 @login_required
 def driver_earnings(request):
@@ -530,43 +638,23 @@ def driver_earnings(request):
     
     driver = request.user.driver
     
-    # Calculate various earnings metrics
-    today = timezone.now().date()
-    week_ago = today - timezone.timedelta(days=7)
-    month_ago = today - timezone.timedelta(days=30)
-    
-    from django.db.models import Sum
-    today_earnings = Delivery.objects.filter(
-        driver=driver,
-        status='delivered',
-        delivered_at__date=today
-    ).aggregate(total=Sum('total_price'))['total'] or 0
-    
-    week_earnings = Delivery.objects.filter(
-        driver=driver,
-        status='delivered',
-        delivered_at__date__gte=week_ago
-    ).aggregate(total=Sum('total_price'))['total'] or 0
-    
-    month_earnings = Delivery.objects.filter(
-        driver=driver,
-        status='delivered',
-        delivered_at__date__gte=month_ago
-    ).aggregate(total=Sum('total_price'))['total'] or 0
+    # Earnings metrics from the daily rollup
+    earnings = earnings_summary(driver)
     
     # Recent completed deliveries
     recent_deliveries = Delivery.objects.filter(
         driver=driver,
         status='delivered'
-    ).order_by('-delivered_at')[:20]
+    ).select_related('customer__user').order_by('-delivered_at')[:20]
     
     from django.conf import settings
     context = {
         'driver': driver,
-        'today_earnings': today_earnings,
-        'week_earnings': week_earnings,
-        'month_earnings': month_earnings,
+        'today_earnings': earnings['today'],
+        'week_earnings': earnings['week'],
+        'month_earnings': earnings['month'],
         'recent_deliveries': recent_deliveries,
         'commission_rate': settings.BRIDGEDASH_COMMISSION_RATE * 100,
+        'driver_share_rate': 100 - settings.BRIDGEDASH_COMMISSION_RATE * 100,
     }
     return render(request, 'driver/earnings.html', context)
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Notification
+from .models import Notification, OutboxEvent
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
@@ -17,4 +17,11 @@ class NotificationAdmin(admin.ModelAdmin):
     def mark_as_unread(self, request, queryset):
         updated = queryset.update(is_read=False)
         self.message_user(request, f'{updated} notifications marked as unread.')
-    mark_as_unread.short_description = "Mark as unread"
\ No newline at end of file
+    mark_as_unread.short_description = "Mark as unread"
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ['id', 'group', 'created_at', 'published_at']
+    list_filter = ['published_at']
+    readonly_fields = ['group', 'message', 'created_at', 'published_at']
+    search_fields = ['group']
@@ -0,0 +1,30 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bridgedash.apps.notifications.outbox import relay_pending
+
+class Command(BaseCommand):
+    help = 'Publish outbox events that their web or worker process did not send (runs until stopped)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Relay what is pending now and exit')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when nothing is pending')
+        parser.add_argument('--batch-size', type=int, default=settings.BRIDGEDASH_OUTBOX_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            try:
+                published = relay_pending(options['batch_size'])
+            finally:
+                close_old_connections()
+            total += published
+            if published:
+                self.stdout.write(f'Relayed {published} events')
+            if options['once'] and published < options['batch_size']:
+                break
+            if published < options['batch_size']:
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Relayed {total} events'))
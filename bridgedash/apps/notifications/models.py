@@ -25,4 +25,24 @@ class Notification(models.Model):
         ordering = ['-created_at']
     
     def __str__(self):
-        return f"{self.user.username}: {self.title}"
\ No newline at end of file
+        return f"{self.user.username}: {self.title}"
+
+# Channel-layer messages written in the same transaction as the change they
+# announce, and published by the outbox relay once it has committed
+class OutboxEvent(models.Model):
+    group = models.CharField(max_length=100)
+    message = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    published_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(published_at__isnull=True),
+                name='outbox_unpublished_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.group}: {self.message.get('type')}"
@@ -0,0 +1,155 @@
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+from datetime import timedelta
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+class ChannelSender:
+    """
+    Background publisher for channel-layer messages.
+
+    Messages are queued without blocking the caller; a daemon thread sends
+    whatever has queued up concurrently on its own event loop, so a batch
+    costs about one Redis round trip, then marks the outbox events it
+    published.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or settings.BRIDGEDASH_OUTBOX_BATCH_SIZE
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def send(self, group, message, event_id=None):
+        self._queue.put((group, message, event_id))
+        self._ensure_thread()
+
+    def drain(self, timeout=None):
+        """
+        Publish everything queued so far in the calling thread
+        """
+        batch = self._take(timeout)
+        while batch:
+            self._publish(batch)
+            batch = self._take(0)
+
+    def _take(self, timeout):
+        try:
+            batch = [self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _publish(self, batch):
+        published = publish_batch([(group, message) for group, message, _ in batch])
+        event_ids = [event_id for (_, _, event_id), ok in zip(batch, published) if ok and event_id]
+        if event_ids:
+            OutboxEvent.objects.filter(id__in=event_ids, published_at__isnull=True).update(published_at=timezone.now())
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='channel-sender', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.drain(timeout=1.0)
+            except Exception as e:
+                logger.error(f"Error publishing channel messages: {e}")
+            finally:
+                close_old_connections()
+
+_loop = threading.local()
+
+def publish_batch(messages):
+    """
+    Send (group, message) pairs to the channel layer concurrently and return
+    whether each one was sent
+    """
+    if not messages:
+        return []
+    loop = getattr(_loop, 'loop', None)
+    if loop is None:
+        # One loop per thread, so the channel layer's connection pool is reused
+        loop = _loop.loop = asyncio.new_event_loop()
+    channel_layer = get_channel_layer()
+
+    async def send_all():
+        return await asyncio.gather(
+            *(channel_layer.group_send(group, message) for group, message in messages),
+            return_exceptions=True
+        )
+
+    results = loop.run_until_complete(send_all())
+    for (group, _), result in zip(messages, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error publishing to {group}: {result}")
+    return [not isinstance(result, Exception) for result in results]
+
+channel_sender = ChannelSender()
+atexit.register(channel_sender.drain)
+
+def publish(group, message):
+    """
+    Record a channel-layer message in the current transaction. It is sent
+    once the transaction commits, never if it rolls back, and the relay
+    retries it if this process dies before sending.
+    """
+    event = OutboxEvent.objects.create(group=group, message=message)
+    transaction.on_commit(lambda: channel_sender.send(group, message, event.id))
+    return event
+
+def broadcast(group, message):
+    """
+    Send a channel-layer message after the current transaction commits,
+    without recording it. For frequent, superseded messages such as driver
+    positions, where a lost one doesn't matter.
+    """
+    transaction.on_commit(lambda: channel_sender.send(group, message))
+
+def relay_pending(batch_size=None, min_age=None):
+    """
+    Publish outbox events that are still unsent `min_age` seconds after
+    they were written (their process died or the channel layer was down).
+    Returns the number published.
+    """
+    batch_size = batch_size or settings.BRIDGEDASH_OUTBOX_BATCH_SIZE
+    min_age = settings.BRIDGEDASH_OUTBOX_RETRY_SECONDS if min_age is None else min_age
+    cutoff = timezone.now() - timedelta(seconds=min_age)
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True, created_at__lte=cutoff)
+            .order_by('id')[:batch_size]
+        )
+        published = publish_batch([(event.group, event.message) for event in events])
+        event_ids = [event.id for event, ok in zip(events, published) if ok]
+        OutboxEvent.objects.filter(id__in=event_ids).update(published_at=timezone.now())
+    return len(event_ids)
+
+def purge_published(hours=None):
+    """
+    Delete events published more than `hours` ago
+    """
+    hours = hours or settings.BRIDGEDASH_OUTBOX_RETENTION_HOURS
+    deleted, _ = OutboxEvent.objects.filter(
+        published_at__lt=timezone.now() - timedelta(hours=hours)
+    ).delete()
+    return deleted
@@ -0,0 +1,10 @@
+from celery import shared_task
+
+@shared_task
+def purge_outbox():
+    """
+    Delete outbox events published longer ago than the retention window
+    """
+    from .outbox import purge_published
+
+    return purge_published()
@@ -1,13 +1,16 @@
 import logging
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from .models import Notification
+from .outbox import publish
 from bridgedash.apps.users.models import User
 
 logger = logging.getLogger(__name__)
 
+def chat_notification_cache_key(room_id, user_id):
+    return f'chat_notification_{room_id}_{user_id}'
+
 class NotificationUtils:
     """Utility class for handling notifications across the application"""
     
@@ -36,11 +39,11 @@ class NotificationUtils:
     @staticmethod
     def send_realtime_notification(user, notification):
         """
-        Send real-time notification via WebSocket
+        Send real-time notification via WebSocket once the notification
+        is committed
         """
         try:
-            channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
+            publish(
                 f"user_{user.id}",
                 {
                     "type": "send_notification",
@@ -58,10 +61,12 @@ class NotificationUtils:
         """
         Notify all online drivers about a new delivery request
         """
+        from bridgedash.apps.deliveries.presence import get_driver_presence
+        
         try:
             online_drivers = User.objects.filter(
                 role='driver',
-                driver__is_online=True,
+                pk__in=list(get_driver_presence().online_ids()),
                 status='active'
             )
             
@@ -163,21 +168,17 @@ class NotificationUtils:
         """
         try:
             delivery = chat_message.room.delivery
-            sender = chat_message.sender
+            sender_id = chat_message.sender_id
             
             # Determine who to notify (the other user in the chat)
-            if sender == delivery.customer.user:
-                notify_user = delivery.driver.user if delivery.driver else None
+            if sender_id == delivery.customer_id:
+                notify_user_id = delivery.driver_id
             else:
-                notify_user = delivery.customer.user
+                notify_user_id = delivery.customer_id
             
-            if notify_user and notify_user != sender:
-                NotificationUtils.create_notification(
-                    user=notify_user,
-                    notification_type='message',
-                    title='New Message',
-                    message=f'New message in delivery #{delivery.id}: {chat_message.content[:50]}...',
-                    related_url=f'/chat/room/{chat_message.room.id}/'
+            if notify_user_id and notify_user_id != sender_id:
+                NotificationUtils.notify_chat_message(
+                    chat_message.room_id, delivery.id, notify_user_id, chat_message.content
                 )
             
             return True
@@ -185,6 +186,44 @@ class NotificationUtils:
             logger.error(f"Error notifying chat message: {e}")
             return False
     
+    @staticmethod
+    def notify_chat_message(room_id, delivery_id, user_id, content):
+        """
+        Notify a chat participant of a message, unless they have the room
+        open. Messages within BRIDGEDASH_CHAT_NOTIFY_WINDOW seconds of the
+        last one fold into the same unread notification, which is only
+        pushed when it is created. Returns the notification's id, or None
+        if none was needed.
+        """
+        from bridgedash.apps.chat.viewers import is_viewing
+        
+        if is_viewing(room_id, user_id):
+            return None
+        
+        key = chat_notification_cache_key(room_id, user_id)
+        window = settings.BRIDGEDASH_CHAT_NOTIFY_WINDOW
+        pending = cache.get(key)
+        if pending:
+            count = pending['count'] + 1
+            updated = Notification.objects.filter(id=pending['id'], is_read=False).update(
+                message=f'{count} new messages in delivery #{delivery_id}: {content[:50]}...',
+                created_at=timezone.now()
+            )
+            if updated:
+                cache.set(key, {'id': pending['id'], 'count': count}, timeout=window)
+                return pending['id']
+        
+        notification = NotificationUtils.create_notification(
+            user=User(pk=user_id),
+            notification_type='message',
+            title='New Message',
+            message=f'New message in delivery #{delivery_id}: {content[:50]}...',
+            related_url=f'/chat/room/{room_id}/'
+        )
+        if notification is not None and window:
+            cache.set(key, {'id': notification.id, 'count': 1}, timeout=window)
+        return notification.id if notification is not None else None
+    
     @staticmethod
     def get_unread_count(user):
         """
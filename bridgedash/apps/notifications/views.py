@@ -2,6 +2,7 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
+from bridgedash.decorators import async_login_required
 from .models import Notification
 
 @login_required
@@ -31,7 +32,7 @@ def mark_all_notifications_read(request):
     
     return JsonResponse({'success': True, 'updated_count': updated})
 
-@login_required
-def unread_notifications_count(request):
-    count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({'unread_count': count})
\ No newline at end of file
+@async_login_required
+async def unread_notifications_count(request):
+    count = await Notification.objects.filter(user=request.user, is_read=False).acount()
+    return JsonResponse({'unread_count': count})
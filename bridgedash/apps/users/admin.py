@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from .models import User, Customer, Driver
+from bridgedash.apps.deliveries.presence import get_driver_presence
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
@@ -44,11 +45,17 @@ class DriverAdmin(admin.ModelAdmin):
     
     def go_online(self, request, queryset):
         updated = queryset.update(is_online=True)
+        presence = get_driver_presence()
+        for driver in queryset:
+            presence.go_online(driver.pk, driver.current_lat, driver.current_lng)
         self.message_user(request, f'{updated} drivers set to online.')
     go_online.short_description = "Set selected drivers online"
     
     def go_offline(self, request, queryset):
         updated = queryset.update(is_online=False)
+        presence = get_driver_presence()
+        for driver in queryset:
+            presence.go_offline(driver.pk)
         self.message_user(request, f'{updated} drivers set to offline.')
     go_offline.short_description = "Set selected drivers offline"
     
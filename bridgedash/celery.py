@@ -6,6 +6,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bridgedash.settings')
 app = Celery('bridgedash')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
+app.autodiscover_tasks(['bridgedash'])
 
 @app.task(bind=True)
 def debug_task(self):
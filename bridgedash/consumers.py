@@ -0,0 +1,41 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+
+from .stats import ADMIN_STATS_GROUP, get_admin_stats
+
+class AdminStatsConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        user = self.scope['user']
+        if not user.is_authenticated or user.role != 'admin':
+            await self.close()
+            return
+
+        # Join admin stats group
+        await self.channel_layer.group_add(
+            ADMIN_STATS_GROUP,
+            self.channel_name
+        )
+
+        await self.accept()
+
+        # Send the current snapshot so the page is fresh straight away
+        stats = await database_sync_to_async(get_admin_stats)()
+        await self.send(text_data=json.dumps({
+            'type': 'stats_update',
+            'stats': stats,
+        }))
+
+    async def disconnect(self, close_code):
+        # Leave admin stats group
+        await self.channel_layer.group_discard(
+            ADMIN_STATS_GROUP,
+            self.channel_name
+        )
+
+    async def stats_update(self, event):
+        # Send new counters to WebSocket
+        await self.send(text_data=json.dumps({
+            'type': 'stats_update',
+            'stats': event['stats'],
+        }))
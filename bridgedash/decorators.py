@@ -0,0 +1,26 @@
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.utils.functional import LazyObject, empty
+
+def _load_user(request):
+    # Evaluating the lazy user runs the session and user queries
+    return request.user.is_authenticated
+
+def async_login_required(view_func):
+    """
+    login_required for async views, which Django 4.2's decorator doesn't
+    support. The lazy request.user is loaded off the event loop unless a
+    middleware already did, so the view can use it without blocking.
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        user = request.user
+        if isinstance(user, LazyObject) and user._wrapped is empty:
+            authenticated = await sync_to_async(_load_user)(request)
+        else:
+            authenticated = user.is_authenticated
+        if not authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await view_func(request, *args, **kwargs)
+    return wrapper
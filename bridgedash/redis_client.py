@@ -0,0 +1,13 @@
+import redis
+from django.conf import settings
+
+_connection = None
+
+def get_redis():
+    """
+    Shared Redis client for BridgeDash's own keys (driver index, presence, ...)
+    """
+    global _connection
+    if _connection is None:
+        _connection = redis.Redis.from_url(settings.REDIS_URL)
+    return _connection
@@ -1,4 +1,5 @@
 from django.urls import re_path
+from bridgedash import consumers as project_consumers
 from bridgedash.apps.chat import consumers as chat_consumers
 from bridgedash.apps.deliveries import consumers as delivery_consumers
 
@@ -6,4 +7,5 @@ websocket_urlpatterns = [
     re_path(r'ws/chat/(?P<room_name>\w+)/$', chat_consumers.ChatConsumer.as_asgi()),
     re_path(r'ws/delivery/(?P<delivery_id>\w+)/$', delivery_consumers.DeliveryConsumer.as_asgi()),
     re_path(r'ws/notifications/$', delivery_consumers.NotificationConsumer.as_asgi()),
+    re_path(r'ws/admin/stats/$', project_consumers.AdminStatsConsumer.as_asgi()),
 ]
\ No newline at end of file
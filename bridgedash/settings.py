@@ -34,7 +34,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'bridgedash.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -104,6 +104,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Redis
+REDIS_URL = config('REDIS_URL', default='redis://127.0.0.1:6379')
+
 # Channels
 ASGI_APPLICATION = 'bridgedash.asgi.application'
 
@@ -111,11 +114,46 @@ CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [config('REDIS_URL', default='redis://127.0.0.1:6379')],
+            "hosts": [REDIS_URL],
         },
     },
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    },
+}
+
+# Celery
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+
+CELERY_BEAT_SCHEDULE = {
+    'maintain-tracking-partitions': {
+        'task': 'bridgedash.apps.deliveries.tasks.maintain_tracking_partitions',
+        'schedule': 60 * 60 * 6,
+    },
+    'rebuild-eta-profiles': {
+        'task': 'bridgedash.apps.deliveries.tasks.rebuild_eta_profiles',
+        'schedule': 60 * 60 * 24,
+    },
+    'purge-outbox': {
+        'task': 'bridgedash.apps.notifications.tasks.purge_outbox',
+        'schedule': 60 * 60,
+    },
+    'sync-driver-presence': {
+        'task': 'bridgedash.apps.deliveries.tasks.sync_driver_presence',
+        'schedule': 30,
+    },
+    'refresh-admin-stats': {
+        'task': 'bridgedash.tasks.refresh_admin_stats',
+        'schedule': 15,
+    },
+}
+
 # Custom user model
 AUTH_USER_MODEL = 'users.User'
 
@@ -132,6 +170,113 @@ BRIDGEDASH_COMMISSION_RATE = float(config('BRIDGEDASH_COMMISSION_RATE', default=
 BRIDGEDASH_BASE_FARE = float(config('BRIDGEDASH_BASE_FARE', default=5.00))
 BRIDGEDASH_PER_KM_RATE = float(config('BRIDGEDASH_PER_KM_RATE', default=2.00))
 
+# Dispatch: 'redis' keeps the online-driver index in Redis GEO sets so every
+# worker shares it, 'memory' keeps a per-process grid (single-process dev only).
+BRIDGEDASH_DRIVER_INDEX = config('BRIDGEDASH_DRIVER_INDEX', default='redis')
+BRIDGEDASH_DRIVER_INDEX_CELL_KM = float(config('BRIDGEDASH_DRIVER_INDEX_CELL_KM', default=1.0))
+BRIDGEDASH_DISPATCH_BATCH_SIZE = config('BRIDGEDASH_DISPATCH_BATCH_SIZE', default=5, cast=int)
+BRIDGEDASH_DISPATCH_RADII_KM = [float(r) for r in config('BRIDGEDASH_DISPATCH_RADII_KM', default='2,5,10').split(',')]
+BRIDGEDASH_DISPATCH_RING_TIMEOUT = config('BRIDGEDASH_DISPATCH_RING_TIMEOUT', default=60, cast=int)
+
+# Driver presence: online drivers are kept next to the driver index with
+# their last heartbeat (going online, location fixes, feed polls) and count
+# as offline PRESENCE_TTL seconds after it. Driver.is_online is only synced
+# from presence periodically, for reporting.
+BRIDGEDASH_PRESENCE_TTL = config('BRIDGEDASH_PRESENCE_TTL', default=90, cast=int)
+
+# Dispatch mode: 'nearest' offers each new delivery to the closest drivers
+# straight away; 'batch' collects pending deliveries for WINDOW seconds and
+# matches them to free drivers at minimum total pickup distance, offering
+# each delivery to one driver (re-matched after the ring timeout).
+BRIDGEDASH_DISPATCH_MODE = config('BRIDGEDASH_DISPATCH_MODE', default='nearest')
+BRIDGEDASH_DISPATCH_BATCH_WINDOW = float(config('BRIDGEDASH_DISPATCH_BATCH_WINDOW', default=10.0))
+BRIDGEDASH_DISPATCH_BATCH_MAX_DELIVERIES = config('BRIDGEDASH_DISPATCH_BATCH_MAX_DELIVERIES', default=500, cast=int)
+BRIDGEDASH_DISPATCH_MAX_PICKUP_KM = float(config('BRIDGEDASH_DISPATCH_MAX_PICKUP_KM', default=10.0))
+if BRIDGEDASH_DISPATCH_MODE == 'batch':
+    CELERY_BEAT_SCHEDULE['batch-dispatch'] = {
+        'task': 'bridgedash.apps.deliveries.tasks.batch_dispatch',
+        'schedule': BRIDGEDASH_DISPATCH_BATCH_WINDOW,
+    }
+
+# Location ingest: tracking rows are written behind in bulk once the buffer
+# holds BRIDGEDASH_TRACKING_BUFFER_SIZE rows or is BRIDGEDASH_TRACKING_BUFFER_SECONDS old.
+BRIDGEDASH_TRACKING_BUFFER_SIZE = config('BRIDGEDASH_TRACKING_BUFFER_SIZE', default=200, cast=int)
+BRIDGEDASH_TRACKING_BUFFER_SECONDS = float(config('BRIDGEDASH_TRACKING_BUFFER_SECONDS', default=5.0))
+BRIDGEDASH_LOCATION_BATCH_MAX_POINTS = config('BRIDGEDASH_LOCATION_BATCH_MAX_POINTS', default=500, cast=int)
+
+# Drivers stream fixes over the delivery WebSocket: each connection may send
+# LOCATION_STREAM_RATE frames per second after a burst of LOCATION_STREAM_BURST,
+# and its fixes are ingested and fanned out at most every LOCATION_STREAM_INTERVAL seconds.
+BRIDGEDASH_LOCATION_STREAM_RATE = float(config('BRIDGEDASH_LOCATION_STREAM_RATE', default=5.0))
+BRIDGEDASH_LOCATION_STREAM_BURST = config('BRIDGEDASH_LOCATION_STREAM_BURST', default=20, cast=int)
+BRIDGEDASH_LOCATION_STREAM_INTERVAL = float(config('BRIDGEDASH_LOCATION_STREAM_INTERVAL', default=1.0))
+
+# Fixes older than MAX_FIX_AGE seconds or needing more than MAX_SPEED_KMH
+# from the last accepted one are dropped, fixes within MIN_DISTANCE_M of it
+# are skipped, and delivered tracks are simplified to within
+# SIMPLIFY_TOLERANCE_M of the raw route.
+BRIDGEDASH_TRACKING_MAX_FIX_AGE = config('BRIDGEDASH_TRACKING_MAX_FIX_AGE', default=86400, cast=int)
+BRIDGEDASH_TRACKING_MAX_SPEED_KMH = float(config('BRIDGEDASH_TRACKING_MAX_SPEED_KMH', default=150.0))
+BRIDGEDASH_TRACKING_MIN_DISTANCE_M = float(config('BRIDGEDASH_TRACKING_MIN_DISTANCE_M', default=10.0))
+BRIDGEDASH_TRACK_SIMPLIFY_TOLERANCE_M = float(config('BRIDGEDASH_TRACK_SIMPLIFY_TOLERANCE_M', default=15.0))
+
+# Tracking storage is split into monthly partitions; partitions older than
+# the retention window are dropped after delivered routes are rolled up.
+BRIDGEDASH_TRACKING_RETENTION_MONTHS = config('BRIDGEDASH_TRACKING_RETENTION_MONTHS', default=3, cast=int)
+BRIDGEDASH_TRACKING_PARTITIONS_AHEAD = config('BRIDGEDASH_TRACKING_PARTITIONS_AHEAD', default=2, cast=int)
+
+# Admin dashboard counters are served from a cached snapshot that the
+# refresh-admin-stats task recomputes and pushes to open dashboards.
+BRIDGEDASH_ADMIN_STATS_TTL = config('BRIDGEDASH_ADMIN_STATS_TTL', default=60, cast=int)
+
+# Delivery history lists are keyset-paginated on (created_at, id)
+BRIDGEDASH_HISTORY_PAGE_SIZE = config('BRIDGEDASH_HISTORY_PAGE_SIZE', default=20, cast=int)
+
+# Chat history is sent as the latest CHAT_HISTORY_SIZE messages, with older
+# pages loaded by before_id and reconnects catching up from the last seen id
+BRIDGEDASH_CHAT_HISTORY_SIZE = config('BRIDGEDASH_CHAT_HISTORY_SIZE', default=50, cast=int)
+
+# Chat messages within NOTIFY_WINDOW seconds of the last one fold into one
+# "N new messages" notification; participants with the room open get none.
+BRIDGEDASH_CHAT_NOTIFY_WINDOW = config('BRIDGEDASH_CHAT_NOTIFY_WINDOW', default=60, cast=int)
+
+# Drivers' available-deliveries feed is rendered once per zone (grid cell
+# of this size) and feed version, and re-rendered at least every TTL seconds.
+BRIDGEDASH_FEED_ZONE_KM = float(config('BRIDGEDASH_FEED_ZONE_KM', default=2.0))
+BRIDGEDASH_FEED_TTL = config('BRIDGEDASH_FEED_TTL', default=60, cast=int)
+
+# Channel-layer messages go through the outbox: sent in batches of up to
+# BATCH_SIZE by a background thread after commit, and retried by the relay
+# (relay_outbox) if still unsent after RETRY_SECONDS.
+BRIDGEDASH_OUTBOX_BATCH_SIZE = config('BRIDGEDASH_OUTBOX_BATCH_SIZE', default=100, cast=int)
+BRIDGEDASH_OUTBOX_RETRY_SECONDS = float(config('BRIDGEDASH_OUTBOX_RETRY_SECONDS', default=5.0))
+BRIDGEDASH_OUTBOX_RETENTION_HOURS = config('BRIDGEDASH_OUTBOX_RETENTION_HOURS', default=24, cast=int)
+
+# ETA: per-cell, per-hour speed profiles are rebuilt nightly from the last
+# HISTORY_DAYS of tracking; a delivery's ETA is recomputed once the driver
+# has moved RECOMPUTE_M from where it was last computed.
+BRIDGEDASH_ETA_CELL_KM = float(config('BRIDGEDASH_ETA_CELL_KM', default=0.5))
+BRIDGEDASH_ETA_HISTORY_DAYS = config('BRIDGEDASH_ETA_HISTORY_DAYS', default=60, cast=int)
+BRIDGEDASH_ETA_DEFAULT_SPEED_KMH = float(config('BRIDGEDASH_ETA_DEFAULT_SPEED_KMH', default=20.0))
+BRIDGEDASH_ETA_MIN_SPEED_KMH = float(config('BRIDGEDASH_ETA_MIN_SPEED_KMH', default=5.0))
+BRIDGEDASH_ETA_DETOUR_FACTOR = float(config('BRIDGEDASH_ETA_DETOUR_FACTOR', default=1.3))
+BRIDGEDASH_ETA_RECOMPUTE_M = float(config('BRIDGEDASH_ETA_RECOMPUTE_M', default=100.0))
+
+# Geocoding: addresses resolve from the local gazetteer (GeocodedAddress,
+# cached in-process for GEOCODE_CACHE_TTL seconds, misses for
+# GEOCODE_MISS_TTL); misses use the default location and distance until the
+# optional remote geocoder resolves them in Celery ('' disables it).
+BRIDGEDASH_GEOCODER_REMOTE = config('BRIDGEDASH_GEOCODER_REMOTE', default='nominatim')
+BRIDGEDASH_GEOCODER_TIMEOUT = config('BRIDGEDASH_GEOCODER_TIMEOUT', default=5, cast=int)
+BRIDGEDASH_GEOCODER_REGION = config('BRIDGEDASH_GEOCODER_REGION', default='Beitbridge')
+BRIDGEDASH_GEOCODER_COUNTRY = config('BRIDGEDASH_GEOCODER_COUNTRY', default='zw')
+BRIDGEDASH_GEOCODE_CACHE_SIZE = config('BRIDGEDASH_GEOCODE_CACHE_SIZE', default=10000, cast=int)
+BRIDGEDASH_GEOCODE_CACHE_TTL = config('BRIDGEDASH_GEOCODE_CACHE_TTL', default=3600, cast=int)
+BRIDGEDASH_GEOCODE_MISS_TTL = config('BRIDGEDASH_GEOCODE_MISS_TTL', default=30, cast=int)
+BRIDGEDASH_DEFAULT_LAT = float(config('BRIDGEDASH_DEFAULT_LAT', default=-22.2167))
+BRIDGEDASH_DEFAULT_LNG = float(config('BRIDGEDASH_DEFAULT_LNG', default=30.0000))
+BRIDGEDASH_DEFAULT_DISTANCE_KM = float(config('BRIDGEDASH_DEFAULT_DISTANCE_KM', default=5.0))
+
 # Railway Production Settings
 import dj_database_url
 
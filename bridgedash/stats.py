@@ -0,0 +1,77 @@
+import logging
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, DecimalField, Func, IntegerField, Max, Q, Subquery
+
+logger = logging.getLogger(__name__)
+
+ADMIN_STATS_CACHE_KEY = 'stats:admin_dashboard'
+ADMIN_STATS_GROUP = 'admin_stats'
+
+def _scalar(queryset, function, field, output_field):
+    # (SELECT FUNCTION(field) FROM ...) as a scalar subquery; Func rather
+    # than an aggregate, so the subquery has no GROUP BY of its own
+    return Subquery(
+        queryset.order_by().annotate(value=Func(field, function=function, output_field=output_field)).values('value')[:1]
+    )
+
+def compute_admin_stats():
+    """
+    Admin dashboard counters in one query: a conditional aggregate over
+    users with the delivery counters as scalar subqueries, wrapped in Max
+    so they can sit in the same aggregate (every user row carries the same
+    value, and with no users there can be no deliveries either).
+    """
+    from bridgedash.apps.users.models import User
+    from bridgedash.apps.deliveries.models import Delivery
+
+    money = DecimalField(max_digits=12, decimal_places=2)
+    stats = User.objects.aggregate(
+        total_customers=Count('customer'),
+        total_drivers=Count('driver'),
+        pending_approvals=Count('id', filter=Q(status='pending')),
+        total_deliveries=Max(_scalar(Delivery.objects.all(), 'COUNT', 'id', IntegerField())),
+        pending_deliveries=Max(_scalar(Delivery.objects.filter(status='pending'), 'COUNT', 'id', IntegerField())),
+        total_earnings=Max(_scalar(Delivery.objects.all(), 'SUM', 'total_price', money)),
+        total_commission=Max(_scalar(Delivery.objects.all(), 'SUM', 'commission_amount', money)),
+    )
+    for field in ('total_deliveries', 'pending_deliveries'):
+        stats[field] = stats[field] or 0
+    # Money as strings so the snapshot is JSON-ready for the WebSocket push
+    for field in ('total_earnings', 'total_commission'):
+        stats[field] = f'{stats[field] or 0:.2f}'
+    return stats
+
+def get_admin_stats():
+    """
+    Cached snapshot of the admin counters, computed on a cache miss
+    """
+    stats = cache.get(ADMIN_STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_admin_stats()
+        cache.set(ADMIN_STATS_CACHE_KEY, stats, timeout=settings.BRIDGEDASH_ADMIN_STATS_TTL)
+    return stats
+
+def refresh_admin_stats():
+    """
+    Recompute the snapshot and push it to open admin dashboards if it changed
+    """
+    previous = cache.get(ADMIN_STATS_CACHE_KEY)
+    stats = compute_admin_stats()
+    cache.set(ADMIN_STATS_CACHE_KEY, stats, timeout=settings.BRIDGEDASH_ADMIN_STATS_TTL)
+
+    if stats != previous:
+        try:
+            channel_layer = get_channel_layer()
+            async_to_sync(channel_layer.group_send)(
+                ADMIN_STATS_GROUP,
+                {
+                    'type': 'stats.update',
+                    'stats': stats,
+                }
+            )
+        except Exception as e:
+            logger.error(f"Error pushing admin stats: {e}")
+    return stats
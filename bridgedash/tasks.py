@@ -0,0 +1,10 @@
+from celery import shared_task
+
+@shared_task
+def refresh_admin_stats():
+    """
+    Recompute the admin dashboard snapshot and push it to open dashboards
+    """
+    from .stats import refresh_admin_stats as refresh
+
+    refresh()
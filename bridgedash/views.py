@@ -26,32 +26,17 @@ def admin_dashboard(request):
         messages.error(request, "Access denied. Admin area only.")
         return redirect('dashboard')
     
-    from bridgedash.apps.users.models import Customer, Driver
     from bridgedash.apps.deliveries.models import Delivery
-    from django.db.models import Sum
+    from bridgedash.stats import get_admin_stats
     
-    # Statistics
-    total_customers = Customer.objects.count()
-    total_drivers = Driver.objects.count()
-    total_deliveries = Delivery.objects.count()
-    pending_deliveries = Delivery.objects.filter(status='pending').count()
+    # Statistics, from the cached snapshot kept fresh by refresh_admin_stats
+    stats = get_admin_stats()
     
     # Recent activity
     recent_deliveries = Delivery.objects.select_related('customer__user', 'driver__user').order_by('-created_at')[:10]
-    pending_approvals = request.user.__class__.objects.filter(status='pending').count()
-    
-    # Earnings
-    total_earnings = Delivery.objects.aggregate(total=Sum('total_price'))['total'] or 0
-    total_commission = Delivery.objects.aggregate(total=Sum('commission_amount'))['total'] or 0
     
     context = {
-        'total_customers': total_customers,
-        'total_drivers': total_drivers,
-        'total_deliveries': total_deliveries,
-        'pending_deliveries': pending_deliveries,
-        'pending_approvals': pending_approvals,
-        'total_earnings': total_earnings,
-        'total_commission': total_commission,
+        **stats,
         'recent_deliveries': recent_deliveries,
         'BRIDGEDASH_COMMISSION_RATE': 15,
         'BRIDGEDASH_BASE_FARE': 5.00,
@@ -164,5 +164,60 @@ class BridgeDashMap {
     }
 }
 
+// Decodes the binary location frames of the bridgedash.location.v1
+// WebSocket subprotocol (see deliveries/protocol.py) into the same shape as
+// the JSON location_update message. Use a new decoder per connection.
+class BridgeDashLocationDecoder {
+    static SUBPROTOCOL = 'bridgedash.location.v1';
+    static COORD_SCALE = 1000000;
+    static ETA_TARGETS = {1: 'pickup', 2: 'dropoff'};
+
+    constructor() {
+        this.previous = null;
+        this.eta = null;
+    }
+
+    decode(buffer) {
+        const view = new DataView(buffer);
+        const flags = view.getUint8(0);
+        let lat, lng, timestamp, offset;
+
+        if ((flags & 0x0F) === 0x01) {
+            // Key frame: absolute coordinates and epoch milliseconds
+            lat = view.getInt32(1, true);
+            lng = view.getInt32(5, true);
+            timestamp = Number(view.getBigInt64(9, true));
+            offset = 17;
+        } else {
+            // Delta frame against the previous one
+            lat = this.previous.lat + view.getInt16(1, true);
+            lng = this.previous.lng + view.getInt16(3, true);
+            timestamp = this.previous.timestamp + view.getUint16(5, true);
+            offset = 7;
+        }
+        this.previous = {lat, lng, timestamp};
+
+        if (flags & 0x80) {
+            const arrival = view.getInt32(offset + 1, true);
+            this.eta = {
+                target: BridgeDashLocationDecoder.ETA_TARGETS[view.getUint8(offset)],
+                seconds: arrival,
+                arrival: new Date(timestamp + arrival * 1000).toISOString()
+            };
+        } else if (flags & 0x40) {
+            this.eta = null;
+        }
+
+        return {
+            type: 'location_update',
+            lat: lat / BridgeDashLocationDecoder.COORD_SCALE,
+            lng: lng / BridgeDashLocationDecoder.COORD_SCALE,
+            timestamp: new Date(timestamp).toISOString(),
+            eta: this.eta
+        };
+    }
+}
+
 // Export for global use
-window.BridgeDashMap = BridgeDashMap;
\ No newline at end of file
+window.BridgeDashMap = BridgeDashMap;
+window.BridgeDashLocationDecoder = BridgeDashLocationDecoder;
\ No newline at end of file